@@ -0,0 +1,135 @@
+import init_django  # noqa
+import time
+import random
+import argparse
+from decimal import Decimal
+from networkx import flow
+
+from exchange.simulated import SimulatedMarket, QUOTES
+from rebalancer.utils import rebalance_orders, create_flow_digraph, \
+    fee_to_cost
+from rebalancer.min_cost_flow import clear_flow_skeletons
+
+
+def parse_args(*argument_array):
+    parser = argparse.ArgumentParser(
+        description="compares rebalance_orders with networkx min cost flow "
+                    "on random portfolios of simulated market")
+    parser.add_argument('--currencies', type=int, nargs='+',
+                        default=[10, 50, 150, 300],
+                        help='numbers of currencies besides quotes')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--star', action='store_true',
+                        help='currencies trade against USDT only, star plan '
+                             'through quotes is tried first')
+    return parser.parse_args(*argument_array)
+
+
+def random_problem(number_of_currencies, seed, star=False):
+    market = SimulatedMarket.random_market(number_of_currencies, seed=seed)
+    generator = random.Random(seed)
+    fees = {'{}_{}'.format(filt['commodity'], filt['base']):
+            1 - Decimal(generator.uniform(0.001, 0.003)).quantize(
+                Decimal('1e-6'))
+            for filt in market.filters.values()
+            if not star or filt['base'] == 'USDT'}
+    currencies = sorted(market.prices)
+    weights = []
+    for _ in range(2):
+        values = [Decimal(generator.random()) for _ in currencies]
+        weights.append({currency: value / sum(values)
+                        for currency, value in zip(currencies, values)})
+    return weights[0], weights[1], fees
+
+
+def networkx_rebalance_orders(initial_weights, final_weights, fees,
+                              hubs=(), precision=Decimal('1e-8')):
+    parsed_fees = {tuple(k.split('_')): v for k, v in fees.items()}
+    digraph = create_flow_digraph(
+        initial_weights, final_weights, parsed_fees, precision=precision)
+    orders = []
+    for currency_from, dct in flow.min_cost_flow(digraph).items():
+        if currency_from == 'start':
+            continue
+        for currency_to, quantity_in_base in dct.items():
+            if currency_to == 'end' or quantity_in_base < 1e-18:
+                continue
+            orders.append((currency_from, currency_to,
+                           Decimal(quantity_in_base) * precision))
+    return orders
+
+
+def cold_rebalance_orders(initial_weights, final_weights, fees, hubs=()):
+    clear_flow_skeletons()
+    fee_to_cost.cache_clear()
+    return rebalance_orders(initial_weights, final_weights, fees, hubs=hubs)
+
+
+def partially_filled(initial_weights, final_weights):
+    """
+    weights after half of rebalance
+    """
+    return {currency: (initial_weights.get(currency, 0) +
+                       final_weights.get(currency, 0)) / 2
+            for currency in set(initial_weights) | set(final_weights)}
+
+
+def get_cost(orders, fees):
+    cost = 0
+    for currency_from, currency_to, quantity in orders:
+        fee = fees.get('{}_{}'.format(currency_from, currency_to),
+                       fees.get('{}_{}'.format(currency_to, currency_from)))
+        cost -= quantity * fee.log10()
+    return cost
+
+
+def measure(function, args, repeat):
+    function(*args)
+    start = time.time()
+    for _ in range(repeat):
+        result = function(*args)
+    return (time.time() - start) / repeat, result
+
+
+def measure_replan(problem, replan, repeat):
+    elapsed = 0
+    for _ in range(repeat):
+        rebalance_orders(*problem[:3], hubs=problem[3])
+        start = time.time()
+        rebalance_orders(*replan[:3], hubs=replan[3])
+        elapsed += time.time() - start
+    return elapsed / repeat
+
+
+def main(args):
+    print('replan: cached skeleton, weights of half filled rebalance')
+    print('{:>10} {:>12} {:>10} {:>8} {:>10} {:>8} {:>10}'.format(
+        'currencies', 'networkx, s', 'cold, s', 'speedup', 'replan, s',
+        'speedup', 'same plan'))
+    for number_of_currencies in args.currencies:
+        problem = random_problem(number_of_currencies, args.seed,
+                                 args.star)
+        problem += (QUOTES if args.star else (),)
+        networkx_time, expected = measure(networkx_rebalance_orders, problem,
+                                          args.repeat)
+        cold_time, orders = measure(cold_rebalance_orders, problem,
+                                    args.repeat)
+        replan = (partially_filled(problem[0], problem[1]),) + problem[1:]
+        replan_time = measure_replan(problem, replan, args.repeat)
+        if sorted(orders) == sorted(expected):
+            same = 'yes'
+        elif abs(get_cost(orders, problem[2]) -
+                 get_cost(expected, problem[2])) < Decimal('1e-6'):
+            same = 'same cost'
+        else:
+            same = 'no'
+        print('{:>10} {:>12.4f} {:>10.4f} {:>7.1f}x {:>10.4f} {:>7.1f}x '
+              '{:>10}'.format(number_of_currencies, networkx_time, cold_time,
+                              networkx_time / cold_time, replan_time,
+                              networkx_time / replan_time, same))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args)
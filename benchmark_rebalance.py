@@ -0,0 +1,84 @@
+import init_django  # noqa
+import time
+import pstats
+import argparse
+import cProfile
+from decimal import Decimal
+
+from exchange.simulated import SimulatedMarket, SimulatedExchange
+from rebalancer.market_order_rebalancer import market_order_rebalance
+from rebalancer.limit_order_rebalancer import limit_order_rebalance
+from internals.market_snapshot import MarketSnapshot
+
+
+def parse_args(*argument_array):
+    parser = argparse.ArgumentParser(
+        description="rebalances portfolio on simulated market, "
+                    "prints time and reached weights")
+    parser.add_argument('--currencies', type=int, default=100,
+                        help='number of currencies besides quotes')
+    parser.add_argument('--rebalancer', choices=['market', 'limit'],
+                        default='market')
+    parser.add_argument('--portfolio-value', type=str, default='1000000',
+                        help='initial USDT')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds, which every call to market takes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--profile', action='store_true',
+                        help='print cProfile statistics')
+    parser.add_argument('--profile-lines', type=int, default=30)
+    args = parser.parse_args(*argument_array)
+    args.portfolio_value = Decimal(args.portfolio_value)
+    return args
+
+
+def get_weights(exchange):
+    snapshot = MarketSnapshot(exchange.get_orderbooks())
+    resources = exchange.get_resources()
+    prices = snapshot.get_prices('USDT')
+    portfolio_value = snapshot.value_portfolios([resources], 'USDT')[0]
+    return {currency: float(quantity) * prices[currency] / portfolio_value
+            for currency, quantity in resources.items()
+            if currency in prices}
+
+
+def rebalance(args, exchange, weights):
+    if args.rebalancer == 'market':
+        return market_order_rebalance(exchange, weights, lambda x: None)
+    return limit_order_rebalance(exchange, weights, None, lambda x: None,
+                                 time_delta=0)
+
+
+def main(args):
+    market = SimulatedMarket.random_market(args.currencies, seed=args.seed,
+                                           latency=args.latency)
+    exchange = SimulatedExchange(market,
+                                 {'USDT': args.portfolio_value})
+    currencies = sorted(market.prices)
+    weights = {currency: Decimal(1) / len(currencies)
+               for currency in currencies}
+
+    profile = cProfile.Profile() if args.profile else None
+    start = time.time()
+    if profile is not None:
+        profile.enable()
+    responses = rebalance(args, exchange, weights)
+    if profile is not None:
+        profile.disable()
+    elapsed = time.time() - start
+
+    reached_weights = get_weights(exchange)
+    error = sum(abs(reached_weights.get(currency, 0) - float(weight))
+                for currency, weight in weights.items())
+    print('{} rebalance of {} currencies: {:.3f}s, {} orders, {} calls, '
+          'weights error {:.4f}'.format(
+              args.rebalancer, len(currencies), elapsed, len(responses),
+              exchange.client.calls, error))
+    if profile is not None:
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(
+            args.profile_lines)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args)
@@ -0,0 +1,152 @@
+import init_django  # noqa
+import os
+import sys
+import time
+import asyncio
+import logging
+import resource
+import argparse
+import subprocess
+from decimal import Decimal
+
+from logger import logger
+from exchange.binance import Binance
+from exchange.async_binance import AsyncBinance
+from exchange.binance_limits import REQUEST_WEIGHT_LIMITER
+from exchange.simulated import SimulatedMarket
+from rebalancer.async_runtime import RebalanceRuntime
+from rebalancer.market_order_rebalancer import market_order_rebalance
+from rebalancer.limit_order_rebalancer import limit_order_rebalance
+
+GB = 1024 ** 3
+
+
+def parse_args(*argument_array):
+    parser = argparse.ArgumentParser(
+        description="rebalances many accounts on local stand-in server in "
+                    "one asyncio process and in one process per rebalance, "
+                    "prints peak memory and rebalances per GB of RAM")
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--rebalancer', choices=['market', 'limit'],
+                        default='market')
+    parser.add_argument('--currencies', type=int, default=8,
+                        help='number of currencies besides quotes')
+    parser.add_argument('--usdt', type=str, default='10000',
+                        help='initial USDT of every account')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='median latency of stand-in server in seconds')
+    parser.add_argument('--time-delta', type=int, default=2,
+                        help='seconds of one cycle of limit rebalance')
+    parser.add_argument('--max-retries', type=int, default=2)
+    parser.add_argument('--weight-limit', type=int, default=1200,
+                        help='binance request weight per minute of server '
+                             'and client rate limiter')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--single', type=str, default=None,
+                        help='url of running server, one rebalance is run '
+                             'by sync Binance and peak memory is printed')
+    return parser.parse_args(*argument_array)
+
+
+def get_weights(args):
+    currencies = sorted(SimulatedMarket.random_market(
+        args.currencies, seed=args.seed).prices)
+    return {currency: Decimal(1) / len(currencies)
+            for currency in currencies}
+
+
+def get_peak_rss() -> int:
+    """
+    :return: peak resident memory of this process in bytes
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def set_weight_limit(weight_limit: int):
+    # bucket allows the same weight per minute as the server
+    REQUEST_WEIGHT_LIMITER.capacity = weight_limit / 10
+    REQUEST_WEIGHT_LIMITER.rate = (weight_limit -
+                                   REQUEST_WEIGHT_LIMITER.capacity) / 60
+
+
+def start_server(args):
+    server = subprocess.Popen(
+        [sys.executable, '-u', '-m', 'exchange.standin.rest_server',
+         '--port', '0', '--currencies', str(args.currencies),
+         '--usdt', args.usdt, '--latency', str(args.latency),
+         '--weight-limit', str(args.weight_limit),
+         '--seed', str(args.seed)],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    line = server.stdout.readline()
+    url = line.split('BINANCE_API_URL=')[1].split()[0]
+    return server, url
+
+
+def run_single(args):
+    """
+    what one prefork worker does: one sync rebalance in the process
+    """
+    exchange = Binance('single', 'secret', api_url=args.single)
+    weights = get_weights(args)
+    if args.rebalancer == 'market':
+        market_order_rebalance(exchange, weights, lambda x: None)
+    else:
+        limit_order_rebalance(exchange, weights, None, lambda x: None,
+                              max_retries=args.max_retries,
+                              time_delta=args.time_delta)
+    print(get_peak_rss())
+
+
+async def run_runtime(args):
+    weights = get_weights(args)
+    params = ({} if args.rebalancer == 'market' else
+              {'max_retries': args.max_retries,
+               'time_delta': args.time_delta})
+    async with RebalanceRuntime(AsyncBinance) as runtime:
+        futures = [runtime.start(('account{}'.format(i), 'secret'), weights,
+                                 args.rebalancer, **params)
+                   for i in range(args.accounts)]
+    return [future.result() for future in futures]
+
+
+def main(args):
+    logger.setLevel(logging.WARNING)
+    set_weight_limit(args.weight_limit)
+    if args.single is not None:
+        return run_single(args)
+
+    server, url = start_server(args)
+    try:
+        os.environ['BINANCE_API_URL'] = url
+        single = subprocess.run(
+            [sys.executable, __file__, '--single', url] + sys.argv[1:],
+            stdout=subprocess.PIPE, universal_newlines=True, check=True)
+        process_rss = int(single.stdout.split()[-1])
+
+        start = time.time()
+        loop = asyncio.get_event_loop()
+        results = loop.run_until_complete(run_runtime(args))
+        elapsed = time.time() - start
+        runtime_rss = get_peak_rss()
+    finally:
+        server.terminate()
+        server.wait()
+
+    failed = sum(1 for result in results if not isinstance(result, list) or
+                 (result and isinstance(result[0], str)))
+    print('{} rebalances of {} currencies: {:.1f}s, {} failed'.format(
+        args.rebalancer, args.currencies + 3, elapsed, failed))
+    print('process per rebalance: {:.0f} MB per rebalance, '
+          '{:.1f} rebalances per GB'.format(
+              process_rss / 2 ** 20, GB / process_rss))
+    print('asyncio runtime: {:.0f} MB for {} rebalances, {:.2f} MB per '
+          'extra rebalance, {:.1f} rebalances per GB'.format(
+              runtime_rss / 2 ** 20, args.accounts,
+              max(runtime_rss - process_rss, 0) / 2 ** 20 /
+              max(args.accounts - 1, 1),
+              args.accounts * GB / runtime_rss))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args)
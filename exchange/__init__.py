@@ -1,8 +1,16 @@
 from exchange.exchange import Exchange
 from exchange.binance import Binance
 from exchange.coinbasepro import CoinbasePro
+from exchange.async_exchange import AsyncExchange
+from exchange.async_binance import AsyncBinance
+from exchange.async_coinbasepro import AsyncCoinbasePro
 
 
 def get_exchange_by_name(name: str) -> Exchange:
     name = name.upper()
     return {"BINANCE": Binance, "COINBASEPRO": CoinbasePro}[name]
+
+
+def get_async_exchange_by_name(name: str) -> AsyncExchange:
+    name = name.upper()
+    return {"BINANCE": AsyncBinance, "COINBASEPRO": AsyncCoinbasePro}[name]
@@ -0,0 +1,225 @@
+import os
+import hmac
+import asyncio
+import time
+import hashlib
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from logger import logger
+from exchange.async_exchange import AsyncExchange
+from exchange.binance import Binance, API_URL, DEPTH_LIMITS, \
+    UNKNOWN_ORDER, TRANSIENT_ERROR_CODES, filters_from_exchange_info, \
+    get_filters_cache
+from exchange.binance_limits import REQUEST_WEIGHT_LIMITER, \
+    get_order_limiter, get_order_book_weight, get_open_orders_weight, \
+    get_open_orders_queries
+from internals.async_http import AsyncHTTPClient, AsyncAPIError
+from internals.orderbook import OrderBook, DepthOrderBook
+from internals.utils import binance_product_to_currencies
+
+RECV_WINDOW = 5000
+REQUEST_WEIGHTS = {
+    '/api/v1/exchangeInfo': 1,
+    '/api/v3/ticker/bookTicker': 2,
+    '/api/v3/account': 5,
+    '/api/v3/order': 1,
+}
+
+
+class AsyncBinance(AsyncExchange, Binance):
+    """
+    binance on asyncio, filters, validation and parsing of responses are
+    inherited from Binance
+    """
+
+    def __init__(self, api_key: str=None, secret_key: str=None,
+                 session=None, book_ticker=None):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.client = None
+        self.http = AsyncHTTPClient(
+            os.environ.get('BINANCE_API_URL', API_URL), session)
+        self.filters = None
+        self.book_ticker = book_ticker
+
+    async def load(self):
+        cache = get_filters_cache(self.http.base_url)
+        filters = cache.peek()
+        if filters is None:
+            exchange_info = await self._public('GET', '/api/v1/exchangeInfo')
+            filters = cache.get(
+                lambda: filters_from_exchange_info(exchange_info))
+        self.filters = filters
+
+    async def close(self):
+        await self.http.close()
+
+    async def _acquire(self, method, path, params):
+        """
+        wait for request weight (and order rate for new orders), limits are
+        shared with sync Binance clients
+        """
+        if path == '/api/v3/order' and method == 'POST':
+            await get_order_limiter(self.api_key).acquire_async()
+        if path == '/api/v1/depth':
+            weight = get_order_book_weight(params.get('limit', 100))
+        elif path == '/api/v3/openOrders':
+            weight = get_open_orders_weight(params.get('symbol'))
+        else:
+            weight = REQUEST_WEIGHTS.get(path, 1)
+        await REQUEST_WEIGHT_LIMITER.acquire_async(weight)
+
+    async def _public(self, method, path, **params):
+        await self._acquire(method, path, params)
+        return await self.http.request(method, path, params=params)
+
+    async def _signed(self, method, path, **params):
+        assert self.api_key is not None and self.secret_key is not None
+        await self._acquire(method, path, params)
+        params = [(k, str(v)) for k, v in params.items()]
+        params += [('recvWindow', str(RECV_WINDOW)),
+                   ('timestamp', str(int(time.time() * 1000)))]
+        signature = hmac.new(self.secret_key.encode(),
+                             urlencode(params).encode(),
+                             hashlib.sha256).hexdigest()
+        params.append(('signature', signature))
+        return await self.http.request(
+            method, path, params=params,
+            headers={'X-MBX-APIKEY': self.api_key})
+
+    async def get_orderbooks(self, products=None, depth: int=1):
+        if products is not None:
+            products = set(products)
+        if depth != 1:
+            return await self.get_orderbooks_of_depth(products, depth)
+        orderbooks = self._get_orderbooks_from_book_ticker(products)
+        if orderbooks is not None:
+            return orderbooks
+        books_list = await self._public('GET', '/api/v3/ticker/bookTicker')
+        orderbooks = []
+        for book in books_list:
+            currency_pair = binance_product_to_currencies(book['symbol'])
+            if not currency_pair:
+                continue
+            product = '_'.join(currency_pair)
+            if products is not None and product not in products:
+                continue
+            orderbook = OrderBook(
+                product, {'ask': Decimal(book['askPrice']),
+                          'bid': Decimal(book['bidPrice'])})
+            if orderbook.get_wall_ask() <= Decimal('1e-8'):
+                continue
+            orderbooks.append(orderbook)
+        return orderbooks
+
+    async def get_orderbooks_of_depth(self, products, depth: int):
+        """
+        one request per existing product, requests are concurrent
+        """
+        assert products is not None, 'products are required for depth > 1'
+        limit = next((limit for limit in DEPTH_LIMITS if limit >= depth),
+                     DEPTH_LIMITS[-1])
+        products = [product for product in sorted(products)
+                    if ''.join(product.split('_')) in self.filters]
+        books = await asyncio.gather(*[
+            self._public('GET', '/api/v1/depth',
+                         symbol=''.join(product.split('_')), limit=limit)
+            for product in products])
+        return [DepthOrderBook(product, book['bids'][:depth],
+                               book['asks'][:depth])
+                for product, book in zip(products, books)
+                if book['bids'] and book['asks']]
+
+    def is_transient_error(self, error):
+        return isinstance(error, AsyncAPIError) and (
+            error.status >= 500 or error.code in TRANSIENT_ERROR_CODES)
+
+    async def get_resources(self):
+        account = await self._signed('GET', '/api/v3/account')
+        return {asset_balance['asset']: Decimal(asset_balance['free'])
+                for asset_balance in account['balances']
+                if Decimal(asset_balance['free']) > Decimal(0)}
+
+    async def place_limit_order(self, order):
+        logger.info("creating limit order - {}".format(str(order)))
+        order = await self._validate_order(order)
+        logger.info("validated order - {}".format(str(order)))
+        if order is None:
+            return
+        try:
+            resp = await self._signed(
+                'POST', '/api/v3/order',
+                symbol=''.join(order.product.split('_')),
+                side=order._action.name, type='LIMIT_MAKER',
+                quantity=order._quantity,
+                price=order._price.to_eng_string(),
+                newOrderRespType='FULL')
+        except AsyncAPIError as e:
+            return e
+        logger.info("order response - {}".format(str(resp)))
+        self._reserve_in_ledger(order, resp['orderId'])
+        return {'symbol': resp['symbol'],
+                'orderId': resp['orderId'],
+                'clientOrderId': resp['clientOrderId']}
+
+    async def place_market_order(self, order, price_estimates):
+        logger.info("creating market order - {}".format(str(order)))
+        order = await self._validate_order(order, price_estimates)
+        logger.info("validated order - {}".format(str(order)))
+        if order is None:
+            return
+        try:
+            resp = await self._signed(
+                'POST', '/api/v3/order',
+                symbol=''.join(order.product.split('_')),
+                side=order._action.name, type='MARKET',
+                quantity=order._quantity, newOrderRespType='FULL')
+        except AsyncAPIError as e:
+            return e
+        parsed_response = self.parse_market_order_response(resp)
+        parsed_response['price_estimates'] = price_estimates
+        parsed_response['product'] = '_'.join(binance_product_to_currencies(
+            parsed_response['symbol']))
+        self._update_ledger(parsed_response)
+        logger.info("parsed order response - {}".format(str(parsed_response)))
+        return parsed_response
+
+    async def get_order(self, params):
+        logger.info("get order = {}".format(str(params)))
+        resp = await self._signed('GET', '/api/v3/order',
+                                  **self._parse_params(params))
+        resp = self._parse_order_state(resp)
+        logger.info("get order response - {}".format(str(resp)))
+        return resp
+
+    async def get_open_orders(self, order_responses):
+        """
+        like Binance.get_open_orders, but symbols are queried concurrently
+        """
+        if not order_responses:
+            return []
+        params = [self._parse_params(order_response)
+                  for order_response in order_responses]
+        resps = await asyncio.gather(*[
+            self._signed('GET', '/api/v3/openOrders',
+                         **({'symbol': symbol} if symbol is not None else {}))
+            for symbol in get_open_orders_queries(d['symbol']
+                                                  for d in params)])
+        resps = [resp for symbol_resps in resps for resp in symbol_resps]
+        return self._match_open_orders(params, resps)
+
+    async def cancel_limit_order(self, params):
+        logger.info("canceled order - {}".format(str(params)))
+        try:
+            resp = await self._signed('DELETE', '/api/v3/order',
+                                      **self._parse_params(params))
+            if 'executedQty' in resp:
+                resp = self._parse_order_state(resp)
+        except AsyncAPIError as e:
+            if e.code != UNKNOWN_ORDER:
+                raise e
+            logger.warning("Exception{code} with message ={message}".format(
+                code=e.code, message=e.message))
+            resp = {}
+        return resp
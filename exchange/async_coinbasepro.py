@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import asyncio
+from decimal import Decimal
+from typing import List, Dict
+from urllib.parse import urlencode
+
+from cbpro.cbpro_auth import get_auth_headers
+
+from logger import logger
+from exchange.async_exchange import AsyncExchange
+from exchange.coinbasepro import CoinbasePro, API_URL
+from internals.async_http import AsyncHTTPClient, AsyncAPIError
+from internals.order import Order
+from internals.orderbook import OrderBook, DepthOrderBook
+
+
+class AsyncCoinbasePro(AsyncExchange, CoinbasePro):
+    """
+    coinbase pro on asyncio, filters, validation and parsing of responses
+    are inherited from CoinbasePro
+    """
+
+    def __init__(self, api_key: str=None, secret_key: str=None,
+                 passphrase: str=None, session=None):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.client = None
+        self.http = AsyncHTTPClient(
+            os.environ.get('COINBASEPRO_API_URL', API_URL), session)
+        self.products = None
+        self.filters = None
+
+    async def load(self):
+        self.products = await self._request('GET', '/products')
+        self.filters = {product['id']: {
+            'min_order_size': Decimal(product['base_min_size']),
+            'max_order_size': Decimal(product['base_max_size']),
+            'order_step': Decimal('1e-8'),
+            'price_step': Decimal(product['quote_increment']),
+            'base': product['quote_currency'],
+            'commodity': product['base_currency']
+        } for product in self.products}
+
+    async def close(self):
+        await self.http.close()
+
+    async def _request(self, method, path, params=None, body=None,
+                       auth=False):
+        if params:
+            path += '?' + urlencode(params)
+        data = json.dumps(body) if body is not None else None
+        headers = None
+        if auth:
+            assert None not in [self.api_key, self.secret_key,
+                                self.passphrase]
+            timestamp = str(time.time())
+            headers = get_auth_headers(timestamp,
+                                       timestamp + method + path + (
+                                           data or ''),
+                                       self.api_key, self.secret_key,
+                                       self.passphrase)
+        else:
+            await self.public_rate_limiter.acquire_async()
+        return await self.http.request(method, path, data=data,
+                                       headers=headers)
+
+    async def get_resources(self):
+        accounts = await self._request('GET', '/accounts', auth=True)
+        return {account['currency']: Decimal(account['available'])
+                for account in accounts}
+
+    async def get_orderbooks(self, products: List[str], depth: int=1):
+        """
+        orderbooks are downloaded concurrently, only for existing products
+        """
+        products = [product for product in products
+                    if product.replace('_', '-') in self.filters]
+        return list(await asyncio.gather(*[
+            self._get_orderbook(product, depth) for product in products]))
+
+    async def _get_orderbook(self, product: str, depth: int):
+        symbol = product.replace('_', '-')
+        raw_orderbook = await self._request(
+            'GET', '/products/{}/book'.format(symbol),
+            {'level': 1 if depth == 1 else 2})
+        if depth == 1:
+            return OrderBook(
+                product, {'bid': Decimal(raw_orderbook['bids'][0][0]),
+                          'ask': Decimal(raw_orderbook['asks'][0][0])})
+        return DepthOrderBook(product, raw_orderbook['bids'][:depth],
+                              raw_orderbook['asks'][:depth])
+
+    async def place_market_order(self, order: Order,
+                                 price_estimates: Dict[str, Decimal]):
+        logger.info("creating market order - {}".format(str(order)))
+        order = await self._validate_order(order, price_estimates)
+        logger.info("validated order - {}".format(str(order)))
+        if order is None:
+            return
+        try:
+            resp = await self._request('POST', '/orders', body={
+                'product_id': order.product.replace('_', '-'),
+                'side': order._action.name.lower(),
+                'type': 'market',
+                'size': str(order._quantity)}, auth=True)
+        except AsyncAPIError as e:
+            logger.warning("order failed - {}".format(e.message))
+            return e
+        fills = await self._request('GET', '/fills',
+                                    {'order_id': resp['id']}, auth=True)
+        parsed_response = self.parse_market_order_response(resp, fills)
+        parsed_response['price_estimates'] = price_estimates
+        parsed_response['product'] = parsed_response['symbol'].replace(
+            '-', '_')
+        self._update_ledger(parsed_response)
+        logger.info("parsed order response - {}".format(str(parsed_response)))
+        return parsed_response
+
+    async def place_limit_order(self, order: Order):
+        logger.info("creating limit order - {}".format(str(order)))
+        order = await self._validate_order(order)
+        logger.info("validated order - {}".format(str(order)))
+        if order is None:
+            return
+        try:
+            resp = await self._request('POST', '/orders', body={
+                'product_id': order.product.replace('_', '-'),
+                'side': order._action.name.lower(),
+                'type': 'limit',
+                'price': str(order._price),
+                'size': str(order._quantity),
+                'post_only': True}, auth=True)
+        except AsyncAPIError as e:
+            return e
+        logger.info("order response - {}".format(str(resp)))
+        self._reserve_in_ledger(order, resp['id'])
+        return {'order_id': resp['id']}
+
+    async def cancel_limit_order(self, response):
+        logger.info("canceled order - {}".format(response))
+        return await self._request(
+            'DELETE', '/orders/{}'.format(response['order_id']), auth=True)
+
+    async def get_order(self, response):
+        logger.info("get order = {}".format(str(response)))
+        resp = await self._request(
+            'GET', '/orders/{}'.format(response['order_id']), auth=True)
+        resp.update({'executed_quantity': Decimal(resp['filled_size']),
+                     'orig_quantity': Decimal(resp['size'])})
+        logger.info("get order response - {}".format(str(resp)))
+        if self.ledger is not None:
+            self._update_ledger_from_order(resp)
+            if resp.get('status') == 'done':
+                self.ledger.release(resp['id'])
+        return resp
@@ -0,0 +1,76 @@
+from exchange.exchange import Exchange
+from internals.order import Order
+
+
+class AsyncExchange(Exchange):
+    """
+    asyncio counterpart of Exchange: network calls are coroutines, so
+    independent calls may be overlapped with asyncio.gather and one process
+    may serve many accounts, which share http connection pool
+
+    filters, order validation and parsing of responses are synchronous
+    and shared with Exchange
+    """
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        """
+        create exchange and load data, which is needed for validation
+        """
+        exchange = cls(*args, **kwargs)
+        await exchange.load()
+        return exchange
+
+    async def load(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def track_resources(self, resources=None, ledger=None):
+        """
+        like Exchange.track_resources, but resources can't be fetched by
+        ledger itself, so they have to be passed
+        """
+        assert resources is not None or ledger is not None, (
+            'resources have to be fetched first')
+        return super().track_resources(resources, ledger)
+
+    async def get_available_resources(self):
+        if self.ledger is not None:
+            # ledger can't await fetch, so it is reconciled here
+            if self.ledger.needs_reconcile():
+                self.ledger.reconcile(await self.get_resources())
+            return self.ledger.get_resources()
+        return await self.get_resources()
+
+    async def _validate_order(self, order, price_estimates=None):
+        resources = await self.get_available_resources()
+        return self.validate_orders([order], price_estimates, resources)[0][0]
+
+    async def get_orderbooks(self, products=None, depth: int=1):
+        raise NotImplementedError
+
+    async def get_resources(self):
+        raise NotImplementedError
+
+    async def place_market_order(self, order: Order, price_estimates):
+        raise NotImplementedError
+
+    async def place_limit_order(self, order: Order):
+        raise NotImplementedError
+
+    async def cancel_limit_order(self, params):
+        raise NotImplementedError
+
+    async def get_order(self, params):
+        raise NotImplementedError
+
+    async def get_open_orders(self, order_responses):
+        return None
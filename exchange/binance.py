@@ -1,33 +1,172 @@
+import os
+import threading
 from decimal import Decimal
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
 
 from logger import logger
-from exchange.exchange import Exchange
+from exchange.exchange import Exchange, snapshot_cached, \
+    invalidates_snapshot
 from internals.utils import binance_product_to_currencies
-from internals.utils import quantize
-from internals.orderbook import OrderBook
+from internals.fixed_point import get_scale, to_units, from_units, \
+    add_fixed_filters
+from internals.enums import OrderAction
+from internals.cache import TTLCache
+from internals import recording
+from exchange.book_ticker import BookTickerFeed, get_book_ticker_feed
+from exchange.binance_limits import RateLimitedClient, \
+    REQUEST_WEIGHT_LIMITER, get_open_orders_weight, get_open_orders_queries
+from internals.orderbook import OrderBook, DepthOrderBook
+
+
+DECIMAL_FILTERS = ['min_order_size', 'max_order_size', 'order_step',
+                   'min_notional', 'min_price', 'max_price', 'price_step']
+
+
+def parse_filters(raw_filters):
+    return {
+        symbol: {k: Decimal(v) if k in DECIMAL_FILTERS else v
+                 for k, v in filt.items()}
+        for symbol, filt in raw_filters.items()
+    }
+
+
+def filters_from_exchange_info(exchange_info):
+    """
+    filters in json serializable form, Decimal values are kept as strings
+    """
+    return {
+        filt['symbol']: {
+            'min_order_size': filt['filters'][1]['minQty'],
+            'max_order_size': filt['filters'][1]['maxQty'],
+            'order_step': filt['filters'][1]['stepSize'],
+            'min_notional': filt['filters'][2]['minNotional'],
+            'min_price': filt['filters'][0]['minPrice'],
+            'max_price': filt['filters'][0]['maxPrice'],
+            'price_step': filt['filters'][0]['tickSize'],
+            'base': filt['quoteAsset'],
+            'commodity': filt['baseAsset'],
+        }
+        for filt in exchange_info['symbols'] if 'minQty' in filt['filters'][1]
+    }
+
+
+# limits accepted by depth endpoint
+DEPTH_LIMITS = [5, 10, 20, 50, 100, 500, 1000, 5000]
+
+API_URL = 'https://api.binance.com'
+
+# filters of binance, see get_filters_cache for other apis
+FILTERS_CACHE = TTLCache('binance:filters', ttl=6 * 3600,
+                         parse=parse_filters)
+_filters_caches = {FILTERS_CACHE.key: FILTERS_CACHE}
+_filters_caches_lock = threading.Lock()
+
+
+# code of "Unknown order sent." error, order is already filled or canceled
+UNKNOWN_ORDER = -2011
+
+# statuses of orders, which don't rest in orderbook anymore
+CLOSED_ORDER_STATUSES = {'FILLED', 'CANCELED', 'EXPIRED', 'REJECTED'}
+
+# internal error, disconnected, timestamp outside of recvWindow
+TRANSIENT_ERROR_CODES = {-1000, -1001, -1021}
+
+# book ticker quotes are used, if feed got message within this many seconds
+BOOK_TICKER_MAX_AGE = 1
+
+
+def get_filters_cache(api_url: str=None) -> TTLCache:
+    """
+    filters of stand-in server or of replayed traffic are cached under own
+    key, so they don't replace filters of binance
+    :param api_url: root of REST API, BINANCE_API_URL from environment by
+                    default
+    """
+    api_url = (api_url or os.environ.get('BINANCE_API_URL') or
+               API_URL).rstrip('/')
+    key = FILTERS_CACHE.key
+    if api_url != API_URL:
+        key += ':' + api_url
+    replay_path = os.environ.get('EXCHANGE_REPLAY_PATH')
+    if replay_path:
+        key += ':replay:' + replay_path
+    with _filters_caches_lock:
+        if key not in _filters_caches:
+            _filters_caches[key] = TTLCache(key, ttl=FILTERS_CACHE.ttl,
+                                            parse=parse_filters)
+        return _filters_caches[key]
+
+
+def create_client(api_key: str=None, secret_key: str=None,
+                  api_url: str=None) -> Client:
+    """
+    client of api_url (BINANCE_API_URL from environment by default), which
+    records or replays its traffic, if it is enabled in environment
+    """
+    api_url = api_url or os.environ.get('BINANCE_API_URL')
+    adapter = recording.get_transport_adapter()
+    if not api_url and adapter is None:
+        return Client(api_key, secret_key)
+    attributes = {}
+    if api_url:
+        attributes['API_URL'] = api_url + '/api'
+    if adapter is not None:
+        # client pings api in constructor, so session has to be ready
+        def _init_session(self):
+            return recording.install(Client._init_session(self), adapter)
+        attributes['_init_session'] = _init_session
+    client_class = type('Client', (Client,), attributes)
+    return client_class(api_key, secret_key)
 
 
 class Binance(Exchange):
-    def __init__(self, api_key: str=None, secret_key: str=None):
+    book_ticker = None
+    _filters = None
+    _filters_cache = None
+
+    def __init__(self, api_key: str=None, secret_key: str=None,
+                 book_ticker: BookTickerFeed=None, api_url: str=None):
+        """
+        :param api_url: root of REST API, e.g. local stand-in server,
+                        BINANCE_API_URL from environment by default
+        """
         super().__init__()
-        self.client = Client(api_key, secret_key)
-        filters = self.client.get_exchange_info()['symbols']
-        self.filters = {
-            filt['symbol']: {
-                'min_order_size': Decimal(filt['filters'][1]['minQty']),
-                'max_order_size': Decimal(filt['filters'][1]['maxQty']),
-                'order_step': Decimal(filt['filters'][1]['stepSize']),
-                'min_notional': Decimal(filt['filters'][2]['minNotional']),
-                'min_price': Decimal(filt['filters'][0]['minPrice']),
-                'max_price': Decimal(filt['filters'][0]['maxPrice']),
-                'price_step': Decimal(filt['filters'][0]['tickSize']),
-                'base': filt['quoteAsset'],
-                'commodity': filt['baseAsset'],
-            }
-            for filt in filters if 'minQty' in filt['filters'][1]
-        }
+        self.client = RateLimitedClient(
+            create_client(api_key, secret_key, api_url), api_key)
+        self._filters_cache = get_filters_cache(api_url)
+        self._filters_cache.get(self._fetch_filters)
+        self.book_ticker = (book_ticker if book_ticker is not None
+                            else get_book_ticker_feed())
+
+    @property
+    def filters(self):
+        """
+        filters are read from cache on every access, so clients kept by
+        registry see refreshed and invalidated filters, filters assigned
+        to exchange (e.g. of simulated market) are fixed
+        """
+        if self._filters is None and self._filters_cache is not None:
+            return self._filters_cache.get(self._fetch_filters)
+        return self._filters
+
+    @filters.setter
+    def filters(self, filters):
+        self._filters = filters
+
+    def _fetch_filters(self):
+        return filters_from_exchange_info(self.client.get_exchange_info())
+
+    @staticmethod
+    def invalidate_filters():
+        """
+        drop cached filters of all apis, for example after new listing or
+        filter change
+        """
+        with _filters_caches_lock:
+            caches = list(_filters_caches.values())
+        for cache in caches:
+            cache.invalidate()
 
     def get_mid_price_orderbooks(self, products=None):
         prices_list = self.client.get_all_tickers()
@@ -45,18 +184,44 @@ class Binance(Exchange):
             orderbooks.append(orderbook)
         return orderbooks
 
+    @snapshot_cached
     def get_orderbooks(self, products=None, depth: int=1):
-        if depth != 1:
-            raise NotImplementedError
         if products is not None:
             products = set(products)
+        if depth != 1:
+            return self.get_orderbooks_of_depth(products, depth)
         return self.get_orderbooks_of_depth1(products)
 
+    def get_orderbooks_of_depth(self, products, depth: int):
+        """
+        get orderbooks with `depth` levels on each side,
+        one request per existing product
+        """
+        assert products is not None, 'products are required for depth > 1'
+        limit = next((limit for limit in DEPTH_LIMITS if limit >= depth),
+                     DEPTH_LIMITS[-1])
+        orderbooks = []
+        for product in sorted(products):
+            symbol = ''.join(product.split('_'))
+            if symbol not in self.filters:
+                continue
+            book = self.client.get_order_book(symbol=symbol, limit=limit)
+            if not book['bids'] or not book['asks']:
+                continue
+            orderbooks.append(DepthOrderBook(
+                product, book['bids'][:depth], book['asks'][:depth]))
+        return orderbooks
+
     def get_orderbooks_of_depth1(self, products):
         """
         get all orderbooks with depth equal to 1, then filter out those,
         which symbol is not in specified products
+        orderbooks are served from book ticker feed, when it is alive and
+        has all requested products
         """
+        orderbooks = self._get_orderbooks_from_book_ticker(products)
+        if orderbooks is not None:
+            return orderbooks
         books_list = self.client.get_orderbook_tickers()
         orderbooks = []
         for book in books_list:
@@ -75,6 +240,26 @@ class Binance(Exchange):
             orderbooks.append(orderbook)
         return orderbooks
 
+    def get_top_of_book(self, products):
+        return self._get_orderbooks_from_book_ticker(products)
+
+    def _get_orderbooks_from_book_ticker(self, products):
+        if (products is None or self.book_ticker is None or
+                not self.book_ticker.is_alive(BOOK_TICKER_MAX_AGE)):
+            return None
+        products = [product for product in products
+                    if ''.join(product.split('_')) in self.filters]
+        cache = self.book_ticker.cache
+        if any(''.join(product.split('_')) not in cache
+               for product in products):
+            return None
+        return [orderbook for orderbook in cache.get_orderbooks(products)
+                if orderbook.get_wall_ask() > Decimal('1e-8')]
+
+    def is_transient_error(self, error):
+        return isinstance(error, BinanceAPIException) and (
+            error.status_code >= 500 or error.code in TRANSIENT_ERROR_CODES)
+
     def get_taker_fee(self, product):
         return Decimal('0.001')
 
@@ -84,11 +269,13 @@ class Binance(Exchange):
     def through_trade_currencies(self):
         return {'BTC', 'BNB', 'ETH', 'USDT'}
 
+    @snapshot_cached
     def get_resources(self):
         return {asset_balance['asset']: Decimal(asset_balance['free'])
                 for asset_balance in self.client.get_account()['balances']
                 if Decimal(asset_balance['free']) > Decimal(0)}
 
+    @invalidates_snapshot
     def place_limit_order(self, order):
         logger.info("creating limit order - {}".format(str(order)))
         order = self._validate_order(order)
@@ -113,11 +300,13 @@ class Binance(Exchange):
         order_id = resp['orderId']
         client_order_id = resp['clientOrderId']
         logger.info("order response - {}".format(str(resp)))
+        self._reserve_in_ledger(order, order_id)
 
         return {'symbol': resp['symbol'],
                 'orderId': order_id,
                 'clientOrderId': client_order_id}
 
+    @invalidates_snapshot
     def place_market_order(self, order, price_estimates):
         """
         place market order
@@ -157,6 +346,7 @@ class Binance(Exchange):
         parsed_response['price_estimates'] = price_estimates
         parsed_response['product'] = '_'.join(binance_product_to_currencies(
             parsed_response['symbol']))
+        self._update_ledger(parsed_response)
         logger.info("parsed order response - {}".format(str(parsed_response)))
         return parsed_response
 
@@ -188,51 +378,59 @@ class Binance(Exchange):
 
         return ret
 
-    def _validate_order(self, order, price_estimates=None):
-        resources = self.get_resources()
+    def _check_order(self, order, resources, price_estimates):
         symbol = ''.join(order.product.split('_'))
-        filt = self.filters[symbol]
-
-        if order._quantity < filt['min_order_size']:
-            return
-        if order._quantity > filt['max_order_size']:
-            order._quantity = filt['max_order_size']
-        order._quantity = quantize(order._quantity, filt['order_step'])
+        if symbol not in self.filters:
+            return 'unknown_product'
+        filt = add_fixed_filters(self.filters[symbol])
+        commodity, base = filt['commodity'], filt['base']
 
         if order._price is not None:
             if order._price < filt['min_price']:
-                return
+                return 'min_price'
             if order._price > filt['max_price']:
-                return
+                return 'max_price'
             if order._price % filt['price_step'] != 0:
-                order._price = quantize(order._price, filt['price_step'],
-                                        down=order._action.name == 'BUY')
-
-        if order._price is None:
-            value = (price_estimates[filt['commodity']] /
-                     price_estimates[filt['base']]) * order._quantity
+                price_scale = get_scale(filt['price_step'])
+                order._price = from_units(to_units(
+                    order._price, price_scale,
+                    down=order._action == OrderAction.BUY),
+                    price_scale)
+            price = order._price
         else:
-            value = order._price * order._quantity
-        if value < filt['min_notional']:
-            return
+            price = price_estimates[commodity] / price_estimates[base]
 
-        if order._action.name == 'SELL':
-            if resources[filt['commodity']] < order._quantity:
-                order._quantity = resources[filt['commodity']]
-                order = self._validate_order(order, price_estimates)
+        reason = 'min_order_size'
+        quantity = order._quantity
+        if quantity > filt['max_order_size']:
+            quantity = filt['max_order_size']
+        if order._action == OrderAction.SELL:
+            if resources.get(commodity, 0) < quantity:
+                quantity = resources.get(commodity, Decimal(0))
+                reason = 'insufficient_resources'
         else:
-            if order._price is None:
-                price_commodity = price_estimates[filt['commodity']]
-                price_base = price_estimates[filt['base']]
-                price = price_commodity / price_base
-            else:
-                price = order._price
-            if resources[filt['base']] < order._quantity * price:
-                order._quantity = resources[filt['base']] / (
+            if resources.get(base, 0) < quantity * price:
+                quantity = resources.get(base, Decimal(0)) / (
                     price * Decimal('1.0001'))
                 # any number
-                order = self._validate_order(order, price_estimates)
-        return order
+                reason = 'insufficient_resources'
+        units = to_units(quantity, filt['order_scale'])
+        order._quantity = from_units(units, filt['order_scale'])
+
+        if units < filt['min_order_units']:
+            return reason
+        if order._quantity * price < filt['min_notional']:
+            return 'min_notional'
+        self._reserve_resources(resources, order, price, commodity, base)
+
+    def is_dust(self, product, quantity, price):
+        symbol = ''.join(product.split('_'))
+        if symbol not in self.filters:
+            return False
+        filt = add_fixed_filters(self.filters[symbol])
+        return (to_units(quantity, filt['order_scale']) <
+                filt['min_order_units'] or
+                quantity * price < filt['min_notional'])
 
     def get_order(self, params):
         """
@@ -260,31 +458,127 @@ class Binance(Exchange):
         """
         logger.info("get order = {}".format(str(params)))
         d = self._parse_params(params)
-        resp = self.client.get_order(**d)
+        resp = self._parse_order_state(self.client.get_order(**d))
+        logger.info("get order response - {}".format(str(resp)))
+        return resp
+
+    def get_open_orders(self, order_responses):
+        """
+        state of placed orders with few requests instead of get_order for
+        every order, open orders are requested symbol by symbol, while it
+        weighs less than one request of all symbols
+        :param order_responses: responses of place_limit_order
+        :return: for every order response like get_order, if order still
+                 rests in orderbook, else None
+        """
+        if not order_responses:
+            return []
+        params = [self._parse_params(order_response)
+                  for order_response in order_responses]
+        resps = []
+        for symbol in get_open_orders_queries(d['symbol'] for d in params):
+            query = {'symbol': symbol} if symbol is not None else {}
+            resps += self.client.get_open_orders(**query)
+        return self._match_open_orders(params, resps)
+
+    def get_poll_interval(self, order_responses, share):
+        """
+        request weight budget is shared by all clients of IP
+        """
+        weight = sum(get_open_orders_weight(symbol)
+                     for symbol in get_open_orders_queries(
+                         self._parse_params(order_response)['symbol']
+                         for order_response in order_responses))
+        return weight / (REQUEST_WEIGHT_LIMITER.rate * share)
+
+    def _match_open_orders(self, params, resps):
+        """
+        :param params: parsed params of placed orders
+        :param resps: open orders from exchange
+        :return: parsed open order for every params, None for closed orders
+        """
+        open_orders = {}
+        for resp in resps:
+            resp = self._parse_order_state(resp)
+            open_orders[(resp['symbol'], resp['orderId'])] = resp
+            open_orders[(resp['symbol'], resp['clientOrderId'])] = resp
+        logger.info("open orders - {}".format(str(open_orders)))
+        return [open_orders.get((d['symbol'], d.get('orderId')),
+                                open_orders.get((d['symbol'],
+                                                 d.get('origClientOrderId'))))
+                for d in params]
+
+    def _parse_order_state(self, resp):
+        """
+        adds orig_quantity and executed_quantity to response of get_order,
+        cancel_order or get_open_orders, applies fill to ledger and releases
+        reservation of closed order
+        """
         resp.update({'orig_quantity': resp['origQty'],
                      'executed_quantity': resp['executedQty']})
-        logger.info("get order response - {}".format(str(resp)))
+        if self.ledger is not None:
+            self._update_ledger_from_order(resp)
+            if resp.get('status') in CLOSED_ORDER_STATUSES:
+                self.ledger.release(resp['orderId'])
         return resp
 
+    def _update_ledger_from_order(self, resp):
+        """
+        apply executed part of order to ledger, order response doesn't
+        contain commission, so it is estimated from fee of the order type
+        """
+        executed_quantity = Decimal(resp['executedQty'])
+        if executed_quantity <= 0:
+            return
+        quote_quantity = Decimal(resp.get('cummulativeQuoteQty', '0'))
+        if quote_quantity > 0:
+            price = quote_quantity / executed_quantity
+        else:
+            price = Decimal(resp['price'])
+        commodity, base = binance_product_to_currencies(resp['symbol'])
+        product = '_'.join([commodity, base])
+        fee = (self.get_taker_fee(product) if resp['type'] == 'MARKET'
+               else self.get_maker_fee(product))
+        if resp['side'] == 'BUY':
+            commissions = {commodity: executed_quantity * fee}
+        else:
+            commissions = {base: executed_quantity * price * fee}
+        self.ledger.apply_fill(product, resp['side'], executed_quantity,
+                               price, commissions, order_id=resp['orderId'])
+
+    @invalidates_snapshot
     def cancel_limit_order(self, params):
         """
         symbol or product: str
         order_id or orderId: int
         client_order_id  or origClientOrderId: str, optional
-        :return: similiar to example
+        :return: similiar to example, quantities are final state of order,
+                 empty if order is already filled or canceled
             {
                 "symbol": "LTCBTC",
                 "origClientOrderId": "myOrder1",
                 "orderId": 1,
-                "clientOrderId": "cancelMyOrder1"
+                "clientOrderId": "cancelMyOrder1",
+                "price": "0.1",
+                "origQty": "1.0",
+                "orig_quantity": "1.0",
+                "executedQty": "0.2",
+                "executed_quantity": "0.2",
+                "cummulativeQuoteQty": "0.02",
+                "status": "CANCELED",
+                "timeInForce": "GTC",
+                "type": "LIMIT",
+                "side": "BUY"
             }
         """
         logger.info("canceled order - {}".format(str(params)))
         d = self._parse_params(params)
         try:
             resp = self.client.cancel_order(**d)
+            if 'executedQty' in resp:
+                resp = self._parse_order_state(resp)
         except BinanceAPIException as e:
-            if e.message != "UNKNOWN_ORDER":
+            if e.code != UNKNOWN_ORDER and e.message != "UNKNOWN_ORDER":
                 raise e
             logger.warning("Exception{code} with message ={message}".format(
                 code=e.code, message=e.message))
@@ -0,0 +1,136 @@
+import time
+import hashlib
+import threading
+from functools import wraps
+from binance.exceptions import BinanceAPIException
+
+from logger import logger
+from internals.rate_limiter import RedisTokenBucket
+
+# binance allows 1200 request weight per minute per IP, bucket is sized so
+# that any minute has at most capacity + 60 * rate = 1200 weight
+REQUEST_WEIGHT_LIMITER = RedisTokenBucket('binance:request_weight',
+                                          rate=18, capacity=120)
+
+# 10 orders per second per account, at most 2 + 8 in any second
+ORDER_RATE = 8
+ORDER_CAPACITY = 2
+
+# weights of Client methods, which are used by Binance
+REQUEST_WEIGHTS = {
+    'get_exchange_info': 1,
+    'get_all_tickers': 2,
+    'get_orderbook_tickers': 2,
+    'get_account': 5,
+    'get_order': 1,
+    'create_order': 1,
+    'order_market': 1,
+    'cancel_order': 1,
+}
+
+# weight of open orders of one symbol and of all symbols at once
+OPEN_ORDERS_WEIGHT = 1
+ALL_OPEN_ORDERS_WEIGHT = 40
+
+ORDER_METHODS = {'create_order', 'order_market'}
+
+TOO_MANY_REQUESTS = 429
+MAX_RETRIES = 5
+
+_order_limiters = {}
+_order_limiters_lock = threading.Lock()
+
+
+def get_order_book_weight(limit: int=100) -> int:
+    if limit <= 100:
+        return 1
+    if limit <= 500:
+        return 5
+    if limit <= 1000:
+        return 10
+    return 50
+
+
+def get_open_orders_weight(symbol: str=None) -> int:
+    return OPEN_ORDERS_WEIGHT if symbol else ALL_OPEN_ORDERS_WEIGHT
+
+
+def get_open_orders_queries(symbols) -> list:
+    """
+    :return: symbols of open orders queries, which weigh less in total:
+             one query per symbol or [None] for one query of all symbols
+    """
+    symbols = sorted(set(symbols))
+    if len(symbols) * OPEN_ORDERS_WEIGHT < ALL_OPEN_ORDERS_WEIGHT:
+        return symbols
+    return [None]
+
+
+def get_order_limiter(api_key: str) -> RedisTokenBucket:
+    """
+    orders bucket of account, shared by all workers
+    """
+    account = hashlib.sha256((api_key or '').encode()).hexdigest()
+    with _order_limiters_lock:
+        if account not in _order_limiters:
+            _order_limiters[account] = RedisTokenBucket(
+                'binance:orders:' + account, rate=ORDER_RATE,
+                capacity=ORDER_CAPACITY)
+        return _order_limiters[account]
+
+
+class RateLimitedClient:
+    """
+    proxy around binance Client, calls wait for their request weight
+    (and order rate of account for new orders) instead of failing,
+    calls rejected with 429 are retried after Retry-After
+    """
+
+    def __init__(self, client, api_key: str=None,
+                 weight_limiter: RedisTokenBucket=REQUEST_WEIGHT_LIMITER,
+                 order_limiter: RedisTokenBucket=None):
+        self.client = client
+        self.weight_limiter = weight_limiter
+        self.order_limiter = (order_limiter if order_limiter is not None
+                              else get_order_limiter(api_key))
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name in ('get_order_book', 'get_open_orders'):
+            weight = None
+        elif name in REQUEST_WEIGHTS:
+            weight = REQUEST_WEIGHTS[name]
+        else:
+            return attr
+
+        @wraps(attr)
+        def _call(**params):
+            if weight is not None:
+                call_weight = weight
+            elif name == 'get_open_orders':
+                call_weight = get_open_orders_weight(params.get('symbol'))
+            else:
+                call_weight = get_order_book_weight(params.get('limit', 100))
+            for i in range(MAX_RETRIES):
+                if name in ORDER_METHODS:
+                    self.order_limiter.acquire()
+                self.weight_limiter.acquire(call_weight)
+                try:
+                    return attr(**params)
+                except BinanceAPIException as e:
+                    if (e.status_code != TOO_MANY_REQUESTS or
+                            i == MAX_RETRIES - 1):
+                        raise e
+                    retry_after = self._get_retry_after(e)
+                    logger.warning(
+                        "{} is rate limited, retry after {}s".format(
+                            name, retry_after))
+                    time.sleep(retry_after)
+        return _call
+
+    @staticmethod
+    def _get_retry_after(e):
+        try:
+            return float(e.response.headers['Retry-After'])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return 1
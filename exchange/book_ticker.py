@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from decimal import Decimal
+from typing import List
+
+import aiohttp
+
+from logger import logger
+from internals.orderbook import OrderBook
+
+BINANCE_BOOK_TICKER_URL = 'wss://stream.binance.com:9443/ws/!bookTicker'
+
+
+class BookTickerCache:
+    """
+    in-memory top of book table: symbol -> (bid, ask, timestamp)
+    entries are immutable tuples, which are replaced by single dict
+    assignment, so readers never take a lock
+    """
+
+    def __init__(self):
+        self._books = {}
+        self.last_update = None
+
+    def update(self, symbol: str, bid: Decimal, ask: Decimal,
+               timestamp: float=None):
+        timestamp = timestamp if timestamp is not None else time.time()
+        self._books[symbol] = (bid, ask, timestamp)
+        self.last_update = timestamp
+
+    def get(self, symbol: str):
+        return self._books.get(symbol)
+
+    def clear(self):
+        """
+        drop all quotes, e.g. when stream is disconnected, quiet symbols
+        aren't updated after reconnect, so their old quotes would look fresh
+        """
+        self._books = {}
+        self.last_update = None
+
+    def __len__(self):
+        return len(self._books)
+
+    def __contains__(self, symbol):
+        return symbol in self._books
+
+    def get_orderbooks(self, products: List[str]) -> List[OrderBook]:
+        """
+        :return: orderbooks of products, which are in cache, each orderbook
+                 has `timestamp` of its last update
+        """
+        orderbooks = []
+        for product in products:
+            entry = self._books.get(''.join(product.split('_')))
+            if entry is None:
+                continue
+            bid, ask, timestamp = entry
+            orderbooks.append(OrderBook(product, {'bid': bid, 'ask': ask},
+                                        timestamp=timestamp))
+        return orderbooks
+
+
+class BookTickerFeed:
+    """
+    keeps BookTickerCache up to date from binance-like bookTicker stream
+    runs event loop in daemon thread and reconnects, when connection is lost
+    or there were no messages for `max_silence` seconds, cache is cleared
+    on disconnect
+    """
+
+    def __init__(self, url: str=BINANCE_BOOK_TICKER_URL,
+                 cache: BookTickerCache=None, max_silence: float=30,
+                 reconnect_delay: float=1):
+        self.url = url
+        self.cache = cache if cache is not None else BookTickerCache()
+        self.max_silence = max_silence
+        self.reconnect_delay = reconnect_delay
+        self.connected = threading.Event()
+        self._stopped = threading.Event()
+        self._loop = None
+        self._task = None
+        self._thread = None
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        self._task = self._loop.create_task(self._run())
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+            self._thread.join()
+            self._loop.close()
+
+    def is_alive(self, max_age: float) -> bool:
+        """
+        feed is alive, if it is connected and got message recently
+        quiet symbols are not updated by the stream, so staleness is
+        measured by the feed, not by every symbol
+        """
+        return (self.connected.is_set() and
+                self.cache.last_update is not None and
+                time.time() - self.cache.last_update <= max_age)
+
+    def handle_message(self, message: str):
+        data = json.loads(message)
+        if 'data' in data:
+            # combined stream
+            data = data['data']
+        if 's' not in data or 'b' not in data or 'a' not in data:
+            return
+        self.cache.update(data['s'], Decimal(data['b']), Decimal(data['a']))
+
+    def _run_loop(self):
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        async with aiohttp.ClientSession() as session:
+            while not self._stopped.is_set():
+                try:
+                    await self._receive(session)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("book ticker feed {} failed: {}".format(
+                        self.url, e))
+                finally:
+                    self.connected.clear()
+                    self.cache.clear()
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def _receive(self, session):
+        async with session.ws_connect(
+                self.url, receive_timeout=self.max_silence) as connection:
+            self.connected.set()
+            async for message in connection:
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    self.handle_message(message.data)
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    break
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_book_ticker_feed():
+    """
+    process-wide feed, started on first use, if BINANCE_BOOK_TICKER_URL is
+    in environment, None otherwise
+    """
+    global _feed
+    url = os.environ.get('BINANCE_BOOK_TICKER_URL')
+    if not url:
+        return None
+    with _feed_lock:
+        if _feed is None:
+            _feed = BookTickerFeed(url).start()
+    return _feed
@@ -1,23 +1,46 @@
+import os
 from decimal import Decimal
 from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
 from cbpro import PublicClient, AuthenticatedClient
 
 from logger import logger
-from exchange.exchange import Exchange
+from exchange.exchange import Exchange, snapshot_cached, \
+    invalidates_snapshot
 from internals.order import Order
-from internals.orderbook import OrderBook
-from internals.utils import quantize
+from internals.orderbook import OrderBook, DepthOrderBook
+from internals.fixed_point import get_scale, to_units, from_units, \
+    add_fixed_filters
+from internals.enums import OrderAction
+from internals.rate_limiter import TokenBucket
+from internals import recording
+
+API_URL = 'https://api.pro.coinbase.com'
+
+# public endpoints are limited to 3 requests per second per IP, bursts up to 6
+PUBLIC_RATE_LIMITER = TokenBucket(rate=3, capacity=6)
+ORDERBOOK_WORKERS = 8
 
 
 class CoinbasePro(Exchange):
+    public_rate_limiter = PUBLIC_RATE_LIMITER
+
     def __init__(self, api_key: str=None,
                  secret_key: str=None,
-                 passphrase: str=None):
+                 passphrase: str=None,
+                 api_url: str=None):
+        """
+        :param api_url: root of REST API, e.g. local stand-in server,
+                        COINBASEPRO_API_URL from environment by default
+        """
         super().__init__()
+        api_url = api_url or os.environ.get('COINBASEPRO_API_URL', API_URL)
         if any(i is None for i in [api_key, secret_key, passphrase]):
-            self.client = PublicClient()
+            self.client = PublicClient(api_url)
         else:
-            self.client = AuthenticatedClient(api_key, secret_key, passphrase)
+            self.client = AuthenticatedClient(api_key, secret_key, passphrase,
+                                              api_url)
+        recording.install(self.client.session)
 
         self.products = self.client.get_products()
         self.filters = {product['id']: {
@@ -25,8 +48,8 @@ class CoinbasePro(Exchange):
             'max_order_size': Decimal(product['base_max_size']),
             'order_step': Decimal('1e-8'),
             'price_step': Decimal(product['quote_increment']),
-            'base': product['quote'],
-            'commodity': product['base']
+            'base': product['quote_currency'],
+            'commodity': product['base_currency']
         } for product in self.products}
 
     def through_trade_currencies(self):
@@ -38,96 +61,119 @@ class CoinbasePro(Exchange):
     def get_maker_fee(self, product):
         return Decimal('0')
 
+    def is_dust(self, product, quantity, price):
+        filt = self.filters.get(product.replace('_', '-'))
+        return filt is not None and quantity < filt['min_order_size']
+
+    @snapshot_cached
     def get_resources(self):
         return {account['currency']: Decimal(account['available'])
                 for account in self.client.get_accounts()}
 
+    @invalidates_snapshot
     def place_market_order(self, order: Order,
                            price_estimates: Dict[str, Decimal]):
 
         logger.info("creating market order - {}".format(str(order)))
-        order = self.validate_order(order, price_estimates)
-        symbol = order.product.replace('_', '-')
+        order = self._validate_order(order, price_estimates)
         logger.info("validated order - {}".format(str(order)))
+        if order is None:
+            return
+        symbol = order.product.replace('_', '-')
         resp = self.client.place_market_order(
-            symbol, order._action.name.lower(), size=order._quantity)
+            symbol, order._action.name.lower(), size=str(order._quantity))
+        if 'message' in resp:
+            logger.warning("order failed - {}".format(resp['message']))
+            return Exception(resp['message'])
 
         parsed_response = self.parse_market_order_response(resp)
         parsed_response['price_estimates'] = price_estimates
         parsed_response['product'] = parsed_response['symbol'].replace(
             '-', '_')
+        self._update_ledger(parsed_response)
         logger.info("parsed order response - {}".format(str(parsed_response)))
         return parsed_response
 
+    @invalidates_snapshot
     def place_limit_order(self, order: Order):
         logger.info("creating limit order - {}".format(str(order)))
-        order = self.validate_order(order)
+        order = self._validate_order(order)
         logger.info("validated order - {}".format(str(order)))
+        if order is None:
+            return
         symbol = order.product.replace('_', '-')
-        resp = self.client.place_market_order(symbol,
-                                              order._action.name.lower(),
-                                              order._price, order._quantity,
-                                              post_only=True)
+        resp = self.client.place_limit_order(symbol,
+                                             order._action.name.lower(),
+                                             str(order._price),
+                                             str(order._quantity),
+                                             post_only=True)
         logger.info("order response - {}".format(str(resp)))
+        if 'message' in resp:
+            return Exception(resp['message'])
+        self._reserve_in_ledger(order, resp['id'])
         return {'order_id': resp['id']}
 
-    def _validate_order(self, order, price_estimates=None):
-        resources = self.get_resources()
+    def _check_order(self, order, resources, price_estimates):
         symbol = order.product.replace('_', '-')
-        filt = self.filters[symbol]
+        if symbol not in self.filters:
+            return 'unknown_product'
+        filt = add_fixed_filters(self.filters[symbol])
         base, commodity = filt['base'], filt['commodity']
-        # quantity
-        if order._quantity < filt['min_order_size']:
-            return
-
-        if order._quantity > filt['max_order_size']:
-            order._quantity = filt['max_order_size']
-
-        if order._quantity % filt['order_step'] > 0:
-            order._quantity = quantize(order._quantity, filt['order_step'])
-
         # price
         if order._price is not None:
             if order._price % filt['price_step'] > 0:
-                order._price = quantize(order._price, filt['price_step'],
-                                        down=(order._action.name == 'BUY'))
+                price_scale = get_scale(filt['price_step'])
+                order._price = from_units(to_units(
+                    order._price, price_scale,
+                    down=(order._action == OrderAction.BUY)),
+                    price_scale)
+            price = order._price
+            fee = 1
+        else:
+            price = price_estimates[commodity] / price_estimates[base]
+            fee = self.get_taker_fee(order.product) + 1
+
+        # quantity
+        reason = 'min_order_size'
+        quantity = order._quantity
+        if quantity > filt['max_order_size']:
+            quantity = filt['max_order_size']
 
         # resources
-        if order._action.name == 'SELL':
-            if order._quantity > resources[commodity]:
-                order._quantity = resources[commodity]
-                order = self._validate_order(order, price_estimates)
+        if order._action == OrderAction.SELL:
+            if quantity > resources.get(commodity, 0):
+                quantity = resources.get(commodity, Decimal(0))
+                reason = 'insufficient_resources'
         else:
             epsilon = Decimal('1.0001')
-            if order._price is not None:
-                price = order._price
-                if price * order._quantity > resources[base]:
-                    order._quantity = resources[base] / (
-                        price * epsilon)
-                    order = self._validate_order(order, price_estimates)
-            else:
-                price = price_estimates[commodity] / price_estimates[base]
-                fee = self.get_taker_fee(order.product) + 1
-                if price * order._quantity * fee > resources[base]:
-                    order._quantity = resources[base] / (price * fee * epsilon)
-                    order = self._validate_order(order, price_estimates)
-        return order
-
-    def parse_market_order_response(self, response):
-        fills = self.client.get_fills(response['id'])
-        total_size = [Decimal(fill['size']) for fill in fills]
-        total_money = [Decimal(fill['size']) * Decimal(fill['price'])
-                       for fill in fills]
+            if price * quantity * fee > resources.get(base, 0):
+                quantity = resources.get(base, Decimal(0)) / (
+                    price * fee * epsilon)
+                reason = 'insufficient_resources'
+
+        units = to_units(quantity, filt['order_scale'])
+        order._quantity = from_units(units, filt['order_scale'])
+        if units < filt['min_order_units']:
+            return reason
+        self._reserve_resources(resources, order, price, commodity, base)
+
+    def parse_market_order_response(self, response, fills=None):
+        if fills is None:
+            fills = list(self.client.get_fills(order_id=response['id']))
+        total_size = sum(Decimal(fill['size']) for fill in fills)
+        total_money = sum(Decimal(fill['size']) * Decimal(fill['price'])
+                          for fill in fills)
         fee_asset = response['product_id'].split('-')[-1]
-        product = response['product_id'].replace('-', '_')
-        fee = self.get_taker_fee(product) * total_money
+        fee = sum(Decimal(fill['fee']) for fill in fills)
         return {'symbol': response['product_id'],
                 'orderId': response['id'],
-                'executed_quantity': Decimal(response['executed_value']),
-                'mean_price': total_money / total_size,
+                'executed_quantity': total_size,
+                'mean_price': (total_money / total_size if total_size
+                               else Decimal(0)),
                 'commission_' + fee_asset: fee,
                 'side': response['side']}
 
+    @invalidates_snapshot
     def cancel_limit_order(self, response):
         logger.info("canceled order - {}".format(response))
         order_id = response['order_id']
@@ -137,19 +183,52 @@ class CoinbasePro(Exchange):
         logger.info("get order = {}".format(str(response)))
         order_id = response['order_id']
         resp = self.client.get_order(order_id)
-        # TODO: executed quantity and orig_quantity
-        resp.update({'executed_quantity': Decimal(resp['executed_value']),
+        resp.update({'executed_quantity': Decimal(resp['filled_size']),
                      'orig_quantity': Decimal(resp['size'])})
         logger.info("get order response - {}".format(str(resp)))
+        if self.ledger is not None:
+            self._update_ledger_from_order(resp)
+            if resp.get('status') == 'done':
+                self.ledger.release(resp['id'])
         return resp
 
+    def _update_ledger_from_order(self, resp):
+        filled_size = Decimal(resp['filled_size'])
+        if filled_size <= 0:
+            return
+        price = Decimal(resp['executed_value']) / filled_size
+        fee_asset = resp['product_id'].split('-')[-1]
+        self.ledger.apply_fill(resp['product_id'].replace('-', '_'),
+                               resp['side'], filled_size, price,
+                               {fee_asset: Decimal(resp['fill_fees'])},
+                               order_id=resp['id'])
+
+    @snapshot_cached
     def get_orderbooks(self, products: List[str], depth: int=1):
-        orderbooks = []
-        for product in products:
-            symbol = product.replace('_', '-')
-            raw_orderbook = self.client.get_product_order_book(symbol)
-            orderbook = OrderBook(product,
-                                  {'bid': raw_orderbook['bids'][0][0],
-                                   'ask': raw_orderbook['asks'][0][0]})
-            orderbooks.append(orderbook)
-        return orderbooks
+        """
+        orderbooks are downloaded concurrently, only for existing products
+        depth 1 uses best bid and ask (level 1), deeper orderbooks use
+        level 2, which has at most 50 aggregated levels on each side
+        """
+        products = [product for product in products
+                    if product.replace('_', '-') in self.filters]
+        if not products:
+            return []
+        workers = min(ORDERBOOK_WORKERS, len(products))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(
+                lambda product: self._get_orderbook(product, depth),
+                products))
+
+    def _get_orderbook(self, product: str, depth: int):
+        symbol = product.replace('_', '-')
+        level = 1 if depth == 1 else 2
+        with self.public_rate_limiter:
+            raw_orderbook = self.client.get_product_order_book(symbol,
+                                                               level=level)
+        if depth == 1:
+            return OrderBook(
+                product, {'bid': Decimal(raw_orderbook['bids'][0][0]),
+                          'ask': Decimal(raw_orderbook['asks'][0][0])})
+        return DepthOrderBook(product, raw_orderbook['bids'][:depth],
+                              raw_orderbook['asks'][:depth])
@@ -1,14 +1,217 @@
+import threading
+from copy import copy
+from functools import wraps
+from contextlib import contextmanager
 from internals.order import Order
+from internals.enums import OrderAction, OrderType
+from internals.ledger import BalanceLedger
+
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def snapshot_cached(method):
+    """
+    memoize read-only call, while `Exchange.snapshot` scope is open
+    """
+    @wraps(method)
+    def _wrapped(self, *args, **kwargs):
+        cache = self._get_snapshot_cache()
+        if cache is None:
+            return method(self, *args, **kwargs)
+        key = (method.__name__, _freeze(args), _freeze(kwargs))
+        if key not in cache:
+            cache[key] = method(self, *args, **kwargs)
+        return copy(cache[key])
+    return _wrapped
+
+
+def invalidates_snapshot(method):
+    """
+    drop memoized calls after call, which changes state of account
+    """
+    @wraps(method)
+    def _wrapped(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.invalidate_snapshot()
+    return _wrapped
 
 
 class Exchange:
     def __init__(self):
-        pass
+        self._local = threading.local()
+
+    @contextmanager
+    def snapshot(self):
+        """
+        memoize read-only calls (resources, orderbooks) inside the scope,
+        scopes may be nested, memoized calls are visible only to the thread,
+        which opened the scope
+        """
+        local = self._get_local()
+        local.depth = getattr(local, 'depth', 0) + 1
+        if local.depth == 1:
+            local.cache = {}
+        try:
+            yield self
+        finally:
+            local.depth -= 1
+            if local.depth == 0:
+                local.cache = None
+
+    def invalidate_snapshot(self):
+        cache = self._get_snapshot_cache()
+        if cache is not None:
+            cache.clear()
+
+    @property
+    def ledger(self):
+        """
+        ledger of the innermost track_resources scope of the thread
+        """
+        return getattr(self._get_local(), 'ledger', None)
+
+    @contextmanager
+    def track_resources(self, resources=None, ledger=None):
+        """
+        inside the scope orders are validated against local ledger, which is
+        updated from fills, instead of downloading resources for every order
+
+        like snapshot, ledger is visible only to the thread, which opened the
+        scope, so exchange can be shared by concurrent rebalances, scopes may
+        be nested
+        :param ledger: existing ledger, e.g. of thread, which started worker
+                       threads, new ledger is created if not specified
+        """
+        if ledger is None:
+            ledger = BalanceLedger(self.get_resources, resources)
+        local = self._get_local()
+        previous = getattr(local, 'ledger', None)
+        local.ledger = ledger
+        try:
+            yield ledger
+        finally:
+            local.ledger = previous
+
+    def get_available_resources(self):
+        if self.ledger is not None:
+            return self.ledger.get_resources()
+        return self.get_resources()
+
+    def validate_orders(self, orders, price_estimates=None, resources=None):
+        """
+        validate whole plan of orders against single resources snapshot
+        orders are checked in the given (execution) order, resources are
+        decreased by spendings and increased by expected proceeds of every
+        accepted order
+        :return: list of pairs (validated order or None, rejection reason)
+        """
+        if resources is None:
+            resources = self.get_available_resources()
+        resources = dict(resources)
+        results = []
+        for order in orders:
+            reason = self._check_order(order, resources, price_estimates)
+            if reason is None:
+                results.append((order, None))
+            else:
+                results.append((None, reason))
+        return results
+
+    def _validate_order(self, order, price_estimates=None):
+        return self.validate_orders([order], price_estimates)[0][0]
+
+    def _check_order(self, order, resources, price_estimates):
+        """
+        fit order into exchange filters and resources in place
+        :return: rejection reason or None, if order is valid
+        """
+        raise NotImplementedError
+
+    def is_dust(self, product: str, quantity, price) -> bool:
+        """
+        quantity is too small to be placed as new order, so remaining part
+        of order of this size won't be filled
+        """
+        return False
+
+    def _reserve_resources(self, resources, order, price, commodity, base):
+        if order._type == OrderType.MARKET:
+            fee = self.get_taker_fee(order.product)
+        else:
+            fee = self.get_maker_fee(order.product)
+        value = order._quantity * price
+        if order._action == OrderAction.SELL:
+            resources[commodity] = resources.get(commodity, 0) - (
+                order._quantity)
+            resources[base] = resources.get(base, 0) + value * (1 - fee)
+        else:
+            resources[base] = resources.get(base, 0) - value
+            resources[commodity] = resources.get(commodity, 0) + (
+                order._quantity * (1 - fee))
+
+    def is_transient_error(self, error: Exception) -> bool:
+        """
+        error, after which the same request may succeed
+        """
+        return False
+
+    def _update_ledger(self, parsed_response):
+        """
+        apply parsed market order response to ledger
+        """
+        if self.ledger is None:
+            return
+        commissions = {k[len('commission_'):]: v
+                       for k, v in parsed_response.items()
+                       if k.startswith('commission_')}
+        self.ledger.apply_fill(parsed_response['product'],
+                               parsed_response['side'],
+                               parsed_response['executed_quantity'],
+                               parsed_response['mean_price'],
+                               commissions,
+                               order_id=parsed_response['orderId'])
+
+    def _reserve_in_ledger(self, order: Order, order_id):
+        """
+        reserve resources of placed limit order, which are locked by
+        exchange, while the order rests in orderbook
+        """
+        if self.ledger is not None:
+            self.ledger.reserve(order.product, order._action.name,
+                                order._quantity, order._price, order_id)
+
+    def _get_local(self):
+        """
+        state of snapshot and track_resources scopes of the thread
+        """
+        if '_local' not in self.__dict__:
+            self._local = threading.local()
+        return self._local
+
+    def _get_snapshot_cache(self):
+        return getattr(self._get_local(), 'cache', None)
 
     def get_orderbooks(self, depth: int =1):
         # products in 'commodity_base' format
         raise NotImplementedError
 
+    def get_top_of_book(self, products):
+        """
+        best bids and asks from live feed without request to exchange,
+        None if there is no live feed
+        """
+        return None
+
     def get_resources(self):
         raise NotImplementedError
 
@@ -24,6 +227,22 @@ class Exchange:
     def get_order(self, **params):
         raise NotImplementedError
 
+    def get_open_orders(self, order_responses):
+        """
+        state of placed orders in bulk, for every order response like
+        get_order or None if order doesn't rest in orderbook anymore,
+        None if exchange has no bulk query
+        """
+        return None
+
+    def get_poll_interval(self, order_responses, share: float) -> float:
+        """
+        seconds between checks of placed orders (get_open_orders or
+        get_order of every order), so that checks take at most `share` of
+        request weight budget, 0 if exchange has no such budget
+        """
+        return 0
+
     def get_taker_fee(self, product):
         raise NotImplementedError
 
@@ -0,0 +1,75 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from exchange.exchange import Exchange
+
+
+class ExchangeRegistry:
+    """
+    keeps live exchange clients in memory, so repeated requests of the same
+    account reuse http keep-alive connections and downloaded filters
+
+    clients are keyed by hash of credentials, credentials themselves are only
+    held by clients and are never persisted
+    least recently used client is evicted, when there are more than
+    `max_size` clients, clients not used for `idle_timeout` seconds are
+    evicted as well
+    """
+
+    def __init__(self, max_size: int=256, idle_timeout: int=600):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(exchange_class, *credentials) -> str:
+        h = hashlib.sha256(exchange_class.__name__.encode())
+        for credential in credentials:
+            h.update(b'\0')
+            h.update(str(credential).encode())
+        return h.hexdigest()
+
+    def get(self, exchange_class, *credentials) -> Exchange:
+        key = self.key(exchange_class, *credentials)
+        with self._lock:
+            self._evict_idle()
+            if key in self._clients:
+                exchange, _ = self._clients.pop(key)
+                self._clients[key] = (exchange, time.time())
+                return exchange
+
+        exchange = exchange_class(*credentials)
+        with self._lock:
+            if key in self._clients:
+                # created concurrently by another thread
+                exchange, _ = self._clients.pop(key)
+            self._clients[key] = (exchange, time.time())
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+        return exchange
+
+    def evict(self, exchange_class, *credentials):
+        key = self.key(exchange_class, *credentials)
+        with self._lock:
+            self._clients.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def _evict_idle(self):
+        now = time.time()
+        while self._clients:
+            key, (_, last_used) = next(iter(self._clients.items()))
+            if now - last_used <= self.idle_timeout:
+                break
+            self._clients.popitem(last=False)
+
+
+exchange_registry = ExchangeRegistry()
@@ -0,0 +1,506 @@
+import math
+import time
+import random
+import itertools
+import threading
+from decimal import Decimal
+from typing import Dict
+from binance.exceptions import BinanceAPIException
+
+from exchange.exchange import Exchange
+from exchange.binance import Binance, UNKNOWN_ORDER, parse_filters, \
+    filters_from_exchange_info
+from internals.utils import get_quantizer
+
+# quote currencies in order of priority, product commodity_quote exists,
+# if quote has higher priority than commodity
+QUOTES = ['USDT', 'BTC', 'ETH', 'BNB']
+MIN_NOTIONALS = {'USDT': Decimal('10'), 'BTC': Decimal('0.001'),
+                 'ETH': Decimal('0.01'), 'BNB': Decimal('0.1')}
+
+# binance error codes
+FILTER_FAILURE = -1013
+NEW_ORDER_REJECTED = -2010
+
+
+class SimulatedAPIException(BinanceAPIException):
+    """
+    error of simulated market, handled like error of binance api
+    """
+
+    def __init__(self, code: int, message: str, status_code: int=400):
+        Exception.__init__(self, message)
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+        self.response = None
+        self.request = None
+
+    def __str__(self):
+        return 'APIError(code={}): {}'.format(self.code, self.message)
+
+
+def _step(x: Decimal) -> Decimal:
+    """
+    power of 10 in [1e-8, 1], which is close to x
+    """
+    exponent = min(0, max(-8, math.floor(math.log10(x))))
+    return Decimal(1).scaleb(exponent)
+
+
+class SimulatedMarket:
+    """
+    in-memory binance-like market
+    every product has orderbook of simulated liquidity, market orders are
+    matched against it level by level, so big orders are filled partially
+    or at worse prices, limit maker orders rest outside of orderbook and are
+    filled by simulated flow: on every call each open order is filled by
+    `limit_fill_ratio` of remaining quantity with `limit_fill_probability`
+    """
+
+    def __init__(self, prices: Dict[str, Decimal], depth: int=20,
+                 spread: Decimal=Decimal('0.001'),
+                 level_step: Decimal=Decimal('0.0005'),
+                 level_notional: Decimal=Decimal('10000'),
+                 taker_fee: Decimal=Decimal('0.001'),
+                 maker_fee: Decimal=Decimal('0.001'),
+                 latency: float=0,
+                 limit_fill_probability: float=0.5,
+                 limit_fill_ratio: Decimal=Decimal('0.5'),
+                 seed: int=0):
+        """
+        :param prices: currency -> price in USDT
+        :param level_notional: mean notional (in USDT) of orderbook level
+        :param latency: seconds, which every call takes
+        """
+        self.prices = {currency: Decimal(price)
+                       for currency, price in prices.items()}
+        self.prices['USDT'] = Decimal(1)
+        self.taker_fee = taker_fee
+        self.maker_fee = maker_fee
+        self.latency = latency
+        self.limit_fill_probability = limit_fill_probability
+        self.limit_fill_ratio = limit_fill_ratio
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.orders = {}
+        self.open_orders = set()
+        self._order_ids = itertools.count(1)
+        self.filters = {}
+        self.books = {}
+        for commodity, base in self._generate_products():
+            symbol = commodity + base
+            self.filters[symbol] = self._generate_filter(commodity, base)
+            self.books[symbol] = self._generate_book(
+                symbol, depth, spread, level_step, level_notional)
+
+    @classmethod
+    def random_market(cls, number_of_currencies: int, seed: int=0,
+                      **kwargs):
+        """
+        market of QUOTES and `number_of_currencies` currencies X000, X001...
+        with random prices from 0.001 to 10000 USDT
+        """
+        generator = random.Random(seed)
+        prices = {'BTC': Decimal('10000'), 'ETH': Decimal('300'),
+                  'BNB': Decimal('10')}
+        for i in range(number_of_currencies):
+            prices['X{:03d}'.format(i)] = Decimal(
+                10 ** generator.uniform(-3, 4)).quantize(Decimal('1e-6'))
+        return cls(prices, seed=seed, **kwargs)
+
+    def _generate_products(self):
+        for commodity in sorted(self.prices):
+            for base in QUOTES:
+                if base == commodity:
+                    break
+                yield commodity, base
+
+    def _generate_filter(self, commodity, base):
+        price = self.prices[commodity] / self.prices[base]
+        price_step = _step(price / Decimal('1e5'))
+        order_step = _step(MIN_NOTIONALS[base] / price / 1000)
+        return {
+            'commodity': commodity,
+            'base': base,
+            'min_price': price_step,
+            'max_price': Decimal('1e7'),
+            'price_step': price_step,
+            'min_order_size': order_step,
+            'max_order_size': Decimal('9e7'),
+            'order_step': order_step,
+            'min_notional': MIN_NOTIONALS[base],
+        }
+
+    def _generate_book(self, symbol, depth, spread, level_step,
+                       level_notional):
+        filt = self.filters[symbol]
+        mid = self.prices[filt['commodity']] / self.prices[filt['base']]
+        price_quantizer = get_quantizer(filt['price_step'])
+        size_quantizer = get_quantizer(filt['order_step'])
+        book = {'bids': [], 'asks': []}
+        for i in range(depth):
+            shift = spread / 2 + level_step * i
+            bid = price_quantizer(mid * (1 - shift))
+            ask = price_quantizer(mid * (1 + shift), down=False)
+            for side, price in [('bids', bid), ('asks', ask)]:
+                notional = level_notional * Decimal(
+                    self.random.uniform(0.5, 1.5))
+                size = size_quantizer(
+                    notional / self.prices[filt['commodity']])
+                if price > 0 and size > 0:
+                    book[side].append([price, size])
+        return book
+
+    def get_exchange_info(self):
+        return {'symbols': [{
+            'symbol': symbol,
+            'baseAsset': filt['commodity'],
+            'quoteAsset': filt['base'],
+            'filters': [
+                {'filterType': 'PRICE_FILTER',
+                 'minPrice': str(filt['min_price']),
+                 'maxPrice': str(filt['max_price']),
+                 'tickSize': str(filt['price_step'])},
+                {'filterType': 'LOT_SIZE',
+                 'minQty': str(filt['min_order_size']),
+                 'maxQty': str(filt['max_order_size']),
+                 'stepSize': str(filt['order_step'])},
+                {'filterType': 'MIN_NOTIONAL',
+                 'minNotional': str(filt['min_notional'])}]
+        } for symbol, filt in self.filters.items()]}
+
+    def check_filters(self, symbol, quantity, price):
+        if symbol not in self.filters:
+            raise SimulatedAPIException(-1121, 'Invalid symbol.')
+        filt = self.filters[symbol]
+        if (quantity < filt['min_order_size'] or
+                quantity > filt['max_order_size'] or
+                quantity % filt['order_step'] != 0):
+            raise SimulatedAPIException(FILTER_FAILURE,
+                                        'Filter failure: LOT_SIZE')
+        if price is not None and (
+                price < filt['min_price'] or price > filt['max_price'] or
+                price % filt['price_step'] != 0):
+            raise SimulatedAPIException(FILTER_FAILURE,
+                                        'Filter failure: PRICE_FILTER')
+
+    def match(self, symbol, side, quantity):
+        """
+        take liquidity of orderbook
+        :return: list of fills (price, quantity)
+        """
+        levels = self.books[symbol]['asks' if side == 'BUY' else 'bids']
+        fills = []
+        remaining = quantity
+        while remaining > 0 and levels:
+            price, size = levels[0]
+            executed = min(size, remaining)
+            fills.append((price, executed))
+            remaining -= executed
+            if executed == size:
+                levels.pop(0)
+            else:
+                levels[0][1] -= executed
+        return fills
+
+    def new_order_id(self):
+        return next(self._order_ids)
+
+    def simulate_flow(self):
+        """
+        fill open limit orders by simulated market flow
+        """
+        for order_id in sorted(self.open_orders):
+            order = self.orders[order_id]
+            if self.random.random() >= self.limit_fill_probability:
+                continue
+            remaining = order['origQty'] - order['executedQty']
+            filt = self.filters[order['symbol']]
+            executed = get_quantizer(filt['order_step'])(
+                remaining * self.limit_fill_ratio)
+            if remaining - executed < filt['min_order_size']:
+                executed = remaining
+            order['account'].fill(order, executed)
+
+
+class SimulatedClient:
+    """
+    account on SimulatedMarket, which has subset of python-binance Client
+    interface, used by Binance
+    """
+    ORDER_TYPE_LIMIT_MAKER = 'LIMIT_MAKER'
+
+    def __init__(self, market: SimulatedMarket, resources: Dict[str, Decimal],
+                 commission_in_base: bool=False):
+        """
+        :param commission_in_base: commission of buy orders is paid in base
+                                   currency (like on coinbase pro) instead of
+                                   received commodity
+        """
+        self.market = market
+        self.commission_in_base = commission_in_base
+        self.free = {currency: Decimal(amount)
+                     for currency, amount in resources.items()}
+        self.locked = {}
+        self.calls = 0
+
+    def _call(self):
+        # round trip doesn't hold market, so concurrent calls overlap
+        if self.market.latency:
+            time.sleep(self.market.latency)
+        with self.market.lock:
+            self.calls += 1
+            self.market.simulate_flow()
+
+    def get_exchange_info(self):
+        self._call()
+        with self.market.lock:
+            return self.market.get_exchange_info()
+
+    def get_orderbook_tickers(self):
+        self._call()
+        with self.market.lock:
+            return [{'symbol': symbol,
+                     'bidPrice': str(book['bids'][0][0] if book['bids']
+                                     else 0),
+                     'bidQty': str(book['bids'][0][1] if book['bids'] else 0),
+                     'askPrice': str(book['asks'][0][0] if book['asks']
+                                     else 0),
+                     'askQty': str(book['asks'][0][1] if book['asks'] else 0)}
+                    for symbol, book in self.market.books.items()]
+
+    def get_all_tickers(self):
+        return [{'symbol': ticker['symbol'],
+                 'price': str((Decimal(ticker['bidPrice']) +
+                               Decimal(ticker['askPrice'])) / 2)}
+                for ticker in self.get_orderbook_tickers()]
+
+    def get_order_book(self, symbol, limit=100):
+        self._call()
+        with self.market.lock:
+            book = self.market.books[symbol]
+            return {side: [[str(price), str(size)]
+                           for price, size in book[side][:limit]]
+                    for side in ['bids', 'asks']}
+
+    def get_account(self):
+        self._call()
+        with self.market.lock:
+            currencies = set(self.free) | set(self.locked)
+            return {'balances': [
+                {'asset': currency,
+                 'free': str(self.free.get(currency, Decimal(0))),
+                 'locked': str(self.locked.get(currency, Decimal(0)))}
+                for currency in sorted(currencies)]}
+
+    def order_market(self, side, symbol, quantity, **params):
+        self._call()
+        with self.market.lock:
+            quantity = Decimal(str(quantity))
+            self.market.check_filters(symbol, quantity, None)
+            filt = self.market.filters[symbol]
+            commodity, base = filt['commodity'], filt['base']
+            if side == 'SELL' and self.free.get(commodity, 0) < quantity:
+                raise SimulatedAPIException(
+                    NEW_ORDER_REJECTED,
+                    'Account has insufficient balance for requested action.')
+            levels = self.market.books[symbol][
+                'asks' if side == 'BUY' else 'bids']
+            if levels and side == 'BUY':
+                # binance checks balance with price of best ask
+                if self.free.get(base, 0) < quantity * levels[0][0]:
+                    raise SimulatedAPIException(
+                        NEW_ORDER_REJECTED, 'Account has insufficient '
+                                            'balance for requested action.')
+            if not levels or quantity * levels[0][0] < filt['min_notional']:
+                raise SimulatedAPIException(FILTER_FAILURE,
+                                            'Filter failure: MIN_NOTIONAL')
+            fills = self.market.match(symbol, side, quantity)
+            order = self._new_order(symbol, side, 'MARKET', quantity, None)
+            self.market.orders[order['orderId']] = order
+            executed_fills = []
+            for price, executed in fills:
+                if side == 'BUY':
+                    # book walks to worse prices, buy as much as possible
+                    affordable = self.free.get(base, 0) / price
+                    if self.commission_in_base:
+                        affordable /= 1 + self.market.taker_fee
+                    executed = min(executed, get_quantizer(
+                        filt['order_step'])(affordable))
+                    if executed <= 0:
+                        break
+                commission = self.fill(order, executed, price,
+                                       self.market.taker_fee)
+                executed_fills.append({
+                    'price': str(price), 'qty': str(executed),
+                    'commission': str(commission),
+                    'commissionAsset': (commodity if side == 'BUY' and
+                                        not self.commission_in_base
+                                        else base)})
+            order['status'] = ('FILLED' if order['executedQty'] == quantity
+                               else 'EXPIRED')
+            response = self._order_response(order)
+            response['fills'] = executed_fills
+            return response
+
+    def create_order(self, side, symbol, quantity, price, type, **params):
+        assert type == self.ORDER_TYPE_LIMIT_MAKER
+        self._call()
+        with self.market.lock:
+            quantity = Decimal(str(quantity))
+            price = Decimal(str(price))
+            self.market.check_filters(symbol, quantity, price)
+            filt = self.market.filters[symbol]
+            if quantity * price < filt['min_notional']:
+                raise SimulatedAPIException(FILTER_FAILURE,
+                                            'Filter failure: MIN_NOTIONAL')
+            book = self.market.books[symbol]
+            if (side == 'BUY' and book['asks'] and
+                    price >= book['asks'][0][0]) or (
+                    side == 'SELL' and book['bids'] and
+                    price <= book['bids'][0][0]):
+                raise SimulatedAPIException(
+                    NEW_ORDER_REJECTED,
+                    'Order would immediately match and take.')
+            currency, amount = ((filt['base'], quantity * price)
+                                if side == 'BUY'
+                                else (filt['commodity'], quantity))
+            if self.free.get(currency, 0) < amount:
+                raise SimulatedAPIException(
+                    NEW_ORDER_REJECTED,
+                    'Account has insufficient balance for requested action.')
+            self._move(self.free, self.locked, currency, amount)
+            order = self._new_order(symbol, side, type, quantity, price)
+            order['status'] = 'NEW'
+            self.market.orders[order['orderId']] = order
+            self.market.open_orders.add(order['orderId'])
+            response = self._order_response(order)
+            response['fills'] = []
+            return response
+
+    def get_order(self, symbol, orderId=None, **params):
+        self._call()
+        with self.market.lock:
+            return self._order_response(self._find_order(symbol, orderId))
+
+    def cancel_order(self, symbol, orderId=None, **params):
+        self._call()
+        with self.market.lock:
+            order = self._find_order(symbol, orderId)
+            if order['status'] not in ('NEW', 'PARTIALLY_FILLED'):
+                raise SimulatedAPIException(UNKNOWN_ORDER,
+                                            'Unknown order sent.')
+            filt = self.market.filters[symbol]
+            remaining = order['origQty'] - order['executedQty']
+            if order['side'] == 'BUY':
+                self._move(self.locked, self.free, filt['base'],
+                           remaining * order['price'])
+            else:
+                self._move(self.locked, self.free, filt['commodity'],
+                           remaining)
+            order['status'] = 'CANCELED'
+            self.market.open_orders.discard(order['orderId'])
+            response = self._order_response(order)
+            response.update({'origClientOrderId': order['clientOrderId'],
+                             'clientOrderId': 'cancel' +
+                                              order['clientOrderId']})
+            return response
+
+    def get_open_orders(self, symbol=None, **params):
+        self._call()
+        with self.market.lock:
+            orders = [self.market.orders[order_id]
+                      for order_id in sorted(self.market.open_orders)]
+            return [self._order_response(order) for order in orders
+                    if order['account'] is self and
+                    symbol in (None, order['symbol'])]
+
+    def fill(self, order, executed, price=None, fee=None):
+        """
+        execute `executed` quantity of order, limit orders are executed at
+        their price from locked resources
+        :return: commission
+        """
+        filt = self.market.filters[order['symbol']]
+        commodity, base = filt['commodity'], filt['base']
+        limit = price is None
+        price = order['price'] if limit else price
+        fee = self.market.maker_fee if fee is None else fee
+        spent = self.locked if limit else self.free
+        value = executed * price
+        if order['side'] == 'BUY' and self.commission_in_base:
+            commission = value * fee
+            spent[base] -= value
+            self.free[base] -= commission
+            self.free[commodity] = self.free.get(commodity, 0) + executed
+        elif order['side'] == 'BUY':
+            commission = executed * fee
+            spent[base] -= value
+            self.free[commodity] = (self.free.get(commodity, 0) + executed -
+                                    commission)
+        else:
+            commission = value * fee
+            spent[commodity] -= executed
+            self.free[base] = self.free.get(base, 0) + value - commission
+        order['executedQty'] += executed
+        order['cummulativeQuoteQty'] += value
+        if limit:
+            if order['executedQty'] == order['origQty']:
+                order['status'] = 'FILLED'
+                self.market.open_orders.discard(order['orderId'])
+            else:
+                order['status'] = 'PARTIALLY_FILLED'
+        return commission
+
+    def _new_order(self, symbol, side, type, quantity, price):
+        order_id = self.market.new_order_id()
+        return {'account': self, 'symbol': symbol, 'orderId': order_id,
+                'clientOrderId': 'simulated{}'.format(order_id),
+                'price': price, 'origQty': quantity,
+                'executedQty': Decimal(0),
+                'cummulativeQuoteQty': Decimal(0), 'status': 'NEW',
+                'timeInForce': 'GTC', 'type': type, 'side': side,
+                'time': int(time.time() * 1000)}
+
+    def _find_order(self, symbol, order_id):
+        order = self.market.orders.get(order_id)
+        if order is None or order['account'] is not self or (
+                order['symbol'] != symbol):
+            raise SimulatedAPIException(-2013, 'Order does not exist.')
+        return order
+
+    @staticmethod
+    def _order_response(order):
+        response = {k: str(v) if isinstance(v, Decimal) else v
+                    for k, v in order.items() if k != 'account'}
+        if response['price'] is None:
+            response['price'] = '0'
+        return response
+
+    @staticmethod
+    def _move(source, destination, currency, amount):
+        source[currency] = source.get(currency, 0) - amount
+        destination[currency] = destination.get(currency, 0) + amount
+
+
+class SimulatedExchange(Binance):
+    """
+    Binance on SimulatedMarket: everything except network is the code of
+    Binance, so rebalancers can be run end-to-end and profiled offline
+    """
+
+    def __init__(self, market: SimulatedMarket,
+                 resources: Dict[str, Decimal]):
+        Exchange.__init__(self)
+        self.market = market
+        self.client = SimulatedClient(market, resources)
+        self.filters = parse_filters(filters_from_exchange_info(
+            self.client.get_exchange_info()))
+        self.book_ticker = None
+
+    def get_taker_fee(self, product):
+        return self.market.taker_fee
+
+    def get_maker_fee(self, product):
+        return self.market.maker_fee
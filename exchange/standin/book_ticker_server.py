@@ -0,0 +1,145 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from decimal import Decimal
+
+from aiohttp import web
+
+
+class BookTickerServer:
+    """
+    local stand-in for binance bookTicker stream, every published quote is
+    sent to all connected clients
+    aiohttp server runs its event loop in daemon thread, so it can be used
+    from sync code and tests
+    """
+
+    def __init__(self, host: str='127.0.0.1', port: int=0):
+        self._loop = asyncio.new_event_loop()
+        app = web.Application()
+        app.router.add_get('/ws/{stream}', self._handle)
+        self._runner = web.AppRunner(app)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, host, port)
+        self._loop.run_until_complete(site.start())
+        self.host, self.port = site._server.sockets[0].getsockname()[:2]
+        self.url = 'ws://{}:{}/ws/!bookTicker'.format(self.host, self.port)
+        self._clients = []
+        self._update_id = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._call(self._shutdown())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def wait_for_clients(self, n: int=1, timeout: float=5):
+        deadline = time.time() + timeout
+        while len(self._clients) < n and time.time() < deadline:
+            time.sleep(0.01)
+        return len(self._clients) >= n
+
+    def publish(self, symbol: str, bid: Decimal, ask: Decimal,
+                bid_quantity: Decimal=Decimal(1),
+                ask_quantity: Decimal=Decimal(1)):
+        self._call(self._publish(symbol, bid, ask, bid_quantity,
+                                 ask_quantity))
+
+    def disconnect_clients(self):
+        """
+        drop all connections, as if exchange restarted the stream
+        """
+        self._call(self._disconnect_clients())
+
+    def run_random_walk(self, prices, interval: float=0.05,
+                        spread: float=1e-3, volatility: float=1e-4):
+        """
+        publish quotes of symbols, which mid prices follow random walk
+        :param prices: dict from symbol to initial mid price
+        """
+        prices = {symbol: float(price) for symbol, price in prices.items()}
+        while not self._stopped.is_set():
+            symbol = random.choice(list(prices))
+            prices[symbol] *= 1 + random.gauss(0, volatility)
+            mid = prices[symbol]
+            self.publish(symbol,
+                         Decimal('{:.8f}'.format(mid * (1 - spread / 2))),
+                         Decimal('{:.8f}'.format(mid * (1 + spread / 2))))
+            self._stopped.wait(interval)
+
+    def _call(self, coroutine):
+        """
+        runs coroutine in event loop of server and waits for its result
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine,
+                                                self._loop).result()
+
+    async def _handle(self, request):
+        client = web.WebSocketResponse()
+        await client.prepare(request)
+        self._clients.append(client)
+        try:
+            async for _ in client:
+                pass
+        finally:
+            if client in self._clients:
+                self._clients.remove(client)
+        return client
+
+    async def _publish(self, symbol, bid, ask, bid_quantity, ask_quantity):
+        self._update_id += 1
+        message = json.dumps({'u': self._update_id, 's': symbol,
+                              'b': str(bid), 'B': str(bid_quantity),
+                              'a': str(ask), 'A': str(ask_quantity)})
+        for client in list(self._clients):
+            try:
+                await client.send_str(message)
+            except (ConnectionError, RuntimeError):
+                self._clients.remove(client)
+
+    async def _disconnect_clients(self):
+        clients, self._clients = self._clients, []
+        for client in clients:
+            await client.close()
+
+    async def _shutdown(self):
+        await self._disconnect_clients()
+        await self._runner.cleanup()
+
+
+def parse_args(*argument_array):
+    parser = argparse.ArgumentParser(
+        description="serves random walk quotes as binance bookTicker stream")
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9443)
+    parser.add_argument('--interval', type=float, default=0.05)
+    parser.add_argument('prices', nargs='+',
+                        help='initial mid prices, e.g. BTCUSDT=10000')
+    args = parser.parse_args(*argument_array)
+    args.prices = dict(price.split('=') for price in args.prices)
+    return args
+
+
+def main(args):
+    server = BookTickerServer(args.host, args.port).start()
+    print("serving {}".format(server.url))
+    try:
+        server.run_random_walk(args.prices, args.interval)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main(parse_args())
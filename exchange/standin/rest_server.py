@@ -0,0 +1,388 @@
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from decimal import Decimal
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qsl
+
+from exchange.simulated import SimulatedMarket, SimulatedClient, \
+    SimulatedAPIException
+
+# weights of binance endpoints
+BINANCE_WEIGHTS = {
+    'exchangeInfo': 1,
+    'ticker/bookTicker': 2,
+    'ticker/allBookTickers': 2,
+    'ticker/price': 2,
+    'ticker/allPrices': 2,
+    'account': 5,
+}
+BINANCE_WEIGHT_LIMIT = 1200
+
+
+class _HTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, body, headers=None):
+        super().__init__(status, body)
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+
+class RestStandinServer:
+    """
+    local stand-in for binance and coinbase pro REST APIs, which are used by
+    Binance and CoinbasePro, backed by SimulatedMarket
+    binance is served under /api, coinbase pro from the root, accounts are
+    identified by api key and created on first request with `resources`
+
+    faults are injected before every request: latency is lognormal with
+    `latency` median (sigma 0 is constant latency), `error_rate` of
+    requests fail with 5xx, `rate_limit_rate` of requests and requests over
+    binance weight limit per minute are rejected with 429
+    """
+
+    def __init__(self, market: SimulatedMarket, resources=None,
+                 host: str='127.0.0.1', port: int=0, latency: float=0,
+                 latency_sigma: float=0, error_rate: float=0,
+                 rate_limit_rate: float=0,
+                 weight_limit: int=BINANCE_WEIGHT_LIMIT,
+                 retry_after: int=1, seed: int=0):
+        self.market = market
+        self.resources = resources or {'USDT': Decimal('100000')}
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.weight_limit = weight_limit
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self.accounts = {}
+        self.fills = {}
+        self._lock = threading.Lock()
+        self._window = None
+        self._used_weight = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self, 'GET')
+
+            def do_POST(self):
+                server.handle(self, 'POST')
+
+            def do_DELETE(self):
+                server.handle(self, 'DELETE')
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = _HTTPServer((host, port), Handler)
+        self.host, self.port = self.httpd.server_address[:2]
+        self.url = 'http://{}:{}'.format(self.host, self.port)
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever,
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def get_account(self, api_key, commission_in_base=False):
+        with self._lock:
+            key = (api_key, commission_in_base)
+            if key not in self.accounts:
+                self.accounts[key] = SimulatedClient(
+                    self.market, self.resources, commission_in_base)
+            return self.accounts[key]
+
+    def handle(self, request, method):
+        url = urlparse(request.path)
+        length = int(request.headers.get('Content-Length') or 0)
+        body = request.rfile.read(length).decode() if length else ''
+        binance = url.path.startswith('/api/')
+        exchange = 'binance' if binance else 'coinbasepro'
+        try:
+            if binance:
+                endpoint = url.path.split('/', 3)[3]
+                params = dict(parse_qsl(url.query))
+                params.update(parse_qsl(body))
+                self._inject_faults(exchange, BINANCE_WEIGHTS.get(
+                    endpoint, self._get_depth_weight(endpoint, params)))
+                response = self._handle_binance(
+                    method, endpoint, params,
+                    request.headers.get('X-MBX-APIKEY'))
+            else:
+                params = dict(parse_qsl(url.query))
+                if body:
+                    params.update(json.loads(body))
+                self._inject_faults(exchange, 1)
+                response = self._handle_coinbasepro(
+                    method, url.path, params,
+                    request.headers.get('CB-ACCESS-KEY'))
+            status, headers = 200, {}
+        except SimulatedAPIException as e:
+            status, headers = 400, {}
+            response = ({'code': e.code, 'msg': e.message} if binance
+                        else {'message': e.message})
+        except HTTPError as e:
+            status, headers, response = e.status, e.headers, e.body
+        self.stats[(exchange, status)] += 1
+        data = json.dumps(response).encode()
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        if binance:
+            request.send_header('X-MBX-USED-WEIGHT', str(self._used_weight))
+        for name, value in headers.items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(data)
+
+    @staticmethod
+    def _get_depth_weight(endpoint, params):
+        if endpoint != 'depth':
+            return 1
+        limit = int(params.get('limit', 100))
+        return 1 if limit <= 100 else 5 if limit <= 500 else (
+            10 if limit <= 1000 else 50)
+
+    def _inject_faults(self, exchange, weight):
+        with self._lock:
+            if self.latency:
+                latency = self.latency * math.exp(
+                    self.random.gauss(0, self.latency_sigma))
+            else:
+                latency = 0
+            fail = self.random.random() < self.error_rate
+            rate_limited = self.random.random() < self.rate_limit_rate
+            window = int(time.time() // 60)
+            if window != self._window:
+                self._window, self._used_weight = window, 0
+            if exchange == 'binance':
+                self._used_weight += weight
+                rate_limited |= self._used_weight > self.weight_limit
+        if latency:
+            time.sleep(latency)
+        binance = exchange == 'binance'
+        if rate_limited:
+            raise HTTPError(429, {'code': -1003, 'msg': 'Too many requests.'}
+                            if binance else
+                            {'message': 'Rate limit exceeded'},
+                            {'Retry-After': str(self.retry_after)})
+        if fail:
+            raise HTTPError(
+                503 if binance else 500,
+                {'code': -1001, 'msg': 'Internal error; unable to process '
+                                       'your request. Please try again.'}
+                if binance else {'message': 'Internal server error'})
+
+    def _handle_binance(self, method, endpoint, params, api_key):
+        market = self.market
+        if endpoint == 'ping':
+            return {}
+        if endpoint == 'time':
+            return {'serverTime': int(time.time() * 1000)}
+        if endpoint == 'exchangeInfo':
+            return market.get_exchange_info()
+        client = self.get_account(api_key)
+        if endpoint in ('ticker/bookTicker', 'ticker/allBookTickers'):
+            return client.get_orderbook_tickers()
+        if endpoint in ('ticker/price', 'ticker/allPrices'):
+            return client.get_all_tickers()
+        if endpoint == 'depth':
+            return client.get_order_book(params['symbol'],
+                                         int(params.get('limit', 100)))
+        if api_key is None:
+            raise HTTPError(401, {'code': -2015,
+                                  'msg': 'Invalid API-key, IP, or '
+                                         'permissions for action.'})
+        if endpoint == 'account':
+            return client.get_account()
+        if endpoint == 'openOrders':
+            return client.get_open_orders(params.get('symbol'))
+        if endpoint == 'order':
+            if method == 'POST':
+                if params['type'] == 'MARKET':
+                    return client.order_market(
+                        params['side'], params['symbol'],
+                        Decimal(params['quantity']))
+                return client.create_order(
+                    params['side'], params['symbol'],
+                    Decimal(params['quantity']), Decimal(params['price']),
+                    params['type'])
+            order_id = self._get_binance_order_id(client, params)
+            if method == 'DELETE':
+                return client.cancel_order(params['symbol'], order_id)
+            return client.get_order(params['symbol'], order_id)
+        raise HTTPError(404, {'code': -1000, 'msg': 'Unknown endpoint.'})
+
+    def _get_binance_order_id(self, client, params):
+        if 'orderId' in params:
+            return int(params['orderId'])
+        for order_id, order in self.market.orders.items():
+            if (order['account'] is client and
+                    order['clientOrderId'] == params.get(
+                        'origClientOrderId')):
+                return order_id
+        return None
+
+    def _handle_coinbasepro(self, method, path, params, api_key):
+        parts = path.strip('/').split('/')
+        client = self.get_account(api_key, commission_in_base=True)
+        if parts == ['products']:
+            return [{
+                'id': product_id(filt),
+                'base_currency': filt['commodity'],
+                'quote_currency': filt['base'],
+                'base_min_size': str(filt['min_order_size']),
+                'base_max_size': str(filt['max_order_size']),
+                'base_increment': str(filt['order_step']),
+                'quote_increment': str(filt['price_step']),
+            } for symbol, filt in self.market.filters.items()]
+        if len(parts) == 3 and parts[0] == 'products' and parts[2] == 'book':
+            symbol = parts[1].replace('-', '')
+            if symbol not in self.market.books:
+                raise HTTPError(404, {'message': 'NotFound'})
+            level = int(params.get('level', 1))
+            book = client.get_order_book(symbol, 1 if level == 1 else 50)
+            return {'sequence': 1,
+                    'bids': [level + [1] for level in book['bids']],
+                    'asks': [level + [1] for level in book['asks']]}
+        if api_key is None:
+            raise HTTPError(401, {'message': 'invalid signature'})
+        if parts == ['accounts']:
+            return [{'id': balance['asset'], 'currency': balance['asset'],
+                     'balance': str(Decimal(balance['free']) +
+                                    Decimal(balance['locked'])),
+                     'available': balance['free'],
+                     'hold': balance['locked']}
+                    for balance in client.get_account()['balances']]
+        if parts == ['orders'] and method == 'POST':
+            symbol = params['product_id'].replace('-', '')
+            side = params['side'].upper()
+            if params['type'] == 'market':
+                response = client.order_market(side, symbol,
+                                               Decimal(params['size']))
+            else:
+                response = client.create_order(
+                    side, symbol, Decimal(params['size']),
+                    Decimal(params['price']),
+                    SimulatedClient.ORDER_TYPE_LIMIT_MAKER)
+            self.fills[response['orderId']] = [
+                {'price': fill['price'], 'size': fill['qty'],
+                 'fee': fill['commission'], 'side': params['side'],
+                 'liquidity': 'T'} for fill in response['fills']]
+            return self._coinbasepro_order(response['orderId'])
+        if parts == ['fills']:
+            order_id = int(params['order_id'])
+            order = self.market.orders.get(order_id)
+            fills = self.fills.get(order_id, [])
+            if order is not None and order['type'] != 'MARKET':
+                fills = self._limit_order_fills(order)
+            return [dict(fill, order_id=str(order_id),
+                         product_id=self._order_product_id(order))
+                    for fill in fills]
+        if len(parts) == 2 and parts[0] == 'orders':
+            order_id = int(parts[1])
+            order = self.market.orders.get(order_id)
+            if order is None:
+                raise HTTPError(404, {'message': 'NotFound'})
+            if method == 'DELETE':
+                client.cancel_order(order['symbol'], order_id)
+                return [str(order_id)]
+            client.get_order(order['symbol'], order_id)
+            return self._coinbasepro_order(order_id)
+        raise HTTPError(404, {'message': 'NotFound'})
+
+    def _order_product_id(self, order):
+        symbol = order['symbol']
+        return product_id(self.market.filters[symbol])
+
+    def _limit_order_fills(self, order):
+        if order['executedQty'] <= 0:
+            return []
+        fee = order['cummulativeQuoteQty'] * self.market.maker_fee
+        return [{'price': str(order['price']),
+                 'size': str(order['executedQty']), 'fee': str(fee),
+                 'side': order['side'].lower(), 'liquidity': 'M'}]
+
+    def _coinbasepro_order(self, order_id):
+        order = self.market.orders.get(order_id)
+        if order is None:
+            raise HTTPError(404, {'message': 'NotFound'})
+        if order['type'] == 'MARKET':
+            fills = self.fills.get(order_id, [])
+        else:
+            fills = self._limit_order_fills(order)
+        fee = sum(Decimal(fill['fee']) for fill in fills)
+        return {
+            'id': str(order_id),
+            'product_id': self._order_product_id(order),
+            'side': order['side'].lower(),
+            'type': 'market' if order['type'] == 'MARKET' else 'limit',
+            'price': str(order['price'] or 0),
+            'size': str(order['origQty']),
+            'post_only': order['type'] != 'MARKET',
+            'filled_size': str(order['executedQty']),
+            'executed_value': str(order['cummulativeQuoteQty']),
+            'fill_fees': str(fee),
+            'status': ('open' if order['status'] in ('NEW',
+                                                     'PARTIALLY_FILLED')
+                       else 'done'),
+            'settled': order['status'] not in ('NEW', 'PARTIALLY_FILLED'),
+        }
+
+
+def product_id(filt):
+    return '{}-{}'.format(filt['commodity'], filt['base'])
+
+
+def parse_args(*argument_array):
+    parser = argparse.ArgumentParser(
+        description="serves simulated market as binance and coinbase pro "
+                    "REST APIs")
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--currencies', type=int, default=50)
+    parser.add_argument('--usdt', type=str, default='100000',
+                        help='initial USDT of every account')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='median latency in seconds')
+    parser.add_argument('--latency-sigma', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0)
+    parser.add_argument('--weight-limit', type=int,
+                        default=BINANCE_WEIGHT_LIMIT)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(*argument_array)
+
+
+def main(args):
+    market = SimulatedMarket.random_market(args.currencies, seed=args.seed)
+    server = RestStandinServer(
+        market, {'USDT': Decimal(args.usdt)}, args.host, args.port,
+        args.latency, args.latency_sigma, args.error_rate,
+        args.rate_limit_rate, args.weight_limit, seed=args.seed)
+    print("serving BINANCE_API_URL={0} COINBASEPRO_API_URL={0}".format(
+        server.url))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,69 @@
+import json
+import aiohttp
+
+
+class AsyncAPIError(Exception):
+    """
+    error response of exchange api, `code` and `message` are taken from
+    response body, if it has them
+    """
+
+    def __init__(self, status: int, code=None, message: str=''):
+        super().__init__('APIError(status={}, code={}): {}'.format(
+            status, code, message))
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class AsyncHTTPClient:
+    """
+    json api client on top of aiohttp session, session (and its connection
+    pool) may be shared by clients of many accounts, session created by
+    client is closed by `close`
+    """
+
+    def __init__(self, base_url: str, session: aiohttp.ClientSession=None,
+                 limit: int=100, timeout: float=10):
+        self.base_url = base_url.rstrip('/')
+        self._session = session
+        self._own_session = session is None
+        self.limit = limit
+        self.timeout = timeout
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def request(self, method: str, path: str, params=None, data=None,
+                      headers=None):
+        """
+        :param params: query string parameters, list of pairs keeps order
+        :param data: body, which is sent as is
+        :return: decoded json response
+        """
+        async with self.session.request(
+                method, self.base_url + path, params=params, data=data,
+                headers=headers) as response:
+            text = await response.text()
+            try:
+                payload = json.loads(text) if text else None
+            except ValueError:
+                payload = None
+            if response.status >= 400:
+                if isinstance(payload, dict):
+                    raise AsyncAPIError(response.status,
+                                        payload.get('code'),
+                                        payload.get('msg') or
+                                        payload.get('message', text))
+                raise AsyncAPIError(response.status, message=text)
+            return payload
+
+    async def close(self):
+        if self._own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import threading
+
+from logger import logger
+
+
+class TTLCache:
+    """
+    two level cache for a single value: process memory and redis,
+    shared between all workers, which have REDIS_URL in environment
+
+    value is fetched by `fetch` function, which must return json
+    serializable object, `parse` is applied to fetched (or loaded from redis)
+    value once per process
+    after `refresh_after` seconds value is refreshed in background thread,
+    after `ttl` seconds value is fetched synchronously
+    """
+
+    def __init__(self, key: str, ttl: int=3600, refresh_after: int=None,
+                 parse=None, redis_url: str=None):
+        self.key = key
+        self.ttl = ttl
+        self.refresh_after = (refresh_after if refresh_after is not None
+                              else ttl // 2)
+        self.parse = parse if parse is not None else (lambda value: value)
+        self.redis_url = redis_url or os.environ.get('REDIS_URL')
+        self._redis = None
+        self._value = None
+        self._timestamp = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self, fetch):
+        age = self._age()
+        if age is None or age > self.ttl:
+            with self._lock:
+                age = self._age()
+                if age is None or age > self.ttl:
+                    self._load(fetch)
+        elif age > self.refresh_after:
+            value = self._value
+            self._refresh_in_background(fetch)
+            return value
+        return self._value
+
+    def peek(self):
+        """
+        value from memory or redis without fetching it,
+        None if there is no value younger than `ttl`
+        """
+        age = self._age()
+        if age is None or age > self.ttl:
+            with self._lock:
+                stored = self._retrieve()
+                if stored is None or time.time() - stored['timestamp'] > (
+                        self.ttl):
+                    return None
+                self._set(stored['value'], stored['timestamp'])
+        return self._value
+
+    def invalidate(self):
+        """
+        drop value from memory and redis, next `get` fetches it again
+        """
+        with self._lock:
+            self._value = None
+            self._timestamp = None
+            redis = self._get_redis()
+            if redis is not None:
+                try:
+                    redis.delete(self.key)
+                except Exception as e:
+                    logger.warning("cache {} invalidation failed: {}".format(
+                        self.key, e))
+
+    def refresh(self, fetch):
+        value = fetch()
+        self._set(value, time.time())
+        self._store(value)
+
+    def _age(self):
+        if self._timestamp is None:
+            return None
+        return time.time() - self._timestamp
+
+    def _load(self, fetch):
+        stored = self._retrieve()
+        if stored is not None and time.time() - stored['timestamp'] <= (
+                self.ttl):
+            self._set(stored['value'], stored['timestamp'])
+            return
+        self.refresh(fetch)
+
+    def _set(self, value, timestamp):
+        self._value = self.parse(value)
+        self._timestamp = timestamp
+
+    def _refresh_in_background(self, fetch):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _refresh():
+            try:
+                self.refresh(fetch)
+            except Exception as e:
+                logger.warning("cache {} refresh failed: {}".format(
+                    self.key, e))
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=_refresh, daemon=True).start()
+
+    def _get_redis(self):
+        if self._redis is None and self.redis_url:
+            import redis
+            self._redis = redis.StrictRedis.from_url(self.redis_url)
+        return self._redis
+
+    def _retrieve(self):
+        redis = self._get_redis()
+        if redis is None:
+            return None
+        try:
+            stored = redis.get(self.key)
+        except Exception as e:
+            logger.warning("cache {} is unavailable: {}".format(self.key, e))
+            return None
+        if stored is None:
+            return None
+        return json.loads(stored)
+
+    def _store(self, value):
+        redis = self._get_redis()
+        if redis is None:
+            return
+        try:
+            redis.setex(self.key, self.ttl, json.dumps(
+                {'value': value, 'timestamp': time.time()}))
+        except Exception as e:
+            logger.warning("cache {} is unavailable: {}".format(self.key, e))
@@ -0,0 +1,56 @@
+"""
+fixed point numbers: integer units with explicit number of decimal places
+(scale) per asset or filter, Decimal is only used at the boundary
+"""
+import numpy as np
+from functools import lru_cache
+from decimal import Decimal, ROUND_DOWN, ROUND_UP
+
+
+@lru_cache(maxsize=None)
+def get_scale(step: Decimal) -> int:
+    """
+    number of decimal places of step, e.g. 3 for 0.001 or 0.005, -1 for 10
+    """
+    return -Decimal(step).normalize().as_tuple().exponent
+
+
+def to_units(x, scale: int, down: bool=True) -> int:
+    """
+    x * 10 ** scale rounded towards zero (down) or away from zero,
+    the same as quantize with ROUND_DOWN or ROUND_UP
+    """
+    x = Decimal(x).scaleb(scale)
+    return int(x.to_integral_value(ROUND_DOWN if down else ROUND_UP))
+
+
+def from_units(units: int, scale: int) -> Decimal:
+    """
+    Decimal with exactly scale decimal places
+    """
+    return Decimal(units).scaleb(-scale)
+
+
+def to_units_array(values, scale: int) -> np.ndarray:
+    """
+    values rounded towards zero as int64 units
+    """
+    return np.trunc(np.asarray(values, dtype=np.float64) *
+                    10.0 ** scale).astype(np.int64)
+
+
+def add_fixed_filters(filt: dict) -> dict:
+    """
+    adds integer units to exchange filter once, quantities are in units of
+    order_step scale, e.g. quantity < min_order_size exactly when
+    to_units(quantity, order_scale) < min_order_units
+    :return: the same filter
+    """
+    if 'order_scale' in filt:
+        return filt
+    order_scale = get_scale(filt['order_step'])
+    filt.update({
+        'order_scale': order_scale,
+        'min_order_units': to_units(filt['min_order_size'], order_scale,
+                                    down=False)})
+    return filt
@@ -0,0 +1,177 @@
+import time
+import threading
+from decimal import Decimal
+from typing import Dict
+
+
+class BalanceLedger:
+    """
+    local copy of account resources, which is updated from fills of own
+    orders instead of downloading the whole account after every order
+
+    ledger is reconciled with exchange (using `fetch`) after
+    `reconcile_every` updates, after `max_age` seconds or when some balance
+    drifts below zero, ledger may be shared by threads placing orders
+
+    ledger keeps free balances like exchange: resources locked by resting
+    limit orders are reserved, when order is placed, and unfilled part of
+    reservation is released, when order is closed
+    """
+
+    def __init__(self, fetch, resources: Dict[str, Decimal]=None,
+                 reconcile_every: int=20, max_age: int=60):
+        self.fetch = fetch
+        self.reconcile_every = reconcile_every
+        self.max_age = max_age
+        self.lock = threading.RLock()
+        self._executed = {}
+        self._reserved = {}
+        if resources is None:
+            self.reconcile()
+        else:
+            self._set(resources)
+
+    def get_resources(self) -> Dict[str, Decimal]:
+        with self.lock:
+            if self.needs_reconcile():
+                self.reconcile()
+            return {currency: quantity
+                    for currency, quantity in self.resources.items()
+                    if quantity > 0}
+
+    def needs_reconcile(self) -> bool:
+        return (self._updates >= self.reconcile_every or
+                time.time() - self._timestamp > self.max_age or
+                any(quantity < 0 for quantity in self.resources.values()))
+
+    def reconcile(self, resources: Dict[str, Decimal]=None):
+        """
+        :param resources: fresh resources, fetched by caller (e.g. by
+                          coroutine), `fetch` is used, if not specified
+        """
+        with self.lock:
+            self._set(self.fetch() if resources is None else resources)
+
+    def apply_fill(self, product: str, side: str, quantity: Decimal,
+                   price: Decimal, commissions: Dict[str, Decimal]=None,
+                   order_id=None):
+        """
+        :param product: product in 'commodity_base' format
+        :param side: 'BUY' or 'SELL', case insensitive
+        :param quantity: executed quantity of commodity
+        :param price: mean execution price
+        :param commissions: dict from asset to paid commission
+        :param order_id: if specified, quantity and commissions are treated
+                         as cumulative for the order, only their increase
+                         since the previous fill of the order is applied
+        """
+        with self.lock:
+            self._apply_fill(product, side, quantity, price,
+                             dict(commissions or {}), order_id)
+
+    def reserve(self, product: str, side: str, quantity: Decimal,
+                price: Decimal, order_id):
+        """
+        subtract resources locked by placed limit order, its fills don't
+        spend them again
+        :param quantity: quantity of commodity of the order
+        :param price: limit price
+        """
+        with self.lock:
+            commodity, base = product.split('_')
+            if side.upper() == 'SELL':
+                currency, amount = commodity, quantity
+            else:
+                currency, amount = base, quantity * price
+            self._reserved[order_id] = (currency, amount, quantity)
+            self._add(currency, -amount)
+
+    def release(self, order_id):
+        """
+        return unfilled part of reservation of closed (filled or canceled)
+        order, fills of the order have to be applied first
+        """
+        with self.lock:
+            if order_id not in self._reserved:
+                return
+            currency, amount, quantity = self._reserved.pop(order_id)
+            executed, _ = self._executed.get(order_id, (Decimal(0), {}))
+            self._add(currency, amount * (quantity - executed) / quantity)
+
+    def to_dict(self) -> dict:
+        """
+        json serializable state, order ids are kept in lists of pairs, so
+        their type survives json
+        """
+        with self.lock:
+            return {
+                'resources': {currency: str(quantity)
+                              for currency, quantity
+                              in self.resources.items()},
+                'executed': [[order_id, str(quantity),
+                              {asset: str(fee)
+                               for asset, fee in commissions.items()}]
+                             for order_id, (quantity, commissions)
+                             in self._executed.items()],
+                'reserved': [[order_id, currency, str(amount), str(quantity)]
+                             for order_id, (currency, amount, quantity)
+                             in self._reserved.items()],
+                'reconcile_every': self.reconcile_every,
+                'max_age': self.max_age,
+                'updates': self._updates,
+                'timestamp': self._timestamp
+            }
+
+    @classmethod
+    def from_dict(cls, fetch, d: dict) -> 'BalanceLedger':
+        ledger = cls(fetch, {currency: Decimal(quantity)
+                             for currency, quantity
+                             in d['resources'].items()},
+                     d['reconcile_every'], d['max_age'])
+        ledger._executed = {
+            order_id: (Decimal(quantity),
+                       {asset: Decimal(fee)
+                        for asset, fee in commissions.items()})
+            for order_id, quantity, commissions in d['executed']}
+        ledger._reserved = {
+            order_id: (currency, Decimal(amount), Decimal(quantity))
+            for order_id, currency, amount, quantity in d['reserved']}
+        ledger._updates = d['updates']
+        ledger._timestamp = d['timestamp']
+        return ledger
+
+    def _apply_fill(self, product, side, quantity, price, commissions,
+                    order_id):
+        if order_id is not None:
+            executed, paid = self._executed.get(order_id, (Decimal(0), {}))
+            self._executed[order_id] = (quantity, dict(commissions))
+            quantity -= executed
+            commissions = {asset: fee - paid.get(asset, Decimal(0))
+                           for asset, fee in commissions.items()}
+        if quantity <= 0 and not any(commissions.values()):
+            return
+
+        commodity, base = product.split('_')
+        value = quantity * price
+        # spent resources of reserved order are already subtracted
+        reserved = order_id in self._reserved
+        if side.upper() == 'SELL':
+            if not reserved:
+                self._add(commodity, -quantity)
+            self._add(base, value)
+        else:
+            self._add(commodity, quantity)
+            if not reserved:
+                self._add(base, -value)
+        for asset, fee in commissions.items():
+            self._add(asset, -fee)
+        self._updates += 1
+
+    def _add(self, currency, quantity):
+        self.resources[currency] = self.resources.get(
+            currency, Decimal(0)) + quantity
+
+    def _set(self, resources):
+        self.resources = dict(resources)
+        self._updates = 0
+        self._timestamp = time.time()
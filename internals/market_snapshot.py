@@ -0,0 +1,203 @@
+import numpy as np
+from decimal import Decimal
+from typing import List, Dict, Tuple, Callable
+
+from internals.orderbook import OrderBook
+from internals.fixed_point import get_scale, to_units_array
+
+
+class MarketSnapshot:
+    """
+    orderbooks of one fetch with currencies interned to integer ids
+    product i trades commodities[i] for bases[i], product_ids[c1, c2] is
+    index of product between currencies c1 and c2 (in either direction),
+    -1 if there is none
+    """
+
+    def __init__(self, orderbooks: List[OrderBook]):
+        self.orderbooks = {orderbook.product: orderbook
+                           for orderbook in orderbooks}
+        self.products = list(self.orderbooks)
+        self.product_index = {product: i
+                              for i, product in enumerate(self.products)}
+        self.currencies = []
+        self.index = {}
+        pairs = []
+        for product in self.products:
+            pairs.append([self._intern(currency)
+                          for currency in product.split('_')])
+        pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        self.commodities = pairs[:, 0]
+        self.bases = pairs[:, 1]
+
+        n = len(self.currencies)
+        self.product_ids = np.full((n, n), -1, dtype=np.int64)
+        ids = np.arange(len(self.products), dtype=np.int64)
+        self.product_ids[self.commodities, self.bases] = ids
+        self.product_ids[self.bases, self.commodities] = ids
+
+        orderbooks = [self.orderbooks[product] for product in self.products]
+        self.bids = np.array([float(orderbook.get_wall_bid())
+                              for orderbook in orderbooks], dtype=np.float64)
+        self.asks = np.array([float(orderbook.get_wall_ask())
+                              for orderbook in orderbooks], dtype=np.float64)
+        self.mid_prices = (self.bids + self.asks) / 2
+        self.spread_fees = 1 - np.sqrt(self.bids / self.asks)
+        # exact logarithms for price estimates, reverse product is negation
+        self._log_prices = [orderbook.get_mid_market_price().log10()
+                            for orderbook in orderbooks]
+        self._log_values = None
+        self._components = None
+
+    def _intern(self, currency: str) -> int:
+        if currency not in self.index:
+            self.index[currency] = len(self.currencies)
+            self.currencies.append(currency)
+        return self.index[currency]
+
+    def __contains__(self, product: str) -> bool:
+        return product in self.product_index
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def get_product(self, currency_from: str,
+                    currency_to: str) -> Tuple[str, bool]:
+        """
+        :return: product between currencies and whether currency_from is
+                 its commodity (order sells), None if there is no product
+        """
+        i = self.index.get(currency_from)
+        j = self.index.get(currency_to)
+        if i is None or j is None or self.product_ids[i, j] < 0:
+            return None
+        product_id = self.product_ids[i, j]
+        return self.products[product_id], self.commodities[product_id] == i
+
+    def get_fees(self, get_fee: Callable[[str], Decimal]) -> np.ndarray:
+        """
+        :param get_fee: e.g. exchange.get_taker_fee
+        :return: fee of every product
+        """
+        return np.array([float(get_fee(product)) for product in self.products],
+                        dtype=np.float64)
+
+    def get_edge_costs(self, factors: np.ndarray,
+                       precision: Decimal=Decimal('1e-8')) -> (
+            Dict[Tuple[str, str], int]):
+        """
+        integer costs of products for rebalance_orders_from_costs
+        :param factors: part of value left after trading each product,
+                        e.g. (1 - fees) * (1 - spread_fees)
+        """
+        costs = to_units_array(-np.log10(factors), get_scale(precision))
+        return {(self.currencies[c1], self.currencies[c2]): int(cost)
+                for c1, c2, cost in zip(self.commodities.tolist(),
+                                        self.bases.tolist(), costs.tolist())}
+
+    def get_log_values(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        log10 values of all currencies, solved once per snapshot
+        values are relative to the most traded currency of each connected
+        component, found along paths with least number of trades from it
+        :return: log values, component of every currency
+        """
+        if self._log_values is not None:
+            return self._log_values, self._components
+        n = len(self.currencies)
+        weights = -np.log10(self.mid_prices)
+        sources = np.concatenate([self.commodities, self.bases])
+        targets = np.concatenate([self.bases, self.commodities])
+        weights = np.concatenate([weights, -weights])
+        degrees = np.bincount(sources, minlength=n)
+
+        log_values = np.zeros(n, dtype=np.float64)
+        components = np.full(n, -1, dtype=np.int64)
+        component = 0
+        while (components < 0).any():
+            root = np.argmax(np.where(components < 0, degrees, -1))
+            components[root] = component
+            frontier = np.zeros(n, dtype=bool)
+            frontier[root] = True
+            while frontier.any():
+                edges = frontier[sources] & (components[targets] < 0)
+                candidates = log_values[sources[edges]] + weights[edges]
+                reached = np.full(n, np.inf)
+                np.minimum.at(reached, targets[edges], candidates)
+                frontier = np.isfinite(reached)
+                log_values[frontier] = reached[frontier]
+                components[frontier] = component
+            component += 1
+        self._log_values, self._components = log_values, components
+        return log_values, components
+
+    def get_log_prices(self, base: str) -> np.ndarray:
+        """
+        log10 prices of all currencies in base, nan for currencies, which
+        can't be traded to base
+        """
+        log_values, components = self.get_log_values()
+        i = self.index[base]
+        return np.where(components == components[i],
+                        log_values - log_values[i], np.nan)
+
+    def get_prices(self, base: str) -> Dict[str, float]:
+        """
+        get currency to price dictionary (floats), see get_log_prices
+        """
+        prices = 10 ** self.get_log_prices(base)
+        return {currency: price for currency, price
+                in zip(self.currencies, prices.tolist()) if price == price}
+
+    def value_portfolios(self, portfolios: List[Dict[str, Decimal]],
+                         base: str) -> np.ndarray:
+        """
+        :param portfolios: currency to quantity dictionaries
+        :return: value of every portfolio in base, currencies without
+                 price are not counted
+        """
+        quantities = np.zeros((len(portfolios), len(self.currencies)),
+                              dtype=np.float64)
+        for k, portfolio in enumerate(portfolios):
+            for currency, quantity in portfolio.items():
+                i = self.index.get(currency)
+                if i is not None:
+                    quantities[k, i] = float(quantity)
+        prices = np.nan_to_num(10 ** self.get_log_prices(base))
+        return quantities.dot(prices)
+
+    def get_price_estimates(self, base: str) -> Dict[str, Decimal]:
+        """
+        get currency to price dictionary, price is found along path with
+        least number of trades from base
+        exact, but solved again for every base, see get_prices
+        """
+        # adjacency in order of forward products, then reverse products
+        neighbours = [[] for _ in self.currencies]
+        pairs = list(zip(self.commodities.tolist(), self.bases.tolist(),
+                         self._log_prices))
+        for commodity, base_id, log_price in pairs:
+            neighbours[commodity].append((base_id, -log_price))
+        for commodity, base_id, log_price in pairs:
+            neighbours[base_id].append((commodity, log_price))
+
+        start = self.index[base]
+        n = len(self.currencies)
+        dists = [None] * n
+        depths = [None] * n
+        dists[start] = depths[start] = 0
+        queue = [(start, 0)]
+        i = 0
+        while i < len(queue):
+            current, depth = queue[i]
+            for v, w in neighbours[current]:
+                if dists[v] is not None and (
+                        depths[v] != depths[current] or
+                        dists[v] < dists[current] + w):
+                    continue
+                if dists[v] is None:
+                    queue.append((v, depth + 1))
+                dists[v] = dists[current] + w
+                depths[v] = depth + 1
+            i += 1
+        return {self.currencies[v]: Decimal(10) ** dists[v] for v, _ in queue}
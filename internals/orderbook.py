@@ -1,10 +1,14 @@
+import time
+import numpy as np
 from decimal import Decimal
 
 
 class OrderBook:
-    def __init__(self, product: str, orderbook_from_market):
+    def __init__(self, product: str, orderbook_from_market,
+                 timestamp: float=None):
         assert len(product.split('_')) == 2
         self.product = product
+        self.timestamp = timestamp
         self.wall_ask = None
         self.wall_bid = None
         if type(orderbook_from_market) in [int, float, Decimal]:
@@ -29,3 +33,77 @@ class OrderBook:
     def get_wall_ask(self) -> Decimal:
         assert self.wall_ask is not None
         return self.wall_ask
+
+    def get_age(self) -> float:
+        """
+        seconds since orderbook was received, None if unknown
+        """
+        if self.timestamp is None:
+            return None
+        return time.time() - self.timestamp
+
+
+class DepthOrderBook(OrderBook):
+    """
+    orderbook with several price levels
+    levels are kept in contiguous numpy arrays together with prefix sums of
+    sizes and notionals, so cost to fill any quantity is found by binary
+    search
+    """
+
+    def __init__(self, product: str, bids, asks):
+        """
+        :param bids: list of [price, size] pairs, best (highest) bid first
+        :param asks: list of [price, size] pairs, best (lowest) ask first
+        """
+        assert len(bids) and len(asks)
+        super().__init__(product, {'bid': Decimal(bids[0][0]),
+                                   'ask': Decimal(asks[0][0])})
+        self.bids = self._to_arrays(bids)
+        self.asks = self._to_arrays(asks)
+
+    @staticmethod
+    def _to_arrays(levels):
+        levels = np.array([[float(price), float(size)]
+                           for price, size, *_ in levels])
+        prices = np.ascontiguousarray(levels[:, 0])
+        sizes = np.ascontiguousarray(levels[:, 1])
+        return {'prices': prices,
+                'sizes': sizes,
+                'cumulative_sizes': np.cumsum(sizes),
+                'cumulative_notionals': np.cumsum(prices * sizes)}
+
+    def get_depth(self) -> int:
+        return min(len(self.bids['prices']), len(self.asks['prices']))
+
+    def get_cost_to_fill(self, quantity, side: str):
+        """
+        :param side: 'BUY' takes asks, 'SELL' takes bids
+        :return: notional in base currency, which is paid for (or received
+                 from) market order of `quantity`, None if orderbook
+                 doesn't have enough liquidity
+        """
+        levels = self.asks if side.upper() == 'BUY' else self.bids
+        quantity = float(quantity)
+        cumulative_sizes = levels['cumulative_sizes']
+        i = int(np.searchsorted(cumulative_sizes, quantity))
+        if i >= len(cumulative_sizes):
+            if quantity - cumulative_sizes[-1] > 1e-12:
+                return None
+            i = len(cumulative_sizes) - 1
+        filled_size, filled_notional = 0., 0.
+        if i > 0:
+            filled_size = cumulative_sizes[i - 1]
+            filled_notional = levels['cumulative_notionals'][i - 1]
+        return filled_notional + (
+            quantity - filled_size) * levels['prices'][i]
+
+    def get_average_price(self, quantity, side: str):
+        cost = self.get_cost_to_fill(quantity, side)
+        if cost is None or float(quantity) <= 0:
+            return None
+        return cost / float(quantity)
+
+    def get_liquidity(self, side: str) -> float:
+        levels = self.asks if side.upper() == 'BUY' else self.bids
+        return float(levels['cumulative_sizes'][-1])
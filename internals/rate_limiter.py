@@ -0,0 +1,133 @@
+import os
+import time
+import asyncio
+import threading
+
+from logger import logger
+
+
+class TokenBucket:
+    """
+    thread-safe token bucket: `rate` tokens per second are added to bucket,
+    which holds at most `capacity` tokens, every request takes `weight`
+    tokens and waits, while there are not enough tokens
+    """
+
+    def __init__(self, rate: float, capacity: float=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._timestamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, weight: float=1):
+        """
+        take `weight` tokens, blocking until they are available
+        """
+        assert weight <= self.capacity
+        while True:
+            with self._lock:
+                wait = self._try_acquire(weight)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, weight: float=1):
+        """
+        take `weight` tokens, waiting without blocking event loop
+        """
+        assert weight <= self.capacity
+        while True:
+            with self._lock:
+                wait = self._try_acquire(weight)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def _try_acquire(self, weight):
+        """
+        :return: 0 if tokens are taken, otherwise seconds to wait
+        """
+        now = time.monotonic()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._timestamp) * self.rate)
+        self._timestamp = now
+        if self._tokens >= weight:
+            self._tokens -= weight
+            return 0
+        return (weight - self._tokens) / self.rate
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+# takes tokens atomically, returns seconds to wait (as string, lua numbers
+# are truncated to integers), time of redis server is used, so buckets are
+# consistent between hosts
+TOKEN_BUCKET_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local weight = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'timestamp')
+local tokens = tonumber(state[1]) or capacity
+local timestamp = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - timestamp) * rate)
+local wait = 0
+if tokens >= weight then
+    tokens = tokens - weight
+else
+    wait = (weight - tokens) / rate
+end
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'timestamp', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+
+# seconds, during which in-process bucket is used after redis failure
+REDIS_RETRY_INTERVAL = 10
+
+
+class RedisTokenBucket(TokenBucket):
+    """
+    token bucket shared by all workers, which have REDIS_URL in environment,
+    state of bucket is kept in redis under `key`
+    when redis is not configured or unavailable, bucket falls back to
+    in-process state
+    """
+
+    def __init__(self, key: str, rate: float, capacity: float=None,
+                 redis_url: str=None):
+        super().__init__(rate, capacity)
+        self.key = key
+        self.redis_url = redis_url or os.environ.get('REDIS_URL')
+        self._redis = None
+        self._script = None
+        self._unavailable_until = 0
+
+    def _try_acquire(self, weight):
+        script = self._get_script()
+        if script is not None and time.monotonic() >= self._unavailable_until:
+            try:
+                return float(script(keys=[self.key],
+                                    args=[self.rate, self.capacity, weight]))
+            except Exception as e:
+                logger.warning("rate limiter {} is unavailable: {}".format(
+                    self.key, e))
+                self._unavailable_until = (time.monotonic() +
+                                           REDIS_RETRY_INTERVAL)
+        return super()._try_acquire(weight)
+
+    def _get_script(self):
+        if self._script is None and self.redis_url:
+            import redis
+            self._redis = redis.StrictRedis.from_url(self.redis_url)
+            self._script = self._redis.register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
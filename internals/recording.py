@@ -0,0 +1,205 @@
+import os
+import gzip
+import json
+import time
+import threading
+from collections import deque, defaultdict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# request parameters, which are derived from credentials or time, they are
+# not recorded and are ignored, when requests are matched
+VOLATILE_PARAMS = {'signature', 'timestamp', 'recvWindow'}
+# response headers, which are not recorded
+SKIPPED_HEADERS = {'set-cookie', 'content-encoding', 'transfer-encoding',
+                   'content-length', 'connection'}
+
+
+class ReplayError(Exception):
+    pass
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+
+def _strip_params(query: str) -> str:
+    return urlencode([(k, v) for k, v in parse_qsl(query)
+                      if k not in VOLATILE_PARAMS])
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path,
+                       _strip_params(parts.query), ''))
+
+
+def normalize_body(body) -> str:
+    """
+    form encoded body without volatile parameters, other bodies as is
+    """
+    if body is None:
+        return ''
+    if isinstance(body, bytes):
+        body = body.decode()
+    if '=' in body and not body.lstrip().startswith(('{', '[')):
+        return _strip_params(body)
+    return body
+
+
+class Recorder:
+    """
+    appends every request and response as json line to file (gzipped, if
+    path ends with .gz, gzip members may be appended), credentials
+    (headers and signatures) are not recorded
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, request, response, start, duration):
+        record = {
+            't': round(start, 6),
+            'd': round(duration, 6),
+            'm': request.method,
+            'u': normalize_url(request.url),
+            'b': normalize_body(request.body),
+            's': response.status_code,
+            'h': {k: v for k, v in response.headers.items()
+                  if k.lower() not in SKIPPED_HEADERS},
+            'r': response.text,
+        }
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self._lock:
+            with _open(self.path, 'a') as wfile:
+                wfile.write(line)
+
+
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, recorder: Recorder, **kwargs):
+        super().__init__(**kwargs)
+        self.recorder = recorder
+
+    def send(self, request, **kwargs):
+        start = time.time()
+        response = super().send(request, **kwargs)
+        self.recorder.write(request, response, start, time.time() - start)
+        return response
+
+
+class Replayer:
+    """
+    serves recorded responses: request gets the first unused response of
+    the same method, url and body (volatile parameters are ignored), or,
+    if there is no such, of the same method and path, so replay survives
+    changes of order sizes
+    """
+
+    def __init__(self, path: str, timing: bool=False):
+        self.path = path
+        self.timing = timing
+        self.records = []
+        self._exact = defaultdict(deque)
+        self._by_path = defaultdict(deque)
+        self._used = set()
+        self._lock = threading.Lock()
+        with _open(path, 'r') as rfile:
+            for line in rfile:
+                if line.strip():
+                    self._add(json.loads(line))
+
+    def _add(self, record):
+        index = len(self.records)
+        self.records.append(record)
+        self._exact[(record['m'], record['u'], record['b'])].append(index)
+        self._by_path[(record['m'], urlsplit(record['u']).path)].append(
+            index)
+
+    def _pop(self, queue):
+        while queue and queue[0] in self._used:
+            queue.popleft()
+        if not queue:
+            return None
+        index = queue.popleft()
+        self._used.add(index)
+        return self.records[index]
+
+    def find(self, method, url, body):
+        with self._lock:
+            record = self._pop(self._exact[(method, normalize_url(url),
+                                            normalize_body(body))])
+            if record is None:
+                record = self._pop(self._by_path[(method,
+                                                  urlsplit(url).path)])
+        if record is None:
+            raise ReplayError("no recorded response for {} {}".format(
+                method, normalize_url(url)))
+        return record
+
+    def remaining(self) -> int:
+        return len(self.records) - len(self._used)
+
+
+class ReplayAdapter(HTTPAdapter):
+    def __init__(self, replayer: Replayer, **kwargs):
+        super().__init__(**kwargs)
+        self.replayer = replayer
+
+    def send(self, request, **kwargs):
+        record = self.replayer.find(request.method, request.url, request.body)
+        if self.replayer.timing:
+            time.sleep(record['d'])
+        response = Response()
+        response.status_code = record['s']
+        response.headers = CaseInsensitiveDict(record['h'])
+        response._content = record['r'].encode()
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.reason = 'Replayed'
+        return response
+
+
+_recorders = {}
+_replayers = {}
+_lock = threading.Lock()
+
+
+def get_transport_adapter():
+    """
+    adapter from environment: EXCHANGE_REPLAY_PATH (with
+    EXCHANGE_REPLAY_TIMING=1 for original timing) or EXCHANGE_RECORD_PATH,
+    None if neither is set
+    """
+    replay_path = os.environ.get('EXCHANGE_REPLAY_PATH')
+    record_path = os.environ.get('EXCHANGE_RECORD_PATH')
+    with _lock:
+        if replay_path:
+            if replay_path not in _replayers:
+                _replayers[replay_path] = Replayer(
+                    replay_path,
+                    os.environ.get('EXCHANGE_REPLAY_TIMING') == '1')
+            return ReplayAdapter(_replayers[replay_path])
+        if record_path:
+            if record_path not in _recorders:
+                _recorders[record_path] = Recorder(record_path)
+            return RecordingAdapter(_recorders[record_path])
+    return None
+
+
+def install(session, adapter=None):
+    """
+    mount recording or replay adapter on requests session
+    :return: session
+    """
+    adapter = adapter if adapter is not None else get_transport_adapter()
+    if adapter is not None:
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+    return session
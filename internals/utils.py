@@ -1,3 +1,4 @@
+from functools import lru_cache
 from decimal import Decimal, ROUND_DOWN, ROUND_UP
 
 
@@ -12,3 +13,21 @@ def quantize(x, precision, down=True):
     precision = Decimal(precision)
     rounding = ROUND_DOWN if down else ROUND_UP
     return x.quantize(precision.normalize(), rounding=rounding)
+
+
+class Quantizer:
+    """
+    quantize with precision normalized once
+    """
+
+    def __init__(self, precision):
+        self.precision = Decimal(precision).normalize()
+
+    def __call__(self, x, down=True):
+        rounding = ROUND_DOWN if down else ROUND_UP
+        return Decimal(x).quantize(self.precision, rounding=rounding)
+
+
+@lru_cache(maxsize=None)
+def get_quantizer(precision: Decimal) -> Quantizer:
+    return Quantizer(precision)
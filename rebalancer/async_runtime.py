@@ -0,0 +1,136 @@
+import asyncio
+from decimal import Decimal
+from typing import Dict
+
+import aiohttp
+
+from logger import logger
+from exchange.registry import ExchangeRegistry
+from rebalancer.market_order_rebalancer import async_market_order_rebalance
+from rebalancer.limit_order_rebalancer import async_limit_order_rebalance
+
+REBALANCING_ALGORITHM = {
+    'MARKET': async_market_order_rebalance,
+    'LIMIT': async_limit_order_rebalance
+}
+
+
+class RebalanceRuntime:
+    """
+    runs rebalances of many accounts as coroutines of one event loop
+    instead of process per rebalance, rebalance waits for exchange without
+    blocking the others
+
+    every account has its own exchange client and ledger and runs at most
+    one rebalance at a time, error of rebalance is its result and doesn't
+    affect other accounts, clients share http connection pool and rate
+    limiters of exchange (e.g. binance request weight of IP)
+
+    rebalance is canceled cooperatively: market orders, which aren't placed
+    yet, are dropped, limit orders left in orderbook are canceled
+    """
+
+    def __init__(self, exchange_class, max_rebalances: int=1000,
+                 max_connections: int=100, timeout: float=10):
+        """
+        :param exchange_class: subclass of AsyncExchange
+        :param max_rebalances: rebalances over the limit wait for start
+        """
+        self.exchange_class = exchange_class
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.session = None
+        self.rebalances = {}
+        self._semaphore = None
+        self._max_rebalances = max_rebalances
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.wait()
+        await self.close()
+
+    def start(self, credentials: tuple, weights: Dict[str, Decimal],
+              algorithm: str='MARKET', update_function=None,
+              **params) -> asyncio.Future:
+        """
+        :param credentials: arguments of exchange class, e.g. api key and
+                            secret key
+        :param algorithm: 'MARKET' or 'LIMIT'
+        :param params: keyword arguments of rebalancing algorithm
+        :return: future of result of rebalancing algorithm, exception
+                 raised by algorithm is its result
+        """
+        key = ExchangeRegistry.key(self.exchange_class, *credentials)
+        if key in self.rebalances:
+            raise ValueError('rebalance of account is in progress')
+        if self.session is None:
+            # requests wait for connection of pool without timeout, so the
+            # pool limits concurrency of all accounts
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.timeout,
+                                              sock_read=self.timeout))
+            self._semaphore = asyncio.Semaphore(self._max_rebalances)
+        canceled = asyncio.Event()
+        future = asyncio.ensure_future(self._run(
+            credentials, weights, REBALANCING_ALGORITHM[algorithm.upper()],
+            update_function or (lambda time_estimate: None), canceled,
+            params))
+        self.rebalances[key] = (future, canceled)
+        future.add_done_callback(lambda _: self.rebalances.pop(key, None))
+        return future
+
+    def is_running(self, credentials: tuple) -> bool:
+        return ExchangeRegistry.key(self.exchange_class,
+                                    *credentials) in self.rebalances
+
+    def cancel(self, credentials: tuple) -> bool:
+        """
+        asks rebalance of account to finish
+        :return: False if account doesn't rebalance
+        """
+        rebalance = self.rebalances.get(
+            ExchangeRegistry.key(self.exchange_class, *credentials))
+        if rebalance is None:
+            return False
+        rebalance[1].set()
+        return True
+
+    async def wait(self):
+        """
+        waits, until all started rebalances finish
+        """
+        while self.rebalances:
+            await asyncio.wait([future for future, _
+                                in list(self.rebalances.values())])
+
+    async def close(self):
+        for _, canceled in self.rebalances.values():
+            canceled.set()
+        await self.wait()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _run(self, credentials, weights, algorithm, update_function,
+                   canceled, params):
+        async with self._semaphore:
+            if canceled.is_set():
+                return []
+            try:
+                exchange = await self.exchange_class.create(
+                    *credentials, session=self.session)
+                try:
+                    return await algorithm(exchange, weights,
+                                           update_function,
+                                           canceled=canceled, **params)
+                finally:
+                    await exchange.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("rebalance failed - {}: {}".format(
+                    type(e).__name__, e))
+                return e
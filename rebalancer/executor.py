@@ -0,0 +1,147 @@
+import asyncio
+import threading
+from typing import List, Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from internals.order import Order
+from internals.enums import OrderAction
+
+MARKET_ORDER_WORKERS = 4
+
+
+def get_currencies(order: Order) -> (str, str):
+    """
+    :return: currency spent by order, currency received by order
+    """
+    commodity, base = order.product.split('_')
+    if order._action == OrderAction.SELL:
+        return commodity, base
+    return base, commodity
+
+
+def get_dependencies(orders: List[Order]) -> List[List[int]]:
+    """
+    for every order indices of earlier orders, which receive currency
+    spent by it (orders are topologically sorted), and of the previous
+    order, which spends the same currency, so every order is validated
+    against balance left by the previous one like in sequential execution
+    """
+    funding = {}
+    spending = {}
+    dependencies = []
+    for i, order in enumerate(orders):
+        currency_from, currency_to = get_currencies(order)
+        order_dependencies = list(funding.get(currency_from, []))
+        if currency_from in spending:
+            order_dependencies.append(spending[currency_from])
+        dependencies.append(order_dependencies)
+        funding.setdefault(currency_to, []).append(i)
+        spending[currency_from] = i
+    return dependencies
+
+
+def get_dependency_levels(orders: List[Order]) -> List[List[int]]:
+    """
+    group order indices into levels, orders of one level don't depend on
+    each other, so number of levels is depth of plan
+    """
+    levels = []
+    order_levels = []
+    for dependencies in get_dependencies(orders):
+        level = max([order_levels[j] + 1 for j in dependencies], default=0)
+        order_levels.append(level)
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(len(order_levels) - 1)
+    return levels
+
+
+def execute_orders(orders: List[Order], place_order: Callable,
+                   on_done: Callable=None,
+                   max_workers: int=MARKET_ORDER_WORKERS) -> List:
+    """
+    place orders concurrently, every order is placed as soon as all orders,
+    which fund it, are finished (successfully or not)
+    :param orders: topologically sorted orders
+    :param place_order: function from order to response, called in threads
+    :param on_done: called with order and response after every order
+    :return: responses in order of orders
+    """
+    dependencies = get_dependencies(orders)
+    dependents = [[] for _ in orders]
+    waiting = []
+    for i, order_dependencies in enumerate(dependencies):
+        waiting.append(len(order_dependencies))
+        for j in order_dependencies:
+            dependents[j].append(i)
+    responses = [None] * len(orders)
+    if not orders:
+        return responses
+    lock = threading.Lock()
+    finished = threading.Event()
+    remaining = [len(orders)]
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def run(i):
+            try:
+                responses[i] = place_order(orders[i])
+                if on_done is not None:
+                    with lock:
+                        on_done(orders[i], responses[i])
+            except Exception as error:
+                with lock:
+                    errors.append(error)
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0 or errors:
+                    finished.set()
+                    return
+                for k in dependents[i]:
+                    waiting[k] -= 1
+                    if waiting[k] == 0:
+                        executor.submit(run, k)
+
+        # waiting counts are decreased by running orders
+        roots = [i for i, count in enumerate(waiting) if count == 0]
+        for i in roots:
+            executor.submit(run, i)
+        finished.wait()
+    if errors:
+        raise errors[0]
+    return responses
+
+
+async def async_execute_orders(orders: List[Order], place_order: Callable,
+                               on_done: Callable=None,
+                               max_workers: int=MARKET_ORDER_WORKERS) -> List:
+    """
+    execute_orders on event loop, every order waits for orders, which fund
+    it, at most max_workers orders are placed at once
+    :param place_order: coroutine function from order to response
+    :return: responses in order of orders
+    """
+    dependencies = get_dependencies(orders)
+    finished = [asyncio.Event() for _ in orders]
+    semaphore = asyncio.Semaphore(max_workers)
+    responses = [None] * len(orders)
+
+    async def run(i):
+        try:
+            for j in dependencies[i]:
+                await finished[j].wait()
+            async with semaphore:
+                responses[i] = await place_order(orders[i])
+            if on_done is not None:
+                on_done(orders[i], responses[i])
+        finally:
+            finished[i].set()
+
+    tasks = [asyncio.ensure_future(run(i)) for i in range(len(orders))]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # after first error orders, which haven't started, are dropped
+        for task in tasks:
+            task.cancel()
+    return responses
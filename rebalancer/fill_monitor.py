@@ -0,0 +1,129 @@
+import asyncio
+from decimal import Decimal
+from typing import List, Dict
+
+from logger import logger
+from exchange.exchange import Exchange
+from internals.enums import OrderAction
+
+# remaining quantity, under which order is treated as filled
+FILLED_THRESHOLD = Decimal('1e-3')
+
+
+class FillMonitor:
+    """
+    checks placed limit orders for steps of LimitOrderRebalance instead of
+    fixed sleep: status of orders is polled with interval growing from
+    min_interval to max_interval, polls of one rebalance take at most
+    weight_share of request weight budget of exchange, so they don't starve
+    other requests of IP, cycle ends, when all orders are filled,
+    when market moves away from price of some order (if exchange has live
+    top of book) or on timeout
+
+    last states of orders are remembered, so orders, which are seen closed,
+    aren't canceled and queried again
+    """
+
+    def __init__(self, exchange: Exchange, min_interval: float=2,
+                 max_interval: float=10, backoff: float=1.5,
+                 weight_share: float=0.05):
+        self.exchange = exchange
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.weight_share = weight_share
+        self.states = {}
+        self.closed = set()
+
+    def get_min_interval(self, order_responses: List[Dict]) -> float:
+        """
+        :return: seconds between polls of orders, which fit request weight
+                 budget
+        """
+        return max(self.min_interval, self.exchange.get_poll_interval(
+            order_responses, self.weight_share))
+
+    def get_unfilled(self, order_responses: List[Dict]) -> List[Dict]:
+        """
+        open orders of all products are queried at once if exchange allows,
+        otherwise every order is queried
+        """
+        resps = self.exchange.get_open_orders(order_responses)
+        if resps is None:
+            resps = [self.exchange.get_order(order_response)
+                     for order_response in order_responses]
+        return self._update_states(order_responses, resps)
+
+    def _update_states(self, order_responses, resps):
+        """
+        remembers queried states of orders
+        :return: order responses of unfilled orders
+        """
+        unfilled = []
+        for order_response, resp in zip(order_responses, resps):
+            if resp is None:
+                # not in orderbook anymore, final quantities are unknown
+                self.states[id(order_response)] = {}
+                self.closed.add(id(order_response))
+                continue
+            self.states[id(order_response)] = resp
+            order = order_response['order']
+            remaining = (Decimal(resp['orig_quantity']) -
+                         Decimal(resp['executed_quantity']))
+            # remaining dust won't be filled, it isn't waited for
+            if remaining > FILLED_THRESHOLD and not self.exchange.is_dust(
+                    order.product, remaining, order._price):
+                unfilled.append(order_response)
+            elif remaining == 0:
+                self.closed.add(id(order_response))
+        return unfilled
+
+    def get_closed(self, order_response: Dict) -> Dict:
+        """
+        :return: None if order may still rest in orderbook, otherwise its
+                 last response (empty if not known) from the last poll
+        """
+        if id(order_response) not in self.closed:
+            return None
+        return self.states[id(order_response)]
+
+    def market_moved(self, order_responses: List[Dict]) -> bool:
+        """
+        some buy order is below best bid or some sell order is above best
+        ask, so it waits behind other orders
+        """
+        orders = [order_response['order']
+                  for order_response in order_responses]
+        orderbooks = self.exchange.get_top_of_book(
+            [order.product for order in orders])
+        if orderbooks is None:
+            return False
+        orderbooks = {orderbook.product: orderbook
+                      for orderbook in orderbooks}
+        for order in orders:
+            orderbook = orderbooks.get(order.product)
+            if orderbook is None:
+                continue
+            if ((order._action == OrderAction.BUY and
+                 orderbook.get_wall_bid() > order._price) or
+                    (order._action == OrderAction.SELL and
+                     orderbook.get_wall_ask() < order._price)):
+                logger.info("market moved from order - {}".format(
+                    str(order)))
+                return True
+        return False
+
+
+class AsyncFillMonitor(FillMonitor):
+    """
+    FillMonitor of AsyncExchange, state of orders is queried by coroutines,
+    top of book comes from live feed, so market_moved stays synchronous
+    """
+
+    async def get_unfilled(self, order_responses: List[Dict]) -> List[Dict]:
+        resps = await self.exchange.get_open_orders(order_responses)
+        if resps is None:
+            resps = await asyncio.gather(*[
+                self.exchange.get_order(order_response)
+                for order_response in order_responses])
+        return self._update_states(order_responses, resps)
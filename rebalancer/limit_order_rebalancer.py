@@ -1,11 +1,15 @@
+import time
+import asyncio
 from decimal import Decimal
 from typing import Dict, List
-import time
 from internals.order import Order
 from internals.enums import OrderType, OrderAction
+from internals.ledger import BalanceLedger
 from exchange.exchange import Exchange
-from rebalancer.utils import rebalance_orders, get_total_fee, \
-    parse_order, pre_rebalance
+from exchange.async_exchange import AsyncExchange
+from rebalancer.fill_monitor import FillMonitor, AsyncFillMonitor
+from rebalancer.utils import rebalance_orders_from_costs, parse_order, \
+    pre_rebalance, async_pre_rebalance
 
 
 def limit_order_rebalance_retry_after_time_estimate(number_of_trials,
@@ -33,39 +37,100 @@ def limit_order_rebalance(exchange: Exchange,
                           user, update_function, *,
                           max_retries: int = 10,
                           time_delta: int = 30,
-                          base: str='USDT'):
-    pre_rebalance_results = pre_rebalance(exchange, weights, base)
+                          base: str='USDT',
+                          reprice_band: Decimal = Decimal('0.5'),
+                          max_requotes: int = None):
+    plan = plan_limit_orders(exchange, weights, base)
+    if isinstance(plan, (list, Exception)):
+        return plan
+    products, resources, orders = plan
+    with exchange.track_resources(resources):
+        return limit_order_rebalance_with_orders(update_function, exchange,
+                                                 resources, products,
+                                                 orders, max_retries,
+                                                 time_delta, base,
+                                                 reprice_band=reprice_band,
+                                                 max_requotes=max_requotes)
+
+
+def plan_limit_orders(exchange: Exchange, weights: Dict[str, Decimal],
+                      base: str='USDT'):
+    """
+    :return: products, resources and limit orders without prices, or list
+             of unknown currencies, or exception
+    """
+    return plan_limit_orders_from_market(
+        exchange, weights, pre_rebalance(exchange, weights, base), base)
+
+
+async def async_plan_limit_orders(exchange: AsyncExchange,
+                                  weights: Dict[str, Decimal],
+                                  base: str='USDT'):
+    return plan_limit_orders_from_market(
+        exchange, weights, await async_pre_rebalance(exchange, weights, base),
+        base)
+
+
+def plan_limit_orders_from_market(exchange: Exchange,
+                                  weights: Dict[str, Decimal],
+                                  pre_rebalance_results, base: str='USDT'):
     if isinstance(pre_rebalance_results, list):
         return pre_rebalance_results
     (products, resources, orderbooks, price_estimates,
      portfolio_value, initial_weights,
-     spread_fees) = pre_rebalance_results
-    fees = {product: exchange.get_maker_fee(product)
-            for product in products}
+     snapshot) = pre_rebalance_results
+    fees = snapshot.get_fees(exchange.get_maker_fee)
 
-    reverse_spread_fees = {product: 1 - 1 / (1 - spread_fee)
-                           for product, spread_fee in spread_fees.items()}
+    # limit order earns spread instead of paying it
+    reverse_spread_fees = 1 - 1 / (1 - snapshot.spread_fees)
 
-    limit_pseudo_fee = Decimal('1e2')
+    limit_pseudo_fee = 1e2
     # adding 2 to each cost
     # because total cost is less than 2, algorithm will minimize number of
     # orders first, than total fee
-    total_fees = {product: (1 - get_total_fee(
-        fees[product], reverse_spread_fees[product])) / limit_pseudo_fee
-        for product in products}
-    orders = rebalance_orders(
-        initial_weights, weights, total_fees)
+    edge_costs = snapshot.get_edge_costs(
+        (1 - fees) * (1 - reverse_spread_fees) / limit_pseudo_fee)
+    orders = rebalance_orders_from_costs(
+        initial_weights, weights, edge_costs,
+        hubs=exchange.through_trade_currencies())
     if isinstance(orders, Exception):
         return orders
     orders = [(*order[:2], order[2] * portfolio_value) for order in orders]
-    orders = [parse_order(order, products,
+    orders = [parse_order(order, snapshot,
                           price_estimates, base,
                           OrderType.LIMIT, Decimal())
               for order in orders]
-    return limit_order_rebalance_with_orders(update_function, exchange,
-                                             resources, products,
-                                             orders, max_retries,
-                                             time_delta, base)
+    return products, resources, orders
+
+
+def is_stale(order: Order, price: Decimal, orderbook,
+             reprice_band: Decimal) -> bool:
+    """
+    resting order is stale, when mid market price moved from its price by
+    more than reprice_band spreads, with band 0.5 buy order below best bid
+    or sell order above best ask is stale
+    """
+    spread = orderbook.get_wall_ask() - orderbook.get_wall_bid()
+    return abs(price - order._price) > reprice_band * spread
+
+
+def cancel_and_get_order(exchange: Exchange, order_response: Dict) -> Dict:
+    """
+    :return: final state of canceled order, response of cancel is used, if
+             it has quantities
+    """
+    resp = exchange.cancel_limit_order(order_response)
+    if not resp or 'executed_quantity' not in resp:
+        resp = exchange.get_order(order_response)
+    return resp
+
+
+async def async_cancel_and_get_order(exchange: AsyncExchange,
+                                     order_response: Dict) -> Dict:
+    resp = await exchange.cancel_limit_order(order_response)
+    if not resp or 'executed_quantity' not in resp:
+        resp = await exchange.get_order(order_response)
+    return resp
 
 
 def limit_order_rebalance_with_orders(update_function,
@@ -75,17 +140,277 @@ def limit_order_rebalance_with_orders(update_function,
                                       orders: List[Order],
                                       max_retries: int,
                                       time_delta: int,
-                                      base: str):
-    number_of_trials = {order.product: 0 for order in orders}
-    rets = []
-    while len(orders) and (all(
-        number_of_trials[order.product] <= max_retries
-            for order in orders)):
-        orderbooks = exchange.get_orderbooks(products)
+                                      base: str,
+                                      reprice_band: Decimal = Decimal('0.5'),
+                                      max_requotes: int = None):
+    """
+    runs steps of LimitOrderRebalance in this thread, sleeping between them
+    """
+    rebalance = LimitOrderRebalance(
+        exchange, resources, products, orders, max_retries, time_delta,
+        base, reprice_band=reprice_band, max_requotes=max_requotes)
+    delay = rebalance.step(update_function)
+    while delay is not None:
+        time.sleep(delay)
+        delay = rebalance.step(update_function)
+    return rebalance.rets
+
+
+async def async_limit_order_rebalance(exchange: AsyncExchange,
+                                      weights: Dict[str, Decimal],
+                                      update_function, *,
+                                      max_retries: int = 10,
+                                      time_delta: int = 30,
+                                      base: str='USDT',
+                                      reprice_band: Decimal = Decimal('0.5'),
+                                      max_requotes: int = None,
+                                      canceled: asyncio.Event = None):
+    """
+    limit_order_rebalance with AsyncExchange, event loop runs other
+    rebalances, while orders wait in orderbook
+    :param canceled: when it is set, orders left in orderbook are canceled
+                     and rebalance is finished
+    """
+    plan = await async_plan_limit_orders(exchange, weights, base)
+    if isinstance(plan, (list, Exception)):
+        return plan
+    products, resources, orders = plan
+    rebalance = AsyncLimitOrderRebalance(
+        exchange, resources, products, orders, max_retries, time_delta,
+        base, reprice_band=reprice_band, max_requotes=max_requotes)
+    with exchange.track_resources(resources):
+        try:
+            delay = await rebalance.step(update_function)
+            while delay is not None:
+                if await wait_event(canceled, delay):
+                    await rebalance.cancel()
+                    break
+                delay = await rebalance.step(update_function)
+        except (asyncio.CancelledError, Exception):
+            # orders of cancelled or failed rebalance aren't left in
+            # orderbook
+            await rebalance.cancel()
+            raise
+    return rebalance.rets
+
+
+async def wait_event(event: asyncio.Event, timeout: float) -> bool:
+    """
+    :return: True if event is set within timeout
+    """
+    if event is None:
+        await asyncio.sleep(timeout)
+        return False
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    return True
+
+
+class LimitOrderRebalance:
+    """
+    limit order rebalance as state machine, every step either checks placed
+    orders or finishes cycle (keeps, reprices or cancels orders) and places
+    orders of the next cycle, then returns seconds until the next step, so
+    steps can be run by short tasks and state can be saved between them
+    (see to_dict)
+
+    unfilled orders rest in orderbook between cycles and keep their place in
+    queue, order is canceled and placed again at mid market price only when
+    it is stale (see is_stale), cycle ends after time_delta, when orders
+    are filled or when market moves away from them
+    """
+
+    def __init__(self, exchange: Exchange, resources: Dict[str, Decimal],
+                 products: List[str], orders: List[Order], max_retries: int,
+                 time_delta: float, base: str,
+                 reprice_band: Decimal = Decimal('0.5'),
+                 max_requotes: int = None, poll_interval: float = None):
+        """
+        :param orders: orders of plan, list is changed in place, orders are
+                       removed, when they are finished
+        :param reprice_band: allowed move of mid market price in spreads
+        :param max_requotes: stale orders of product are kept after so many
+                             replacements, None for no limit
+        :param poll_interval: fixed seconds between checks of placed orders,
+                              None for interval of fill monitor
+        """
+        self.exchange = exchange
+        self.resources = resources
+        self.products = products
+        self.plan = list(orders)
+        self.orders = orders
+        self.max_retries = max_retries
+        self.time_delta = time_delta
+        self.base = base
+        self.reprice_band = reprice_band
+        self.max_requotes = max_requotes
+        self.poll_interval = poll_interval
+        self.monitor = FillMonitor(exchange)
+        self.number_of_trials = {order.product: 0 for order in orders}
+        self.number_of_requotes = {order.product: 0 for order in orders}
+        self.rets = []
+        # index of order in plan -> response of its resting order
+        self.resting = {}
+        # orders placed or kept in current cycle
+        self.order_responses = []
+        self.waiting = False
+        self.deadline = 0
+        self.interval = self.monitor.min_interval
+        # state of ledger of saved rebalance
+        self.ledger_state = None
+
+    def track_resources(self):
+        """
+        ledger scope of step of saved rebalance, ledger is restored, so
+        fills, which are already applied, and reservations of resting
+        orders aren't lost between steps
+        """
+        if self.ledger_state is None:
+            return self.exchange.track_resources()
+        return self.exchange.track_resources(ledger=BalanceLedger.from_dict(
+            self.exchange.get_resources, self.ledger_state))
+
+    def step(self, update_function=lambda time_estimate: None):
+        """
+        :param update_function: called with estimate of remaining time in ms
+        :return: seconds until the next step, None if rebalance is finished
+        """
+        if self.waiting:
+            unfilled = (self.monitor.get_unfilled(self.order_responses)
+                        if self.order_responses else [])
+            delay = self._get_poll_delay(unfilled)
+            if delay is not None:
+                return delay
+            self._finish_cycle(unfilled)
+        if not self.is_running():
+            self.cancel()
+            return None
+        self._start_cycle()
+        return self._start_waiting(update_function)
+
+    def is_running(self) -> bool:
+        return bool(self.orders) and all(
+            self.number_of_trials[order.product] <= self.max_retries
+            for order in self.orders)
+
+    def cancel(self):
+        """
+        cancels orders left in orderbook, e.g. when other product runs out
+        of retries, rebalance is finished after that
+        """
+        for index, order_response in self._pop_resting():
+            self._apply_final_state(
+                self.plan[index],
+                cancel_and_get_order(self.exchange, order_response), True)
+        del self.orders[:]
+
+    def _get_poll_delay(self, unfilled):
+        """
+        :return: seconds until orders are checked again, None if cycle is
+                 finished
+        """
+        remaining = self.deadline - time.time()
+        if (unfilled and remaining > 0 and
+                not self.monitor.market_moved(unfilled)):
+            delay = min(self.interval, remaining)
+            if self.poll_interval is None:
+                self.interval = max(min(self.interval * self.monitor.backoff,
+                                        self.monitor.max_interval),
+                                    self.interval)
+            return delay
+        return None
+
+    def _start_waiting(self, update_function):
+        update_function(limit_order_rebalance_retry_after_time_estimate(
+            self.number_of_trials, self.max_retries, self.time_delta))
+        self.waiting = True
+        self.deadline = time.time() + self.time_delta
+        if self.poll_interval is None:
+            self.interval = self.monitor.get_min_interval(
+                self.order_responses)
+        else:
+            self.interval = self.poll_interval
+        return min(self.interval, self.time_delta)
+
+    def _pop_resting(self):
+        """
+        :return: sorted pairs of plan index and response of every order,
+                 which may rest in orderbook
+        """
+        for order_response in self.order_responses:
+            index = self.plan.index(order_response['order'])
+            self.resting.setdefault(index, order_response)
+        self.order_responses = []
+        self.waiting = False
+        resting = sorted(self.resting.items(), key=lambda item: item[0])
+        self.resting = {}
+        return resting
+
+    def _apply_final_state(self, order, resp, counted):
+        self.rets.append(resp)
+        remaining = (Decimal(resp['orig_quantity']) -
+                     Decimal(resp['executed_quantity']))
+        if remaining > Decimal('1e-3'):
+            order._quantity = remaining
+            if not counted:
+                self.number_of_trials[order.product] += 1
+            return
+        self.number_of_trials[order.product] = self.max_retries
+        if order in self.orders:
+            self.orders.remove(order)
+
+    def _start_cycle(self):
+        exchange = self.exchange
+        # every cycle works with fresh orderbooks and resources
+        exchange.invalidate_snapshot()
+        orderbooks = exchange.get_orderbooks(self.products)
         orderbooks = {ob.product: ob for ob in orderbooks}
+        kept, stale = self._split_resting(orderbooks)
+        for order_response in stale:
+            self._apply_final_state(order_response['order'],
+                                    cancel_and_get_order(exchange,
+                                                         order_response),
+                                    True)
+        if exchange.ledger is not None:
+            self.resources = exchange.ledger.get_resources()
+        self.order_responses = kept
+        for order in self._get_orders_to_place(orderbooks, kept):
+            self._add_placed(order, exchange.place_limit_order(order))
+
+    def _split_resting(self, orderbooks):
+        """
+        :return: responses of resting orders, which are kept, and of stale
+                 ones, which have to be canceled
+        """
+        kept = []
+        stale = []
+        for order in self.orders:
+            order_response = self.resting.pop(self.plan.index(order), None)
+            if order_response is None:
+                continue
+            orderbook = orderbooks[order.product]
+            if (not is_stale(order, orderbook.get_mid_market_price(),
+                             orderbook, self.reprice_band) or
+                    (self.max_requotes is not None and
+                     self.number_of_requotes[order.product] >=
+                     self.max_requotes)):
+                kept.append(order_response)
+                continue
+            self.number_of_requotes[order.product] += 1
+            stale.append(order_response)
+        return kept, stale
+
+    def _get_orders_to_place(self, orderbooks, kept):
+        """
+        sets mid market price of orders, which aren't kept in orderbook
+        :return: those of them, which can be funded now
+        """
+        resources = self.resources
         currencies_from = set()
         currencies_to = set()
-        for order in orders:
+        for order in self.orders:
             currency_commodity, currency_base = order.product.split('_')
             if order._action == OrderAction.SELL:
                 currencies_from.add(currency_commodity)
@@ -96,9 +421,11 @@ def limit_order_rebalance_with_orders(update_function,
 
         currencies_free = currencies_from - currencies_to
 
-        order_responses = []
-        orders_to_remove = []
-        for order in orders:
+        kept = {id(order_response['order']) for order_response in kept}
+        orders = []
+        for order in self.orders:
+            if id(order) in kept:
+                continue
             currency_commodity, currency_base = order.product.split('_')
             orderbook = orderbooks[order.product]
             order._price = orderbook.get_mid_market_price()
@@ -113,35 +440,192 @@ def limit_order_rebalance_with_orders(update_function,
                         order._quantity * order._price):
                     # if buying commodity, for which we don't have base yet
                     continue
-            order_response = exchange.place_limit_order(order)
-            if order_response is None:
-                number_of_trials[order.product] = max_retries
-                orders_to_remove.append(order)
-            elif not isinstance(order_response, Exception):
-                order_response.update({'order': order})
-                order_responses.append(order_response)
-            else:
-                number_of_trials[order.product] += 1
-        for order in orders_to_remove:
-            number_of_trials[order.product] = max_retries
-            orders.remove(order)
+            orders.append(order)
+        return orders
 
-        update_function(limit_order_rebalance_retry_after_time_estimate(
-            number_of_trials, max_retries, time_delta))
-        time.sleep(time_delta)
-        for order_response in order_responses:
-            exchange.cancel_limit_order(order_response)
-            resp = exchange.get_order(order_response)
-            rets.append(resp)
+    def _add_placed(self, order, order_response):
+        if order_response is None:
+            # order is invalid, e.g. too small
+            self.number_of_trials[order.product] = self.max_retries
+            self.orders.remove(order)
+        elif not isinstance(order_response, Exception):
+            order_response.update({'order': order})
+            self.order_responses.append(order_response)
+        else:
+            self.number_of_trials[order.product] += 1
+
+    def _finish_cycle(self, unfilled):
+        unfilled = {id(order_response) for order_response in unfilled}
+        for order_response, resp in self._pop_finished(unfilled):
+            if resp is None:
+                # filled orders are canceled too, because of dust
+                resp = cancel_and_get_order(self.exchange, order_response)
+            elif not resp:
+                resp = self.exchange.get_order(order_response)
+            self._apply_final_state(order_response['order'], resp,
+                                    id(order_response) in unfilled)
+
+    def _pop_finished(self, unfilled):
+        """
+        unfilled orders of products with retries left stay in orderbook
+        :param unfilled: ids of responses of unfilled orders
+        :return: pairs of response of finished order and its last state,
+                 which is None, if order may rest in orderbook, and empty,
+                 if it isn't known
+        """
+        finished = []
+        for order_response in self.order_responses:
             order = order_response['order']
-            if (Decimal(resp['orig_quantity']) -
-                    Decimal(resp['executed_quantity'])) > Decimal('1e-3'):
-                order._quantity = Decimal(
-                    resp['orig_quantity']) - Decimal(resp['executed_quantity'])
+            resp = self.monitor.get_closed(order_response)
+            if resp is None and id(order_response) in unfilled:
+                self.number_of_trials[order.product] += 1
+                if self.number_of_trials[order.product] <= self.max_retries:
+                    self.resting[self.plan.index(order)] = order_response
+                    continue
+            finished.append((order_response, resp))
+        self.order_responses = []
+        self.waiting = False
+        return finished
 
-                number_of_trials[order.product] += 1
-            else:
-                number_of_trials[order.product] = max_retries
-                orders.remove(order)
+    def to_dict(self) -> dict:
+        """
+        json serializable state, orders in responses are replaced by their
+        index in plan, ledger of exchange is saved, if it is tracked
+        """
+        def dump_response(order_response):
+            order_response = dict(order_response)
+            order_response['order'] = self.plan.index(order_response['order'])
+            return order_response
+
+        return {
+            'plan': [order.to_dict() for order in self.plan],
+            'orders': [self.plan.index(order) for order in self.orders],
+            'resources': {currency: str(quantity)
+                          for currency, quantity in self.resources.items()},
+            'products': list(self.products),
+            'max_retries': self.max_retries,
+            'time_delta': self.time_delta,
+            'base': self.base,
+            'reprice_band': str(self.reprice_band),
+            'max_requotes': self.max_requotes,
+            'poll_interval': self.poll_interval,
+            'number_of_trials': self.number_of_trials,
+            'number_of_requotes': self.number_of_requotes,
+            'rets': self.rets,
+            'resting': [[index, dump_response(order_response)]
+                        for index, order_response in self.resting.items()],
+            'order_responses': [dump_response(order_response)
+                                for order_response in self.order_responses],
+            'waiting': self.waiting,
+            'deadline': self.deadline,
+            'interval': self.interval,
+            'ledger': (self.exchange.ledger.to_dict()
+                       if self.exchange.ledger is not None else None)
+        }
+
+    @classmethod
+    def from_dict(cls, exchange: Exchange,
+                  d: dict) -> 'LimitOrderRebalance':
+        plan = [Order.from_dict(order) for order in d['plan']]
+
+        def load_response(order_response):
+            order_response = dict(order_response)
+            order_response['order'] = plan[order_response['order']]
+            return order_response
+
+        rebalance = cls(
+            exchange,
+            {currency: Decimal(quantity)
+             for currency, quantity in d['resources'].items()},
+            d['products'], [plan[index] for index in d['orders']],
+            d['max_retries'], d['time_delta'], d['base'],
+            reprice_band=Decimal(d['reprice_band']),
+            max_requotes=d['max_requotes'],
+            poll_interval=d.get('poll_interval'))
+        rebalance.plan = plan
+        rebalance.number_of_trials = d['number_of_trials']
+        rebalance.number_of_requotes = d['number_of_requotes']
+        rebalance.rets = d['rets']
+        rebalance.resting = {index: load_response(order_response)
+                             for index, order_response in d['resting']}
+        rebalance.order_responses = [load_response(order_response)
+                                     for order_response in
+                                     d['order_responses']]
+        rebalance.waiting = d['waiting']
+        rebalance.deadline = d['deadline']
+        rebalance.interval = d['interval']
+        rebalance.ledger_state = d.get('ledger')
+        return rebalance
+
+
+class AsyncLimitOrderRebalance(LimitOrderRebalance):
+    """
+    LimitOrderRebalance of AsyncExchange, decisions are shared, requests of
+    one step (cancels, checks and new orders) are sent concurrently
+    """
+
+    def __init__(self, exchange: AsyncExchange, *args, **kwargs):
+        super().__init__(exchange, *args, **kwargs)
+        self.monitor = AsyncFillMonitor(exchange)
+
+    async def step(self, update_function=lambda time_estimate: None):
+        if self.waiting:
+            unfilled = ((await self.monitor.get_unfilled(
+                self.order_responses)) if self.order_responses else [])
+            delay = self._get_poll_delay(unfilled)
+            if delay is not None:
+                return delay
+            await self._finish_cycle(unfilled)
+        if not self.is_running():
+            await self.cancel()
+            return None
+        await self._start_cycle()
+        return self._start_waiting(update_function)
+
+    async def cancel(self):
+        resting = self._pop_resting()
+        resps = await asyncio.gather(*[
+            async_cancel_and_get_order(self.exchange, order_response)
+            for _, order_response in resting])
+        for (index, _), resp in zip(resting, resps):
+            self._apply_final_state(self.plan[index], resp, True)
+        del self.orders[:]
+
+    async def _start_cycle(self):
+        exchange = self.exchange
+        orderbooks = await exchange.get_orderbooks(self.products)
+        orderbooks = {ob.product: ob for ob in orderbooks}
+        kept, stale = self._split_resting(orderbooks)
+        resps = await asyncio.gather(*[
+            async_cancel_and_get_order(exchange, order_response)
+            for order_response in stale])
+        for order_response, resp in zip(stale, resps):
+            self._apply_final_state(order_response['order'], resp, True)
+        if exchange.ledger is not None:
+            self.resources = await exchange.get_available_resources()
+        self.order_responses = kept
+        # placed limit orders don't change ledger, so they don't wait for
+        # each other
+        orders = self._get_orders_to_place(orderbooks, kept)
+        order_responses = await asyncio.gather(*[
+            exchange.place_limit_order(order) for order in orders])
+        for order, order_response in zip(orders, order_responses):
+            self._add_placed(order, order_response)
+
+    async def _finish_cycle(self, unfilled):
+        unfilled = {id(order_response) for order_response in unfilled}
+        finished = self._pop_finished(unfilled)
+        resps = await asyncio.gather(*[
+            self._get_final_state(order_response, resp)
+            for order_response, resp in finished])
+        for (order_response, _), resp in zip(finished, resps):
+            self._apply_final_state(order_response['order'], resp,
+                                    id(order_response) in unfilled)
 
-    return rets
+    async def _get_final_state(self, order_response, resp):
+        if resp is None:
+            return await async_cancel_and_get_order(self.exchange,
+                                                    order_response)
+        if not resp:
+            return await self.exchange.get_order(order_response)
+        return resp
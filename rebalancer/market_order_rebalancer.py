@@ -1,8 +1,12 @@
+import asyncio
 from decimal import Decimal
 from typing import Dict, List
-from rebalancer.utils import rebalance_orders, topological_sort, \
-    get_total_fee, parse_order, pre_rebalance
+from rebalancer.utils import rebalance_orders_from_costs, topological_sort, \
+    parse_order, pre_rebalance, async_pre_rebalance
+from rebalancer.executor import execute_orders, async_execute_orders
+from logger import logger
 from exchange.exchange import Exchange
+from exchange.async_exchange import AsyncExchange
 from webserver.models import Statistics
 
 
@@ -24,51 +28,142 @@ def market_order_rebalance(exchange: Exchange,
                            weights: Dict[str, Decimal],
                            update_function,
                            base: str='USDT'):
-    pre_rebalance_results = pre_rebalance(exchange, weights, base)
+    plan = plan_market_orders(exchange, weights,
+                              pre_rebalance(exchange, weights, base), base)
+    if isinstance(plan, (list, Exception)):
+        return plan
+    orders, resources, orderbooks, price_estimates = plan
+    length = len(orders)
+    update_function(length * 10000)
+
+    def place_order(order):
+        # ledger is thread local, worker threads share ledger of rebalance
+        with exchange.track_resources(ledger=ledger):
+            for i in range(10):
+                ret_order = exchange.place_market_order(order,
+                                                        price_estimates)
+                if not is_retried(exchange, order, ret_order):
+                    break
+        return get_market_order_result(order, ret_order, orderbooks)
+
+    def on_done(order, ret_order):
+        nonlocal length
+        length -= 1
+        update_function(length * 10000)
+
+    # orders are validated against resources updated from fills, orders,
+    # which don't wait for proceeds of each other, are placed concurrently
+    with exchange.track_resources(resources) as ledger:
+        ret_orders = execute_orders(orders, place_order, on_done)
+    ret_orders = [ret_order for ret_order in ret_orders
+                  if ret_order is not None]
+
+    return ret_orders
+
+
+async def async_market_order_rebalance(exchange: AsyncExchange,
+                                       weights: Dict[str, Decimal],
+                                       update_function,
+                                       base: str='USDT',
+                                       canceled: asyncio.Event=None):
+    """
+    market_order_rebalance with AsyncExchange, orders are placed by
+    coroutines instead of threads
+    :param canceled: when it is set, orders, which aren't placed yet, are
+                     dropped
+    """
+    plan = plan_market_orders(exchange, weights,
+                              await async_pre_rebalance(exchange, weights,
+                                                        base), base)
+    if isinstance(plan, (list, Exception)):
+        return plan
+    orders, resources, orderbooks, price_estimates = plan
+    length = len(orders)
+    update_function(length * 10000)
+
+    async def place_order(order):
+        if canceled is not None and canceled.is_set():
+            return
+        for i in range(10):
+            ret_order = await exchange.place_market_order(order,
+                                                          price_estimates)
+            if not is_retried(exchange, order, ret_order):
+                break
+        return get_market_order_result(order, ret_order, orderbooks)
+
+    def on_done(order, ret_order):
+        nonlocal length
+        length -= 1
+        update_function(length * 10000)
 
+    with exchange.track_resources(resources):
+        ret_orders = await async_execute_orders(orders, place_order, on_done)
+    return [ret_order for ret_order in ret_orders if ret_order is not None]
+
+
+def plan_market_orders(exchange: Exchange, weights: Dict[str, Decimal],
+                       pre_rebalance_results, base: str='USDT'):
+    """
+    :return: validated and topologically sorted market orders, resources,
+             orderbooks and price estimates, or list of unknown currencies,
+             or exception
+    """
     if isinstance(pre_rebalance_results, list):
         return pre_rebalance_results
 
     (products, resources, orderbooks, price_estimates,
      portfolio_value, initial_weights,
-     spread_fees) = pre_rebalance_results
-
-    fees = {product: exchange.get_taker_fee(product)
-            for product in products}
+     snapshot) = pre_rebalance_results
 
-    total_fees = {product: 1 - get_total_fee(fees[product],
-                                             spread_fees[product])
-                  for product in products}
+    fees = snapshot.get_fees(exchange.get_taker_fee)
+    edge_costs = snapshot.get_edge_costs((1 - fees) *
+                                         (1 - snapshot.spread_fees))
 
-    orders = rebalance_orders(
-        initial_weights, weights, total_fees)
+    orders = rebalance_orders_from_costs(
+        initial_weights, weights, edge_costs,
+        hubs=exchange.through_trade_currencies())
 
     if isinstance(orders, Exception):
         return orders
 
     orders = [(*order[:2], order[2] * portfolio_value) for order in orders]
     orders = topological_sort(orders)
-    orders = [parse_order(order, products,
+    orders = [parse_order(order, snapshot,
                           price_estimates,
                           base)
               for order in orders]
-    length = len(orders)
-    update_function(length * 10000)
-    ret_orders = []
-    for order in orders:
-        for i in range(10):
-            ret_order = exchange.place_market_order(order, price_estimates)
-            if not isinstance(ret_order, Exception):
-                ret_orders.append(ret_order)
-                break
-        length -= 1
-        update_function(length * 10000)
-        if ret_order is None or isinstance(ret_order, Exception):
-            continue
-        ret_order['mid_market_price'] = orderbooks[
-            order.product].get_mid_market_price()
+    validated_orders = exchange.validate_orders(orders, price_estimates,
+                                                resources)
+    for order, (validated_order, reason) in zip(orders, validated_orders):
+        if validated_order is None:
+            logger.info("order is rejected ({}) - {}".format(
+                reason, str(order)))
+    orders = [order for order, _ in validated_orders if order is not None]
+    return orders, resources, orderbooks, price_estimates
 
-    return ret_orders
+
+def is_retried(exchange: Exchange, order, ret_order) -> bool:
+    """
+    rate limits are waited for by exchange client, so only transient
+    errors are worth retrying
+    """
+    if not isinstance(ret_order, Exception):
+        return False
+    if not exchange.is_transient_error(ret_order):
+        logger.warning("order failed - {}: {}".format(str(order), ret_order))
+        return False
+    return True
+
+
+def get_market_order_result(order, ret_order, orderbooks):
+    """
+    :return: response of placed order with mid market price or None
+    """
+    if ret_order is None or isinstance(ret_order, Exception):
+        return
+    ret_order['mid_market_price'] = orderbooks[
+        order.product].get_mid_market_price()
+    return ret_order
 
 
 def create_order_statistics_objects(order_responses, user) -> List[Statistics]:
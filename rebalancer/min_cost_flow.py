@@ -0,0 +1,488 @@
+from typing import Dict, Tuple, List
+import heapq
+import threading
+from collections import defaultdict, OrderedDict
+import numpy as np
+
+# distance of unreachable currencies, sums of few of them fit into int64
+INF = 2 ** 60
+# cost of cells in closed rows and columns of transportation problem
+CLOSED = 2 ** 62
+# vertices of higher degree are left to floyd-warshall
+MAX_ELIMINATION_DEGREE = 8
+# skeletons of this many product sets are cached
+MAX_SKELETONS = 16
+
+
+class FlowUnfeasible(Exception):
+    pass
+
+
+def shortest_paths(costs: np.ndarray) -> np.ndarray:
+    """
+    all pairs distances, vertices of low degree (e.g. currencies traded
+    only against few quotes) are eliminated first, floyd-warshall runs
+    over remaining core only, eliminated vertices get their distances
+    back from their neighbours
+    :param costs: n x n symmetric int64 matrix of edge costs, INF if there
+                  is no edge
+    :return: n x n matrix of distances
+    """
+    adjacency = [set(np.flatnonzero(row < INF).tolist()) - {v}
+                 for v, row in enumerate(costs)]
+    return _shortest_paths(costs, *_elimination_order(adjacency))
+
+
+def _elimination_order(adjacency: List[set]):
+    """
+    depends on topology only, neighbours of eliminated vertex become clique
+    :return: list of eliminated vertices with their neighbours at that
+             time, vertices of core
+    """
+    adjacency = [set(neighbours) for neighbours in adjacency]
+    elimination = []
+    remaining = set(range(len(adjacency)))
+    heap = [(len(neighbours), v) for v, neighbours in enumerate(adjacency)]
+    heapq.heapify(heap)
+    while heap:
+        degree, v = heapq.heappop(heap)
+        if v not in remaining or degree != len(adjacency[v]):
+            continue
+        if degree > MAX_ELIMINATION_DEGREE:
+            break
+        neighbours = adjacency[v]
+        for u in neighbours:
+            adjacency[u].discard(v)
+            adjacency[u] |= neighbours - {u}
+            heapq.heappush(heap, (len(adjacency[u]), u))
+        remaining.remove(v)
+        elimination.append((v, np.array(sorted(neighbours), dtype=np.int64)))
+    return elimination, np.array(sorted(remaining), dtype=np.int64)
+
+
+def _shortest_paths(costs: np.ndarray, elimination, core) -> np.ndarray:
+    weights = costs.copy()
+    for v, neighbours in elimination:
+        through = weights[v, neighbours]
+        block = np.ix_(neighbours, neighbours)
+        weights[block] = np.minimum(weights[block],
+                                    through[:, None] + through[None, :])
+    dists = np.full(costs.shape, INF, dtype=np.int64)
+    dists[np.ix_(core, core)] = _floyd_warshall(weights[np.ix_(core, core)])
+    known = list(core)
+    for v, neighbours in reversed(elimination):
+        if len(neighbours):
+            row = (weights[v, neighbours][:, None] +
+                   dists[np.ix_(neighbours, known)]).min(axis=0)
+            np.minimum(row, INF, out=row)
+            dists[v, known] = dists[known, v] = row
+        dists[v, v] = 0
+        known.append(v)
+    return dists
+
+
+def _floyd_warshall(costs: np.ndarray) -> np.ndarray:
+    dists = costs.copy()
+    np.fill_diagonal(dists, 0)
+    candidates = np.empty_like(dists)
+    for k in range(len(dists)):
+        np.add(dists[:, k, None], dists[None, k, :], out=candidates)
+        np.minimum(dists, candidates, out=dists)
+    np.minimum(dists, INF, out=dists)
+    return dists
+
+
+def transportation(supply: np.ndarray, demand: np.ndarray,
+                   costs: np.ndarray) -> np.ndarray:
+    """
+    transportation simplex, starts from greedy cheapest cell solution,
+    ships min(sum(supply), sum(demand)), excess stays with dummy sink
+    or source of zero cost
+    :param supply: p nonnegative integers
+    :param demand: q nonnegative integers
+    :param costs: p x q integers
+    :return: p x q matrix of shipped quantities
+    """
+    return _transportation(supply, demand, costs)[0]
+
+
+def _transportation(supply, demand, costs, preferred=()):
+    """
+    :param preferred: cells, which greedy solution fills first, e.g. basis
+                      of previous solution
+    :return: shipped quantities, basic cells without dummy ones
+    """
+    p, q = costs.shape
+    excess = int(supply.sum()) - int(demand.sum())
+    if excess > 0:
+        demand = np.append(demand, excess)
+        costs = np.hstack([costs, np.zeros((p, 1), dtype=np.int64)])
+    elif excess < 0:
+        supply = np.append(supply, -excess)
+        costs = np.vstack([costs, np.zeros((1, q), dtype=np.int64)])
+    flows, basis = _greedy_solution(supply, demand, costs, preferred)
+    rows, columns = costs.shape
+    potentials, parents = _basis_tree(basis, costs, rows, columns)
+    # potentials of rows and columns move in opposite directions
+    signs = np.ones(rows + columns, dtype=np.int64)
+    signs[rows:] = -1
+    while True:
+        reduced = (costs - potentials[:rows, None] -
+                   potentials[None, rows:])
+        cell = reduced.argmin()
+        i, j = divmod(int(cell), columns)
+        if reduced[i, j] >= 0:
+            break
+        # cycle closed by entering cell, path alternates columns and rows
+        path_i = _path_to_root(parents, i)
+        position = {vertex: k for k, vertex in enumerate(path_i)}
+        path_j = [rows + j]
+        while path_j[-1] not in position:
+            path_j.append(int(parents[path_j[-1]]))
+        path_i = path_i[:position[path_j[-1]]]
+        path = path_j + path_i[::-1]
+        edges = list(zip(path, path[1:]))
+        decreasing = edges[::2]
+        a, b = min(decreasing, key=lambda e: flows[_cell(e[0], e[1], rows)])
+        quantity = flows[_cell(a, b, rows)]
+        for e in decreasing:
+            flows[_cell(e[0], e[1], rows)] -= quantity
+        for e in edges[1::2]:
+            flows[_cell(e[0], e[1], rows)] += quantity
+        flows[i, j] += quantity
+
+        # leaving edge cuts off subtree of child, which hangs on entering
+        # edge now
+        child = b if parents[b] == a else a
+        inner, outer = (i, rows + j) if child in path_i else (rows + j, i)
+        shift = int(reduced[i, j]) if inner == i else -int(reduced[i, j])
+        potentials += shift * signs * _descendants(parents, child)
+        previous, vertex = outer, inner
+        while True:
+            following = int(parents[vertex])
+            parents[vertex] = previous
+            if vertex == child:
+                break
+            previous, vertex = vertex, following
+    basis = [_cell(vertex, int(parent), rows)
+             for vertex, parent in enumerate(parents) if vertex != parent]
+    return flows[:p, :q], [(i, j) for i, j in basis if i < p and j < q]
+
+
+def _path_to_root(parents: np.ndarray, vertex: int) -> List[int]:
+    path = [vertex]
+    while parents[path[-1]] != path[-1]:
+        path.append(int(parents[path[-1]]))
+    return path
+
+
+def _descendants(parents: np.ndarray, vertex: int) -> np.ndarray:
+    """
+    pointer doubling, takes log of depth of tree vectorized steps
+    :return: 0/1 array, 1 for vertex and its descendants
+    """
+    reached = np.zeros(len(parents), dtype=np.int64)
+    reached[vertex] = 1
+    ancestors = parents
+    while True:
+        reached |= reached[ancestors]
+        following = ancestors[ancestors]
+        if np.array_equal(following, ancestors):
+            return reached
+        ancestors = following
+
+
+def _cell(a: int, b: int, rows: int) -> Tuple[int, int]:
+    """
+    cell of tree edge between vertices, rows go first, columns follow
+    """
+    if a < rows:
+        return a, b - rows
+    return b, a - rows
+
+
+def _greedy_solution(supply: np.ndarray, demand: np.ndarray,
+                     costs: np.ndarray, preferred=()):
+    """
+    fills preferred cells and then cheapest cells first, every filled cell
+    closes one row or column, so rows + columns - 1 cells form spanning tree
+    """
+    supply = [int(x) for x in supply]
+    demand = [int(x) for x in demand]
+    rows, columns = costs.shape
+    flows = np.zeros((rows, columns), dtype=np.int64)
+    # cells of closed rows and columns are never the cheapest
+    open_costs = costs.copy()
+    row_open = [True] * rows
+    column_open = [True] * columns
+    open_rows = rows
+    basis = []
+    preferred = sorted(preferred, key=lambda c: costs[c])[::-1]
+    while len(basis) < rows + columns - 1:
+        if preferred:
+            i, j = preferred.pop()
+            if not (row_open[i] and column_open[j]):
+                continue
+        else:
+            i, j = divmod(int(open_costs.argmin()), columns)
+        quantity = min(supply[i], demand[j])
+        flows[i, j] = quantity
+        supply[i] -= quantity
+        demand[j] -= quantity
+        basis.append((i, j))
+        if supply[i] == 0 and open_rows > 1:
+            row_open[i] = False
+            open_rows -= 1
+            open_costs[i, :] = CLOSED
+        else:
+            column_open[j] = False
+            open_costs[:, j] = CLOSED
+    return flows, basis
+
+
+def _basis_tree(basis, costs, rows, columns):
+    """
+    potentials with u[i] + v[j] == costs[i, j] for basic cells, u[0] == 0
+    :return: potentials and parents of vertices in basis tree rooted at
+             row 0 (parent of itself), rows go first, columns follow
+    """
+    adjacency = [set() for _ in range(rows + columns)]
+    for i, j in basis:
+        adjacency[i].add(rows + j)
+        adjacency[rows + j].add(i)
+    potentials = [0] * (rows + columns)
+    parents = [0] * (rows + columns)
+    queue = [0]
+    for vertex in queue:
+        for following in adjacency[vertex]:
+            if following == parents[vertex]:
+                continue
+            parents[following] = vertex
+            i, j = _cell(vertex, following, rows)
+            potentials[following] = int(costs[i, j]) - potentials[vertex]
+            queue.append(following)
+    return (np.array(potentials, dtype=np.int64),
+            np.array(parents, dtype=np.int64))
+
+
+class FlowSkeleton:
+    """
+    currencies and products of exchange, which rarely change between
+    rebalances, costs are updated in place, distances are kept until costs
+    change and solution starts from basis of previous one
+    """
+
+    def __init__(self, edges: List[Tuple[str, str]]):
+        self.edges = list(edges)
+        self.currencies = sorted({c for edge in self.edges for c in edge})
+        self.index = {c: i for i, c in enumerate(self.currencies)}
+        n = len(self.currencies)
+        self._us = np.array([self.index[c1] for c1, _ in self.edges],
+                            dtype=np.int64)
+        self._vs = np.array([self.index[c2] for _, c2 in self.edges],
+                            dtype=np.int64)
+        adjacency = [set() for _ in range(n)]
+        for u, v in zip(self._us.tolist(), self._vs.tolist()):
+            adjacency[u].add(v)
+            adjacency[v].add(u)
+        self.neighbours = [np.array(sorted(a), dtype=np.int64)
+                           for a in adjacency]
+        self._elimination = _elimination_order(adjacency)
+        self.costs = np.full((n, n), INF, dtype=np.int64)
+        self._values = None
+        self.dists = None
+        self._components = None
+        self._paths = {}
+        # basic cells of previous solution, (source, sink)
+        self.basis = set()
+        self.lock = threading.Lock()
+
+    def set_costs(self, edge_costs: Dict[Tuple[str, str], int]):
+        """
+        :param edge_costs: costs of all edges of skeleton
+        """
+        values = np.array([edge_costs[edge] for edge in self.edges],
+                          dtype=np.int64)
+        if (values < 0).any():
+            c1, c2 = self.edges[int(values.argmin())]
+            raise ValueError("negative cost of {}_{}".format(c1, c2))
+        if self._values is not None and np.array_equal(values,
+                                                       self._values):
+            return
+        self._values = values
+        self.costs[self._us, self._vs] = values
+        self.costs[self._vs, self._us] = values
+        self.dists = None
+
+    def solve(self, supplies: Dict[str, int], demands: Dict[str, int]) -> (
+            Dict[Tuple[str, str], int]):
+        """
+        min cost flow over uncapacitated undirected edges, currencies supply
+        and demand themselves for free, so only differences are shipped
+        :param supplies: currency to quantity before
+        :param demands: currency to quantity after
+        :return: (currency from, currency to) to positive quantity
+        """
+        if self.dists is None:
+            self.dists = _shortest_paths(self.costs, *self._elimination)
+            self._components = (self.dists < INF).argmax(axis=1)
+            self._paths = {}
+        balance = np.zeros(len(self.currencies), dtype=np.int64)
+        # currencies without products can only keep what they have
+        isolated = 0
+        for currency, quantity in supplies.items():
+            if currency in self.index:
+                balance[self.index[currency]] += quantity
+            else:
+                isolated += quantity - demands.get(currency, 0)
+        for currency, quantity in demands.items():
+            if currency in self.index:
+                balance[self.index[currency]] -= quantity
+            elif currency not in supplies:
+                isolated -= quantity
+        enough_supply = balance.sum() + isolated >= 0
+        if (isolated < 0) if enough_supply else (isolated > 0):
+            raise FlowUnfeasible("no route from supply to demand")
+
+        flows = defaultdict(int)
+        basis = set()
+        for component in np.unique(self._components):
+            members = self._components == component
+            sources = np.flatnonzero(members & (balance > 0))
+            sinks = np.flatnonzero(members & (balance < 0))
+            excess = balance[members].sum()
+            # all demand is met, if there is enough supply, and vice versa
+            if (excess < 0) if enough_supply else (excess > 0):
+                raise FlowUnfeasible("no route from supply to demand")
+            if not len(sources) or not len(sinks):
+                continue
+            rows = {v: i for i, v in enumerate(sources.tolist())}
+            columns = {v: j for j, v in enumerate(sinks.tolist())}
+            preferred = [(rows[u], columns[v]) for u, v in self.basis
+                         if u in rows and v in columns]
+            shipped, cells = _transportation(
+                balance[sources], -balance[sinks],
+                self.dists[np.ix_(sources, sinks)], preferred)
+            basis.update((int(sources[i]), int(sinks[j])) for i, j in cells)
+            for i, j in zip(*np.nonzero(shipped)):
+                quantity = int(shipped[i, j])
+                for edge in self._path(int(sources[i]), int(sinks[j])):
+                    flows[edge] += quantity
+        self.basis = basis
+
+        result = {}
+        for (i, j), quantity in flows.items():
+            quantity -= flows.get((j, i), 0)
+            if quantity > 0:
+                result[(self.currencies[i], self.currencies[j])] = quantity
+        return result
+
+    def _path(self, source: int, sink: int) -> List[Tuple[int, int]]:
+        if (source, sink) not in self._paths:
+            self._paths[(source, sink)] = _shortest_path(
+                source, sink, self.costs, self.dists, self.neighbours)
+        return self._paths[(source, sink)]
+
+
+_skeletons = OrderedDict()
+_skeletons_lock = threading.Lock()
+
+
+def get_flow_skeleton(edges: List[Tuple[str, str]]) -> FlowSkeleton:
+    """
+    skeleton of product set, least recently used ones are dropped
+    """
+    key = frozenset(edges)
+    with _skeletons_lock:
+        if key in _skeletons:
+            _skeletons.move_to_end(key)
+        else:
+            _skeletons[key] = FlowSkeleton(edges)
+            if len(_skeletons) > MAX_SKELETONS:
+                _skeletons.popitem(last=False)
+        return _skeletons[key]
+
+
+def star_flow(supplies: Dict[str, int], demands: Dict[str, int],
+              edge_costs: Dict[Tuple[str, str], int], hub: str) -> (
+        Dict[Tuple[str, str], int]):
+    """
+    plan, which sells all surpluses into hub and buys all deficits from it,
+    in O(edges), if it is provably optimal:
+    every currency v with nonzero balance trades directly against hub, let
+    r[v] be cost of that edge, r[hub] = 0, r = 0 for others, if every other
+    edge (u, v) costs at least r[u] + r[v], any path between a and b costs
+    at least r[a] + r[b], so sum of r[v] * shipped[v] is lower bound of cost
+    of any plan, and star plan reaches it
+    :return: (currency from, currency to) to positive quantity, None if
+             star plan is not provably optimal
+    """
+    balance = defaultdict(int)
+    for currency, quantity in supplies.items():
+        balance[currency] += quantity
+    for currency, quantity in demands.items():
+        balance[currency] -= quantity
+    r = {}
+    for (c1, c2), cost in edge_costs.items():
+        if cost < 0:
+            return None
+        if c1 == hub and balance.get(c2):
+            r[c2] = cost
+        elif c2 == hub and balance.get(c1):
+            r[c1] = cost
+    r[hub] = 0
+    if any(quantity and currency not in r
+           for currency, quantity in balance.items()):
+        return None
+    for (c1, c2), cost in edge_costs.items():
+        if hub not in (c1, c2) and cost < r.get(c1, 0) + r.get(c2, 0):
+            return None
+
+    sources = sorted((r[c], c) for c, q in balance.items() if q > 0)
+    sinks = sorted((r[c], c) for c, q in balance.items() if q < 0)
+    # cheapest surpluses or deficits are shipped, if totals differ
+    supply = sum(balance[c] for _, c in sources)
+    demand = -sum(balance[c] for _, c in sinks)
+    flows = {}
+    for side, total, direction in [(sources, demand, 1), (sinks, supply, -1)]:
+        for _, currency in side:
+            quantity = min(abs(balance[currency]), total)
+            total -= quantity
+            if quantity > 0 and currency != hub:
+                edge = (currency, hub) if direction > 0 else (hub, currency)
+                flows[edge] = quantity
+    return flows
+
+
+def clear_flow_skeletons():
+    with _skeletons_lock:
+        _skeletons.clear()
+
+
+def min_cost_flow(supplies: Dict[str, int], demands: Dict[str, int],
+                  edge_costs: Dict[Tuple[str, str], int]) -> (
+        Dict[Tuple[str, str], int]):
+    """
+    min cost flow over uncapacitated undirected edges, costs have to be
+    nonnegative
+    :param supplies: currency to quantity before
+    :param demands: currency to quantity after
+    :param edge_costs: (currency, currency) to cost of unit in both ways
+    :return: (currency from, currency to) to positive quantity
+    """
+    skeleton = FlowSkeleton(list(edge_costs))
+    skeleton.set_costs(edge_costs)
+    return skeleton.solve(supplies, demands)
+
+
+def _shortest_path(source: int, sink: int, costs: np.ndarray,
+                   dists: np.ndarray, neighbours: List[np.ndarray]) -> (
+        List[Tuple[int, int]]):
+    path = []
+    while source != sink:
+        row = neighbours[source]
+        following = row[(costs[source, row] + dists[row, sink] ==
+                         dists[source, sink]).argmax()]
+        path.append((source, following))
+        source = following
+    return path
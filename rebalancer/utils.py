@@ -1,45 +1,78 @@
 from internals.orderbook import OrderBook
-from typing import List, Dict, Tuple, Set
+from typing import List, Dict, Tuple, Set, Iterable
 from decimal import Decimal
 from collections import defaultdict
+from functools import lru_cache
 from internals.order import Order
+from internals.market_snapshot import MarketSnapshot
+from internals.fixed_point import get_scale, to_units, from_units
 from internals.enums import OrderType, OrderAction
 from networkx import digraph
-from networkx import flow
-from networkx.exception import NetworkXUnfeasible
 from exchange.exchange import Exchange
+from rebalancer.min_cost_flow import get_flow_skeleton, star_flow, \
+    FlowUnfeasible
 
 
 def rebalance_orders(initial_weights: Dict[str, Decimal],
                      final_weights: Dict[str, Decimal],
                      fees: Dict[str, Decimal],
-                     precision: Decimal=Decimal('1e-8')) -> (
+                     precision: Decimal=Decimal('1e-8'),
+                     hubs: Iterable[str]=()) -> (
         List[Tuple[str, str, Decimal]]):
     """
     :param initial_weights: weights before rebalance
     :param final_weights: weights after rebalance
     :param fee: dict from product to fee
+    :param hubs: currencies, through which star plan is tried first,
+                 e.g. exchange.through_trade_currencies()
     :return: List of orders, each order is list of length 3,
                              currency from, currency to, quantity_in_base
                                                 (might be product, quantity)
     """
-    parsed_fees = {tuple(k.split('_')): v for k, v in fees.items()}
-    digraph = create_flow_digraph(
-        initial_weights, final_weights, parsed_fees, precision=precision)
-    try:
-        orders_to_make = flow.min_cost_flow(digraph)
-    except NetworkXUnfeasible as error:
-        return error
-    orders = []
-    for currency_from, dct in orders_to_make.items():
-        if currency_from == 'start':
-            continue
-        for currency_to, quantity_in_base in dct.items():
-            if currency_to == 'end' or quantity_in_base < 1e-18:
-                continue
-            orders.append((currency_from, currency_to,
-                           Decimal(quantity_in_base) * precision))
-    return orders
+    edge_costs = {tuple(product.split('_')): fee_to_cost(fee, precision)
+                  for product, fee in fees.items()}
+    return rebalance_orders_from_costs(initial_weights, final_weights,
+                                       edge_costs, precision, hubs)
+
+
+def rebalance_orders_from_costs(initial_weights: Dict[str, Decimal],
+                                final_weights: Dict[str, Decimal],
+                                edge_costs: Dict[Tuple[str, str], int],
+                                precision: Decimal=Decimal('1e-8'),
+                                hubs: Iterable[str]=()) -> (
+        List[Tuple[str, str, Decimal]]):
+    """
+    rebalance_orders with integer costs of currency pairs instead of fees,
+    e.g. from MarketSnapshot.get_edge_costs
+    """
+    scale = get_scale(precision)
+    supplies = {currency: to_units(weight, scale)
+                for currency, weight in initial_weights.items()}
+    demands = {currency: to_units(weight, scale)
+               for currency, weight in final_weights.items()}
+    for hub in sorted(hubs):
+        orders_to_make = star_flow(supplies, demands, edge_costs, hub)
+        if orders_to_make is not None:
+            break
+    else:
+        skeleton = get_flow_skeleton(list(edge_costs))
+        try:
+            with skeleton.lock:
+                skeleton.set_costs(edge_costs)
+                orders_to_make = skeleton.solve(supplies, demands)
+        except FlowUnfeasible as error:
+            return error
+    return [(currency_from, currency_to, from_units(quantity_in_base, scale))
+            for (currency_from, currency_to), quantity_in_base
+            in orders_to_make.items()]
+
+
+@lru_cache(maxsize=4096)
+def fee_to_cost(fee: Decimal, precision: Decimal=Decimal('1e-8')) -> int:
+    """
+    integer cost of edge with fee, costs add up as fees multiply
+    """
+    return -int(float(fee.log10()) * float(1 / precision))
 
 
 def create_flow_digraph(initial_weights: Dict[str, Decimal],
@@ -110,18 +143,7 @@ def get_price_estimates_from_orderbooks(
     """
     get currency to price dictionary
     """
-    currency_pair_prices = get_mid_prices_from_orderbooks(orderbooks)
-    graph = {}
-
-    for product, price in currency_pair_prices.items():
-        currency_from, currencies_to = product.split('_')
-        if currency_from not in graph:
-            graph[currency_from] = {}
-        graph[currency_from][currencies_to] = -price.log10()
-
-    dists = bfs(graph, base)
-    dists = {k: Decimal(10) ** v for k, v in dists.items()}
-    return dists
+    return MarketSnapshot(orderbooks).get_price_estimates(base)
 
 
 def get_mid_prices_from_orderbooks(orderbooks: List[OrderBook]) -> (
@@ -206,43 +228,80 @@ def get_total_fee(*fees):
 
 
 def parse_order(order: Tuple[str, str, Decimal],
-                products: List[str],
+                products: Iterable[str],
                 price_estimates: Dict[str, Decimal],
                 base: str,
                 _type: OrderType=OrderType.MARKET,
                 price: Decimal=None):
+    """
+    :param products: e.g. MarketSnapshot, set of products
+    """
     assert (price is None) == (_type == OrderType.MARKET)
-    product = [product for product in products if product == '_'.join(
-        order[:2]) or product == '_'.join(order[:2][::-1])][0]
+    product = '_'.join(order[:2])
+    if product in products:
+        side = OrderAction.SELL
+    else:
+        product = '_'.join(order[:2][::-1])
+        assert product in products
+        side = OrderAction.BUY
 
     quantity_in_base = order[2]
     quantity = quantity_in_base * (
         price_estimates[base] / price_estimates[product.split('_')[0]])
 
-    if product == '_'.join(order[:2]):
-        side = OrderAction.SELL
-    else:
-        side = OrderAction.BUY
-
     return Order(product, _type, side, quantity, price)
 
 
+def get_possible_products(exchange: Exchange,
+                          resources: Dict[str, Decimal],
+                          weights: Dict[str, Decimal]) -> List[str]:
+    """
+    products between held, wanted and through trade currencies, most of
+    them don't exist
+    """
+    currencies = (exchange.through_trade_currencies() |
+                  set(list(resources.keys())) | set(list(weights.keys())))
+    return ['_'.join([i, j])
+            for i in currencies
+            for j in currencies]
+
+
 def pre_rebalance(exchange: Exchange,
                   weights: Dict[str, Decimal],
                   base: str='USDT'):
     resources = exchange.get_resources()
-    currencies = (exchange.through_trade_currencies() |
-                  set(list(resources.keys())) | set(list(weights.keys())))
-    all_possible_products = ['_'.join([i, j])
-                             for i in currencies
-                             for j in currencies]
-
-    orderbooks = exchange.get_orderbooks(all_possible_products)
     # getting all ordebrooks and filtering out orderbooks,
     # that use other currencies
-    products = set(orderbook.product for orderbook in orderbooks)
+    orderbooks = exchange.get_orderbooks(
+        get_possible_products(exchange, resources, weights))
+    return pre_rebalance_from_market(weights, resources, orderbooks, base)
+
+
+async def async_pre_rebalance(exchange: Exchange,
+                              weights: Dict[str, Decimal],
+                              base: str='USDT'):
+    """
+    pre_rebalance with AsyncExchange
+    """
+    resources = await exchange.get_resources()
+    orderbooks = await exchange.get_orderbooks(
+        get_possible_products(exchange, resources, weights))
+    return pre_rebalance_from_market(weights, resources, orderbooks, base)
 
-    price_estimates = get_price_estimates_from_orderbooks(orderbooks, base)
+
+def pre_rebalance_from_market(weights: Dict[str, Decimal],
+                              resources: Dict[str, Decimal],
+                              orderbooks: List[OrderBook],
+                              base: str='USDT'):
+    """
+    :return: list of unknown currencies or products, resources,
+             orderbooks, price estimates, portfolio value, initial weights
+             and snapshot of orderbooks
+    """
+    snapshot = MarketSnapshot(orderbooks)
+    products = set(snapshot.products)
+
+    price_estimates = snapshot.get_price_estimates(base)
 
     not_existing_currencies = []
     for cur in weights.keys():
@@ -255,11 +314,6 @@ def pre_rebalance(exchange: Exchange,
         resources, price_estimates)
     portfolio_value = get_portfolio_value_from_resources(
         resources, price_estimates)
-    orderbooks = {orderbook.product: orderbook
-                  for orderbook in orderbooks}
-
-    spread_fees = {product: spread_to_fee(orderbook)
-                   for product, orderbook in orderbooks.items()}
 
-    return (products, resources, orderbooks, price_estimates,
-            portfolio_value, initial_weights, spread_fees)
+    return (products, resources, snapshot.orderbooks, price_estimates,
+            portfolio_value, initial_weights, snapshot)
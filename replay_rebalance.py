@@ -0,0 +1,56 @@
+import init_django  # noqa
+import os
+import json
+import time
+import argparse
+from decimal import Decimal
+
+from exchange import get_exchange_by_name
+from internals import recording
+from rebalancer.market_order_rebalancer import market_order_rebalance
+from rebalancer.limit_order_rebalancer import limit_order_rebalance
+
+
+def parse_args(*argument_array):
+    parser = argparse.ArgumentParser(
+        description="replays rebalance against exchange traffic recorded "
+                    "with EXCHANGE_RECORD_PATH, no request leaves machine")
+    parser.add_argument('path', help='recorded traffic (.jsonl or .jsonl.gz)')
+    parser.add_argument('--exchange', choices=['binance', 'coinbasepro'],
+                        default='binance')
+    parser.add_argument('--weights', type=str, required=True,
+                        help='json, e.g. {"BTC": "0.5", "USDT": "0.5"}')
+    parser.add_argument('--rebalancer', choices=['market', 'limit'],
+                        default='market')
+    parser.add_argument('--timing', action='store_true',
+                        help='responses take as long as recorded')
+    args = parser.parse_args(*argument_array)
+    args.weights = {currency: Decimal(weight) for currency, weight
+                    in json.loads(args.weights).items()}
+    return args
+
+
+def main(args):
+    os.environ['EXCHANGE_REPLAY_PATH'] = args.path
+    os.environ['EXCHANGE_REPLAY_TIMING'] = '1' if args.timing else '0'
+    # credentials are not recorded, any will do
+    credentials = ['key', 'c2VjcmV0']
+    if args.exchange == 'coinbasepro':
+        credentials.append('passphrase')
+    exchange = get_exchange_by_name(args.exchange)(*credentials)
+    start = time.time()
+    if args.rebalancer == 'market':
+        responses = market_order_rebalance(exchange, args.weights,
+                                           lambda x: None)
+    else:
+        responses = limit_order_rebalance(exchange, args.weights, None,
+                                          lambda x: None, time_delta=0)
+    replayer = recording.get_transport_adapter().replayer
+    print('{} rebalance replayed: {:.3f}s, {} orders, {} unused responses'
+          .format(args.rebalancer, time.time() - start, len(responses),
+                  replayer.remaining()))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args)
@@ -2,12 +2,15 @@ import init_django  # noqa
 import os
 import time
 import celery
+from celery.exceptions import Ignore
 
-from rebalancer.limit_order_rebalancer import limit_order_rebalance
+from logger import logger
+from rebalancer.limit_order_rebalancer import plan_limit_orders, \
+    LimitOrderRebalance
 from rebalancer.market_order_rebalancer import market_order_rebalance_and_save
-from webserver.decorators import initialize_exchange
+from webserver.decorators import initialize_exchange, load_exchange
 from webserver.utils import get_portfolio
-from webserver.models import User
+from webserver.models import User, LimitRebalance
 
 
 app = celery.Celery('rebalance')
@@ -20,10 +23,67 @@ app.conf.update(broker_url=os.environ['REDIS_URL'],
 
 
 REBALANCING_ALGORITHM = {
-    'MARKET': market_order_rebalance_and_save,
-    'LIMIT': limit_order_rebalance
+    'MARKET': market_order_rebalance_and_save
 }
 
+# seconds between steps of limit rebalance, which check placed orders, every
+# step is task, so orders are polled coarsely
+LIMIT_STEP_POLL_INTERVAL = 10
+
+# step of limit rebalance, which failed with transient error, is retried
+# this many times after LIMIT_STEP_RETRY_DELAY seconds
+LIMIT_STEP_MAX_RETRIES = 5
+LIMIT_STEP_RETRY_DELAY = 5
+
+
+def get_error_result(api_key, orders):
+    """
+    :return: result of task for failed rebalance or None
+    """
+    if isinstance(orders, Exception):
+        return {'api_key': api_key,
+                'status': 'unknown error while rebalancing',
+                'error': True}
+    if isinstance(orders, list) and orders and isinstance(orders[0], str):
+        return {'api_key': api_key,
+                'status': 'error while rebalancing, '
+                'the following currencies does not exist: {}'.format(
+                    ', '.join(orders)),
+                'error': True}
+
+
+def get_step_poll_interval(exchange, products, time_delta):
+    """
+    :return: seconds between steps of limit rebalance, without live feed
+             steps don't see market moving away from orders, so orders are
+             checked only at the end of cycle
+    """
+    if exchange.get_top_of_book(products) is None:
+        return time_delta
+    return min(LIMIT_STEP_POLL_INTERVAL, time_delta)
+
+
+def get_update_function(task, task_id, api_key):
+    def update(time_estimate):
+        task.update_state(
+            task_id,
+            "STARTED",
+            {
+                "remaining_time_estimate": time_estimate,
+                "api_key": api_key
+            }
+        )
+    return update
+
+
+def get_result(exchange, params, api_key, start_time):
+    portfolio = get_portfolio(exchange)
+    delta_t = (time.time() - start_time) * 1000
+
+    return {params['name']: portfolio,
+            'api_key': api_key,
+            'status': "processing complete in {0:.0f}ms".format(delta_t)}
+
 
 @app.task(bind=True)
 def rebalance_task(self, request, api_key, weights, start_time):
@@ -32,37 +92,115 @@ def rebalance_task(self, request, api_key, weights, start_time):
     def rebalance(this, request, exchange, params):
 
         start_time = time.time()
-
-        def update(time_estimate):
-            nonlocal self, api_key
-            self.update_state(
-                None,
-                "STARTED",
-                {
-                    "remaining_time_estimate": time_estimate,
-                    "api_key": api_key
-                }
-            )
+        update = get_update_function(self, None, api_key)
         update(12000)
         user = User.objects.get(api_key=api_key)
-        orders = REBALANCING_ALGORITHM[params.get('type', 'market').upper()](
+        algorithm = params.get('type', 'market').upper()
+        if algorithm == 'LIMIT':
+            return start_limit_rebalance(self, request, exchange, user,
+                                         weights, start_time)
+        orders = REBALANCING_ALGORITHM[algorithm](
             exchange, weights, user, update)
-        if isinstance(orders, Exception):
-            return {'api_key': api_key,
-                    'status': 'unknown error while rebalancing',
-                    'error': True}
-        if isinstance(orders, list) and orders and isinstance(orders[0], str):
-            return {'api_key': api_key,
-                    'status': 'error while rebalancing, '
-                    'the following currencies does not exist: {}'.format(
-                        ', '.join(orders)),
-                    'error': True}
-
-        portfolio = get_portfolio(exchange)
-        delta_t = (time.time() - start_time) * 1000
-
-        return {params['name']: portfolio,
-                'api_key': api_key,
-                'status': "processing complete in {0:.0f}ms".format(delta_t)}
+        error = get_error_result(api_key, orders)
+        if error is not None:
+            return error
+
+        return get_result(exchange, params, api_key, start_time)
 
     return rebalance(self, request)
+
+
+def start_limit_rebalance(task, request, exchange, user, weights,
+                          start_time):
+    """
+    saves planned limit rebalance and schedules its first step, task
+    stays STARTED until the last step stores its result
+    :return: result of task, if rebalance can't be planned
+    """
+    plan = plan_limit_orders(exchange, weights)
+    error = get_error_result(user.api_key, plan)
+    if error is not None:
+        return error
+    products, resources, orders = plan
+    time_delta = 30
+    rebalance = LimitOrderRebalance(
+        exchange, resources, products, orders, max_retries=10,
+        time_delta=time_delta, base='USDT',
+        poll_interval=get_step_poll_interval(exchange, products, time_delta))
+    limit_rebalance = LimitRebalance.objects.create(
+        user=user, task_id=task.request.id, state=rebalance.to_dict())
+    limit_rebalance_step.apply_async(
+        (request, user.api_key, limit_rebalance.id, start_time))
+    raise Ignore()
+
+
+@app.task(bind=True, ignore_result=True)
+def limit_rebalance_step(self, request, api_key, limit_rebalance_id,
+                         start_time):
+    """
+    one short step of limit rebalance, which schedules the next step, so
+    worker isn't blocked while orders wait in orderbook
+    """
+    limit_rebalance = LimitRebalance.objects.get(id=limit_rebalance_id)
+    task_id = limit_rebalance.task_id
+
+    # credentials were checked, when rebalance was started
+    @load_exchange
+    def step(this, request, exchange, params):
+        rebalance = LimitOrderRebalance.from_dict(exchange,
+                                                  limit_rebalance.state)
+        # live feed of worker may have started or stopped since last step
+        rebalance.poll_interval = get_step_poll_interval(
+            exchange, rebalance.products, rebalance.time_delta)
+        try:
+            with rebalance.track_resources():
+                if limit_rebalance.status == LimitRebalance.CANCELED:
+                    rebalance.cancel()
+                    delay = None
+                else:
+                    delay = rebalance.step(
+                        get_update_function(self, task_id, api_key))
+                limit_rebalance.state = rebalance.to_dict()
+        except Exception as e:
+            # step is retried from saved state
+            if (exchange.is_transient_error(e) and
+                    self.request.retries < LIMIT_STEP_MAX_RETRIES):
+                logger.warning("limit rebalance step failed - {}".format(e))
+                raise self.retry(countdown=LIMIT_STEP_RETRY_DELAY)
+            fail_limit_rebalance(self, exchange, limit_rebalance, api_key, e)
+            return
+        if delay is not None:
+            # status is changed by views, when rebalance is reset
+            limit_rebalance.save(update_fields=['state', 'date_updated'])
+            limit_rebalance_step.apply_async(
+                (request, api_key, limit_rebalance_id, start_time),
+                countdown=delay)
+            return
+        limit_rebalance.status = LimitRebalance.FINISHED
+        limit_rebalance.save()
+        self.update_state(task_id, 'SUCCESS',
+                          get_result(exchange, params, api_key, start_time))
+
+    step(self, request)
+
+
+def fail_limit_rebalance(task, exchange, limit_rebalance, api_key, error):
+    """
+    cancels orders of saved state of failed limit rebalance and stores
+    error result of its task
+    """
+    logger.warning("limit rebalance failed - {}: {}".format(
+        type(error).__name__, error))
+    rebalance = LimitOrderRebalance.from_dict(exchange,
+                                              limit_rebalance.state)
+    try:
+        with rebalance.track_resources():
+            rebalance.cancel()
+            limit_rebalance.state = rebalance.to_dict()
+    except Exception as e:
+        logger.warning("orders of failed limit rebalance aren't "
+                       "canceled - {}".format(e))
+    limit_rebalance.status = LimitRebalance.FAILED
+    limit_rebalance.save()
+    task.update_state(limit_rebalance.task_id, 'SUCCESS',
+                      get_error_result(api_key, error))
@@ -0,0 +1,146 @@
+import hmac
+import asyncio
+import hashlib
+import unittest
+from decimal import Decimal
+from urllib.parse import urlencode
+from aiohttp import web
+
+from exchange.async_binance import AsyncBinance
+from exchange.binance import Binance
+from internals.order import Order
+from internals.enums import OrderType, OrderAction
+
+SECRET_KEY = 'secret'
+EXCHANGE_INFO = {'symbols': [{
+    'symbol': 'BTCUSDT', 'baseAsset': 'BTC', 'quoteAsset': 'USDT',
+    'filters': [
+        {'minPrice': '0.01', 'maxPrice': '1000000', 'tickSize': '0.01'},
+        {'minQty': '0.000001', 'maxQty': '10000', 'stepSize': '0.000001'},
+        {'minNotional': '10'}]}]}
+
+
+class FakeBinanceServer:
+    def __init__(self):
+        self.orders = []
+        self.app = web.Application()
+        self.app.router.add_get('/api/v1/exchangeInfo', self.exchange_info)
+        self.app.router.add_get('/api/v3/ticker/bookTicker', self.tickers)
+        self.app.router.add_get('/api/v3/account', self.account)
+        self.app.router.add_post('/api/v3/order', self.order)
+        self.app.router.add_delete('/api/v3/order', self.cancel)
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return 'http://127.0.0.1:{}'.format(port)
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def check_signature(self, request):
+        params = [(k, v) for k, v in request.query.items()
+                  if k != 'signature']
+        signature = hmac.new(SECRET_KEY.encode(), urlencode(params).encode(),
+                             hashlib.sha256).hexdigest()
+        assert request.query['signature'] == signature
+        assert request.headers['X-MBX-APIKEY'] == 'key'
+
+    async def exchange_info(self, request):
+        return web.json_response(EXCHANGE_INFO)
+
+    async def tickers(self, request):
+        await asyncio.sleep(0.1)
+        return web.json_response([
+            {'symbol': 'BTCUSDT', 'bidPrice': '9999', 'askPrice': '10001'},
+            {'symbol': 'ETHBTC', 'bidPrice': '0.1', 'askPrice': '0.2'}])
+
+    async def account(self, request):
+        self.check_signature(request)
+        return web.json_response({'balances': [
+            {'asset': 'BTC', 'free': '1'}, {'asset': 'USDT', 'free': '0'}]})
+
+    async def order(self, request):
+        self.check_signature(request)
+        self.orders.append(dict(request.query))
+        return web.json_response({
+            'symbol': 'BTCUSDT', 'orderId': 1, 'clientOrderId': 'a',
+            'executedQty': request.query['quantity'], 'side': 'SELL',
+            'fills': [{'qty': request.query['quantity'], 'price': '10000',
+                       'commission': '1', 'commissionAsset': 'USDT'}]})
+
+    async def cancel(self, request):
+        self.check_signature(request)
+        return web.json_response({'code': -2011,
+                                  'msg': 'Unknown order sent.'}, status=400)
+
+
+class AsyncBinanceTester(unittest.TestCase):
+    def setUp(self):
+        Binance.invalidate_filters()
+
+    def tearDown(self):
+        Binance.invalidate_filters()
+
+    def test_async_binance(self):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._test_async_binance(loop))
+        finally:
+            loop.close()
+
+    async def _test_async_binance(self, loop):
+        server = FakeBinanceServer()
+        url = await server.start()
+        try:
+            exchanges = []
+            for _ in range(3):
+                exchange = AsyncBinance('key', SECRET_KEY)
+                exchange.http.base_url = url
+                await exchange.load()
+                exchanges.append(exchange)
+            self.assertEqual(exchanges[0].filters['BTCUSDT']['min_notional'],
+                             Decimal('10'))
+
+            # calls of many accounts overlap
+            start = loop.time()
+            results = await asyncio.gather(*[
+                exchange.get_orderbooks(['BTC_USDT'])
+                for exchange in exchanges])
+            self.assertLess(loop.time() - start, 0.25)
+            for orderbooks in results:
+                self.assertEqual(len(orderbooks), 1)
+                self.assertEqual(orderbooks[0].get_mid_market_price(),
+                                 Decimal('10000'))
+
+            exchange = exchanges[0]
+            self.assertDictEqual(await exchange.get_resources(),
+                                 {'BTC': Decimal('1')})
+
+            # rejected by shared validation: not enough USDT
+            order = Order('BTC_USDT', OrderType.MARKET, OrderAction.BUY,
+                          Decimal('1'))
+            price_estimates = {'BTC': Decimal('10000'), 'USDT': Decimal('1')}
+            self.assertIsNone(await exchange.place_market_order(
+                order, price_estimates))
+            self.assertEqual(server.orders, [])
+
+            order = Order('BTC_USDT', OrderType.MARKET, OrderAction.SELL,
+                          Decimal('2'))
+            response = await exchange.place_market_order(order,
+                                                         price_estimates)
+            self.assertEqual(server.orders[0]['quantity'], '1.000000')
+            self.assertEqual(response['product'], 'BTC_USDT')
+            self.assertEqual(response['mean_price'], Decimal('10000'))
+            self.assertEqual(response['commission_USDT'], Decimal('1'))
+
+            # unknown order is not an error on cancel
+            self.assertDictEqual(await exchange.cancel_limit_order(
+                {'symbol': 'BTCUSDT', 'orderId': 1}), {})
+        finally:
+            for exchange in exchanges:
+                await exchange.close()
+            await server.stop()
@@ -123,6 +123,87 @@ class BinanceTester(unittest.TestCase):
         self.assertEqual(new_order._type, order._type)
         self.assertEqual(new_order._price, Decimal('150.01'))
 
+    def test_validate_orders(self):
+        class FakeMarket(Binance):
+            def __init__(self, filters, resources):
+                self.resources = resources
+                self.filters = filters
+                self.calls = 0
+
+            def get_resources(self):
+                self.calls += 1
+                return self.resources
+
+        filt = {
+            'min_order_size': Decimal('0.001'),
+            'max_order_size': Decimal('10000'),
+            'order_step': Decimal('1e-8'),
+            'min_notional': Decimal('10'),
+            'min_price': Decimal('1e-6'),
+            'max_price': Decimal('1e6'),
+            'price_step': Decimal('1e-6'),
+        }
+        filters = {
+            'BTCUSDT': dict(filt, base='USDT', commodity='BTC'),
+            'ETHBTC': dict(filt, base='BTC', commodity='ETH',
+                           min_notional=Decimal('0.001')),
+        }
+        resources = {'ETH': Decimal('10'), 'USDT': Decimal('100')}
+        price_estimates = {'BTC': Decimal('10000'), 'ETH': Decimal('1000'),
+                           'USDT': Decimal(1)}
+        fake_binance = FakeMarket(filters, resources)
+
+        orders = [
+            # BTC is bought with proceeds of this order
+            Order('ETH_BTC', OrderType.MARKET, OrderAction.SELL,
+                  Decimal('5'), None),
+            Order('BTC_USDT', OrderType.MARKET, OrderAction.SELL,
+                  Decimal('0.2'), None),
+            Order('BTC_USDT', OrderType.MARKET, OrderAction.SELL,
+                  Decimal('0.0001'), None),
+            Order('LTC_USDT', OrderType.MARKET, OrderAction.SELL,
+                  Decimal('1'), None),
+            Order('ETH_BTC', OrderType.MARKET, OrderAction.SELL,
+                  Decimal('10'), None),
+            Order('ETH_BTC', OrderType.MARKET, OrderAction.SELL,
+                  Decimal('1'), None),
+        ]
+        results = fake_binance.validate_orders(orders, price_estimates)
+        self.assertEqual(fake_binance.calls, 1)
+        self.assertEqual([reason for _, reason in results], [
+            None, None, 'min_order_size', 'unknown_product', None,
+            'insufficient_resources'])
+        self.assertEqual(results[0][0]._quantity, Decimal('5'))
+        self.assertEqual(results[1][0]._quantity, Decimal('0.2'))
+        self.assertEqual(results[4][0]._quantity, Decimal('5'))
+        self.assertIsNone(results[5][0])
+
+    def test_get_orderbooks_of_depth(self):
+        class FakeClient:
+            def __init__(self):
+                self.calls = []
+
+            def get_order_book(self, symbol, limit):
+                self.calls.append((symbol, limit))
+                return {'bids': [[str(100 - i), '1'] for i in range(limit)],
+                        'asks': [[str(101 + i), '1'] for i in range(limit)]}
+
+        class FakeMarket(Binance):
+            def __init__(self):
+                self.client = FakeClient()
+                self.filters = {'BTCUSDT': {}, 'ETHBTC': {}}
+
+        exchange = FakeMarket()
+        orderbooks = exchange.get_orderbooks(
+            ['BTC_USDT', 'ETH_BTC', 'USDT_BTC'], depth=7)
+        self.assertEqual(sorted(exchange.client.calls),
+                         [('BTCUSDT', 10), ('ETHBTC', 10)])
+        self.assertEqual(len(orderbooks), 2)
+        for orderbook in orderbooks:
+            self.assertEqual(orderbook.get_depth(), 7)
+            self.assertEqual(orderbook.get_wall_bid(), Decimal('100'))
+            self.assertEqual(orderbook.get_wall_ask(), Decimal('101'))
+
     def test_parse_params(self):
         correct_params = {
             'symbol': 'BTCUSDT',
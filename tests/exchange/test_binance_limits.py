@@ -0,0 +1,84 @@
+import unittest
+from binance.exceptions import BinanceAPIException
+from exchange.binance_limits import RateLimitedClient, \
+    get_order_book_weight, get_open_orders_queries
+
+
+class FakeLimiter:
+    def __init__(self):
+        self.weights = []
+
+    def acquire(self, weight=1):
+        self.weights.append(weight)
+
+
+class FakeResponse:
+    headers = {'Retry-After': '0'}
+
+
+def rate_limit_error():
+    # constructor differs between versions of python-binance
+    error = BinanceAPIException.__new__(BinanceAPIException)
+    error.status_code, error.code = 429, -1003
+    error.message, error.response = 'Too many requests', FakeResponse()
+    return error
+
+
+class FakeClient:
+    ORDER_TYPE_LIMIT_MAKER = 'LIMIT_MAKER'
+
+    def __init__(self):
+        self.rate_limited = 0
+
+    def get_account(self):
+        return {'balances': []}
+
+    def get_order_book(self, **params):
+        return params
+
+    def get_open_orders(self, **params):
+        return []
+
+    def order_market(self, **params):
+        if self.rate_limited:
+            self.rate_limited -= 1
+            raise rate_limit_error()
+        return params
+
+
+class RateLimitedClientTester(unittest.TestCase):
+    def setUp(self):
+        self.weight_limiter = FakeLimiter()
+        self.order_limiter = FakeLimiter()
+        self.client = RateLimitedClient(FakeClient(),
+                                        weight_limiter=self.weight_limiter,
+                                        order_limiter=self.order_limiter)
+
+    def test_weights(self):
+        self.assertEqual(self.client.ORDER_TYPE_LIMIT_MAKER, 'LIMIT_MAKER')
+        self.client.get_account()
+        self.client.get_order_book(symbol='BTCUSDT', limit=500)
+        self.client.get_open_orders(symbol='BTCUSDT')
+        self.client.get_open_orders()
+        self.assertListEqual(self.weight_limiter.weights, [5, 5, 1, 40])
+        self.assertListEqual(self.order_limiter.weights, [])
+        self.assertEqual(get_order_book_weight(5), 1)
+        self.assertEqual(get_order_book_weight(5000), 50)
+
+    def test_open_orders_queries(self):
+        self.assertListEqual(get_open_orders_queries(['ETHBTC', 'BTCUSDT',
+                                                      'ETHBTC']),
+                             ['BTCUSDT', 'ETHBTC'])
+        symbols = ['X{:03}USDT'.format(i) for i in range(40)]
+        self.assertListEqual(get_open_orders_queries(symbols), [None])
+
+    def test_retry(self):
+        self.client.client.rate_limited = 2
+        self.assertDictEqual(self.client.order_market(symbol='BTCUSDT'),
+                             {'symbol': 'BTCUSDT'})
+        self.assertListEqual(self.weight_limiter.weights, [1] * 3)
+        self.assertListEqual(self.order_limiter.weights, [1] * 3)
+
+        self.client.client.rate_limited = 10
+        with self.assertRaises(BinanceAPIException):
+            self.client.order_market(symbol='BTCUSDT')
@@ -0,0 +1,92 @@
+import time
+import unittest
+from decimal import Decimal
+from exchange.binance import Binance
+from exchange.book_ticker import BookTickerCache, BookTickerFeed
+from exchange.standin.book_ticker_server import BookTickerServer
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = 0
+
+    def get_orderbook_tickers(self):
+        self.calls += 1
+        return [{'symbol': 'BTCUSDT', 'bidPrice': '1', 'askPrice': '2'},
+                {'symbol': 'ETHBTC', 'bidPrice': '1', 'askPrice': '2'}]
+
+
+class FakeMarket(Binance):
+    def __init__(self, book_ticker):
+        self.client = FakeClient()
+        self.filters = {'BTCUSDT': {}, 'ETHBTC': {}}
+        self.book_ticker = book_ticker
+
+
+class BookTickerTester(unittest.TestCase):
+    def setUp(self):
+        self.server = BookTickerServer().start()
+        self.feed = BookTickerFeed(self.server.url, reconnect_delay=0.01)
+        self.feed.start()
+        self.assertTrue(self.server.wait_for_clients())
+
+    def tearDown(self):
+        self.feed.stop()
+        self.server.stop()
+
+    def test_cache(self):
+        cache = BookTickerCache()
+        cache.update('BTCUSDT', Decimal('9999'), Decimal('10001'), 1)
+        self.assertIn('BTCUSDT', cache)
+        self.assertEqual(cache.get('BTCUSDT'),
+                         (Decimal('9999'), Decimal('10001'), 1))
+        [orderbook] = cache.get_orderbooks(['BTC_USDT', 'ETH_BTC'])
+        self.assertEqual(orderbook.product, 'BTC_USDT')
+        self.assertEqual(orderbook.get_mid_market_price(), Decimal('10000'))
+        self.assertEqual(orderbook.timestamp, 1)
+        self.assertGreater(orderbook.get_age(), 0)
+
+    def test_feed(self):
+        self.server.publish('BTCUSDT', Decimal('9999'), Decimal('10001'))
+        self.assertTrue(wait_for(lambda: 'BTCUSDT' in self.feed.cache))
+        self.assertTrue(self.feed.is_alive(1))
+
+        exchange = FakeMarket(self.feed)
+        # ETHBTC is not in cache yet, so orderbooks are downloaded
+        orderbooks = exchange.get_orderbooks(['BTC_USDT', 'ETH_BTC'])
+        self.assertEqual(exchange.client.calls, 1)
+        self.assertEqual(len(orderbooks), 2)
+
+        self.server.publish('ETHBTC', Decimal('0.1'), Decimal('0.2'))
+        self.assertTrue(wait_for(lambda: 'ETHBTC' in self.feed.cache))
+        orderbooks = exchange.get_orderbooks(
+            ['BTC_USDT', 'ETH_BTC', 'LTC_BTC'])
+        self.assertEqual(exchange.client.calls, 1)
+        orderbooks = {ob.product: ob for ob in orderbooks}
+        self.assertEqual(orderbooks['BTC_USDT'].get_wall_ask(),
+                         Decimal('10001'))
+        self.assertEqual(orderbooks['ETH_BTC'].get_wall_bid(),
+                         Decimal('0.1'))
+        self.assertLess(orderbooks['ETH_BTC'].get_age(), 1)
+
+        # stale feed
+        self.assertFalse(self.feed.is_alive(-1))
+
+    def test_reconnect(self):
+        self.server.publish('ETHBTC', Decimal('0.1'), Decimal('0.2'))
+        self.assertTrue(wait_for(lambda: 'ETHBTC' in self.feed.cache))
+        self.server.disconnect_clients()
+        self.assertTrue(wait_for(lambda: not self.feed.connected.is_set()))
+        self.assertTrue(self.server.wait_for_clients())
+        self.server.publish('BTCUSDT', Decimal('1'), Decimal('2'))
+        self.assertTrue(wait_for(lambda: 'BTCUSDT' in self.feed.cache))
+        # quote from before the disconnect isn't served as fresh
+        self.assertNotIn('ETHBTC', self.feed.cache)
+        self.assertTrue(self.feed.is_alive(1))
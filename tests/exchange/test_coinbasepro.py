@@ -1,7 +1,9 @@
+import time
 import unittest
 from decimal import Decimal
 from internals.order import Order
 from internals.enums import OrderType, OrderAction
+from internals.rate_limiter import TokenBucket
 from exchange.coinbasepro import CoinbasePro
 
 
@@ -138,6 +140,26 @@ class CoinbaseProTester(unittest.TestCase):
         order = exchange._validate_order(order)
         self.assertOrderEqual(order, correct_order)
 
+    def test_get_orderbooks(self):
+        client = FakeClient(delay=0.1)
+        exchange = FakeExchange(
+            client=client, filters={'BTC-USD': {}, 'ETH-BTC': {}},
+            public_rate_limiter=TokenBucket(rate=100, capacity=10))
+        start = time.time()
+        orderbooks = exchange.get_orderbooks(
+            ['BTC_USD', 'ETH_BTC', 'USD_BTC', 'BTC_ETH'])
+        # calls are concurrent and only for existing products
+        self.assertLess(time.time() - start, 0.19)
+        self.assertListEqual(sorted(client.calls),
+                             [('BTC-USD', 1), ('ETH-BTC', 1)])
+        self.assertListEqual([ob.product for ob in orderbooks],
+                             ['BTC_USD', 'ETH_BTC'])
+        self.assertEqual(orderbooks[0].get_wall_ask(), Decimal('2'))
+
+        orderbooks = exchange.get_orderbooks(['BTC_USD'], depth=2)
+        self.assertEqual(client.calls[-1], ('BTC-USD', 2))
+        self.assertEqual(orderbooks[0].get_depth(), 2)
+
     def assertOrderEqual(self, o1, o2):
         self.assertEqual(o1.product, o2.product)
         self.assertEqual(o1._type, o2._type)
@@ -164,3 +186,15 @@ class FakeExchange(CoinbasePro):
 
     def get_taker_fee(self, product):
         return Decimal('0.003')
+
+
+class FakeClient:
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+
+    def get_product_order_book(self, symbol, level=1):
+        self.calls.append((symbol, level))
+        time.sleep(self.delay)
+        return {'bids': [['1', '1', 1], ['0.5', '1', 1]],
+                'asks': [['2', '1', 1], ['3', '1', 1]]}
@@ -1,5 +1,101 @@
 import unittest
+import threading
+from decimal import Decimal
+from exchange.exchange import Exchange, snapshot_cached, \
+    invalidates_snapshot
+
+
+class CountingExchange(Exchange):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    @snapshot_cached
+    def get_resources(self):
+        self.calls += 1
+        return {'BTC': Decimal(self.calls)}
+
+    @snapshot_cached
+    def get_orderbooks(self, products=None, depth: int=1):
+        self.calls += 1
+        return [product for product in (products or [])]
+
+    @invalidates_snapshot
+    def place_market_order(self, order, price_estimates=None):
+        return order
 
 
 class ExchangeTester(unittest.TestCase):
-    pass
+    def test_without_snapshot(self):
+        exchange = CountingExchange()
+        exchange.get_resources()
+        exchange.get_resources()
+        self.assertEqual(exchange.calls, 2)
+
+    def test_snapshot(self):
+        exchange = CountingExchange()
+        with exchange.snapshot():
+            self.assertEqual(exchange.get_resources(), {'BTC': Decimal(1)})
+            resources = exchange.get_resources()
+            self.assertEqual(resources, {'BTC': Decimal(1)})
+            resources['BTC'] = Decimal(10)
+            self.assertEqual(exchange.get_resources(), {'BTC': Decimal(1)})
+            self.assertEqual(exchange.calls, 1)
+
+            exchange.get_orderbooks(['BTC_USDT'])
+            exchange.get_orderbooks(['BTC_USDT'])
+            exchange.get_orderbooks(['ETH_USDT'])
+            self.assertEqual(exchange.calls, 3)
+
+            with exchange.snapshot():
+                exchange.get_resources()
+            exchange.get_resources()
+            self.assertEqual(exchange.calls, 3)
+
+            exchange.place_market_order(None)
+            self.assertEqual(exchange.get_resources(), {'BTC': Decimal(4)})
+            self.assertEqual(exchange.calls, 4)
+
+        exchange.get_resources()
+        self.assertEqual(exchange.calls, 5)
+
+    def test_snapshot_is_thread_local(self):
+        exchange = CountingExchange()
+        with exchange.snapshot():
+            exchange.get_resources()
+            thread = threading.Thread(target=exchange.get_resources)
+            thread.start()
+            thread.join()
+            exchange.get_resources()
+        self.assertEqual(exchange.calls, 2)
+
+    def test_track_resources(self):
+        exchange = CountingExchange()
+        self.assertIsNone(exchange.ledger)
+        with exchange.track_resources({'BTC': Decimal(1)}) as ledger:
+            self.assertIs(exchange.ledger, ledger)
+            self.assertEqual(exchange.get_available_resources(),
+                             {'BTC': Decimal(1)})
+            with exchange.track_resources({'BTC': Decimal(2)}) as inner:
+                self.assertIs(exchange.ledger, inner)
+            self.assertIs(exchange.ledger, ledger)
+
+            # other thread has its own ledger or shares it explicitly
+            ledgers = []
+
+            def track():
+                ledgers.append(exchange.ledger)
+                with exchange.track_resources(ledger=ledger):
+                    ledgers.append(exchange.ledger)
+                with exchange.track_resources():
+                    ledgers.append(exchange.ledger)
+
+            thread = threading.Thread(target=track)
+            thread.start()
+            thread.join()
+            self.assertIsNone(ledgers[0])
+            self.assertIs(ledgers[1], ledger)
+            self.assertIsNot(ledgers[2], ledger)
+            self.assertIs(exchange.ledger, ledger)
+        self.assertIsNone(exchange.ledger)
+        self.assertEqual(exchange.calls, 1)
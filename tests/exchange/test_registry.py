@@ -0,0 +1,52 @@
+import unittest
+from exchange.exchange import Exchange
+from exchange.registry import ExchangeRegistry
+
+
+class FakeExchange(Exchange):
+    def __init__(self, api_key, secret_key):
+        super().__init__()
+        self.api_key = api_key
+        self.secret_key = secret_key
+
+
+class ExchangeRegistryTester(unittest.TestCase):
+    def test_get(self):
+        registry = ExchangeRegistry()
+        exchange1 = registry.get(FakeExchange, 'key1', 'secret1')
+        exchange2 = registry.get(FakeExchange, 'key2', 'secret2')
+        self.assertIsNot(exchange1, exchange2)
+        self.assertIs(registry.get(FakeExchange, 'key1', 'secret1'),
+                      exchange1)
+        self.assertIsNot(registry.get(FakeExchange, 'key1', 'secret2'),
+                         exchange1)
+        self.assertEqual(len(registry), 3)
+
+        registry.evict(FakeExchange, 'key1', 'secret1')
+        self.assertIsNot(registry.get(FakeExchange, 'key1', 'secret1'),
+                         exchange1)
+
+    def test_key(self):
+        key = ExchangeRegistry.key(FakeExchange, 'key', 'secret')
+        self.assertEqual(len(key), 64)
+        self.assertNotIn('secret', key)
+        self.assertNotEqual(key, ExchangeRegistry.key(
+            FakeExchange, 'keys', 'ecret'))
+
+    def test_lru(self):
+        registry = ExchangeRegistry(max_size=2)
+        exchange1 = registry.get(FakeExchange, 'key1', 'secret')
+        registry.get(FakeExchange, 'key2', 'secret')
+        registry.get(FakeExchange, 'key1', 'secret')
+        registry.get(FakeExchange, 'key3', 'secret')
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.get(FakeExchange, 'key1', 'secret'),
+                      exchange1)
+
+    def test_idle_timeout(self):
+        registry = ExchangeRegistry(idle_timeout=60)
+        exchange = registry.get(FakeExchange, 'key', 'secret')
+        key = ExchangeRegistry.key(FakeExchange, 'key', 'secret')
+        registry._clients[key] = (exchange, 0)
+        self.assertIsNot(registry.get(FakeExchange, 'key', 'secret'),
+                         exchange)
@@ -0,0 +1,141 @@
+import base64
+import asyncio
+import unittest
+from decimal import Decimal
+from binance.exceptions import BinanceAPIException
+
+from internals.order import Order
+from internals.enums import OrderType, OrderAction
+from internals.async_http import AsyncAPIError
+from exchange.binance import Binance
+from exchange.coinbasepro import CoinbasePro
+from exchange.async_coinbasepro import AsyncCoinbasePro
+from exchange.simulated import SimulatedMarket
+from exchange.standin.rest_server import RestStandinServer
+
+SECRET_KEY = base64.b64encode(b'secret').decode()
+
+
+class RestStandinServerTester(unittest.TestCase):
+    def setUp(self):
+        Binance.invalidate_filters()
+        self.market = SimulatedMarket({'BTC': Decimal('10000'),
+                                       'ETH': Decimal('100')},
+                                      depth=5, limit_fill_probability=0)
+        self.server = RestStandinServer(
+            self.market, {'USDT': Decimal('10000')}, retry_after=0).start()
+        self.price_estimates = {'BTC': Decimal('10000'),
+                                'ETH': Decimal('100'), 'USDT': Decimal('1')}
+
+    def tearDown(self):
+        self.server.stop()
+        Binance.invalidate_filters()
+
+    def test_binance(self):
+        exchange = Binance('key', 'secret', api_url=self.server.url)
+        self.assertIn('ETHBTC', exchange.filters)
+        orderbooks = exchange.get_orderbooks(['BTC_USDT', 'USDT_BTC'])
+        self.assertEqual([ob.product for ob in orderbooks], ['BTC_USDT'])
+        [orderbook] = exchange.get_orderbooks(['BTC_USDT'], depth=5)
+        self.assertEqual(orderbook.get_depth(), 5)
+        self.assertDictEqual(exchange.get_resources(),
+                             {'USDT': Decimal('10000')})
+
+        order = Order('BTC_USDT', OrderType.MARKET, OrderAction.BUY,
+                      Decimal('0.1'))
+        response = exchange.place_market_order(order, self.price_estimates)
+        self.assertEqual(response['executed_quantity'], Decimal('0.1'))
+        self.assertEqual(exchange.get_resources()['BTC'],
+                         Decimal('0.0999'))
+
+        order = Order('BTC_USDT', OrderType.LIMIT, OrderAction.SELL,
+                      Decimal('0.05'), Decimal('11000'))
+        response = exchange.place_limit_order(order)
+        order = exchange.get_order(response)
+        self.assertEqual(order['status'], 'NEW')
+        exchange.cancel_limit_order(response)
+        self.assertEqual(exchange.get_order(response)['status'], 'CANCELED')
+        # already canceled order
+        self.assertDictEqual(exchange.cancel_limit_order(response), {})
+
+    def test_filters_of_api(self):
+        # filters of other api don't replace filters of this one
+        market = SimulatedMarket({'BTC': Decimal('10000')}, depth=5)
+        server = RestStandinServer(market).start()
+        try:
+            exchange = Binance('key', 'secret', api_url=server.url)
+            self.assertNotIn('ETHBTC', exchange.filters)
+        finally:
+            server.stop()
+        exchange = Binance('key', 'secret', api_url=self.server.url)
+        self.assertIn('ETHBTC', exchange.filters)
+
+    def test_invalidate_filters(self):
+        # long-lived client sees filters fetched after invalidation
+        exchange = Binance('key', 'secret', api_url=self.server.url)
+        self.assertIn('ETHBTC', exchange.filters)
+        del self.market.filters['ETHBTC']
+        self.assertIn('ETHBTC', exchange.filters)
+        Binance.invalidate_filters()
+        self.assertNotIn('ETHBTC', exchange.filters)
+
+    def test_binance_faults(self):
+        exchange = Binance('key', 'secret', api_url=self.server.url)
+        # 429 responses are retried by client
+        self.server.rate_limit_rate = 0.5
+        for _ in range(5):
+            exchange.get_resources()
+        self.assertGreater(self.server.stats[('binance', 429)], 0)
+
+        self.server.rate_limit_rate = 0
+        self.server.error_rate = 1
+        order = Order('BTC_USDT', OrderType.MARKET, OrderAction.BUY,
+                      Decimal('0.1'))
+        exchange.get_available_resources = lambda: {'USDT': Decimal('1e4')}
+        error = exchange.place_market_order(order, self.price_estimates)
+        self.assertIsInstance(error, BinanceAPIException)
+        self.assertTrue(exchange.is_transient_error(error))
+
+    def test_coinbasepro(self):
+        exchange = CoinbasePro('key', SECRET_KEY, 'passphrase',
+                               api_url=self.server.url)
+        self.assertEqual(exchange.filters['ETH-BTC']['base'], 'BTC')
+        [orderbook] = exchange.get_orderbooks(['BTC_USDT', 'USDT_BTC'])
+        self.assertEqual(orderbook.get_wall_bid(), Decimal('9995'))
+        self.assertEqual(exchange.get_resources()['USDT'], Decimal('10000'))
+
+        order = Order('BTC_USDT', OrderType.MARKET, OrderAction.BUY,
+                      Decimal('0.1'))
+        response = exchange.place_market_order(order, self.price_estimates)
+        self.assertEqual(response['executed_quantity'], Decimal('0.1'))
+        self.assertEqual(response['commission_USDT'],
+                         response['mean_price'] * Decimal('0.0001'))
+        self.assertEqual(exchange.get_resources()['BTC'], Decimal('0.1'))
+
+        order = Order('BTC_USDT', OrderType.LIMIT, OrderAction.SELL,
+                      Decimal('0.05'), Decimal('11000'))
+        response = exchange.place_limit_order(order)
+        order = exchange.get_order(response)
+        self.assertEqual(order['status'], 'open')
+        self.assertEqual(order['executed_quantity'], Decimal('0'))
+        exchange.cancel_limit_order(response)
+        self.assertEqual(exchange.get_order(response)['status'], 'done')
+
+    def test_async_coinbasepro_rejected_order(self):
+        async def run():
+            exchange = AsyncCoinbasePro('key', SECRET_KEY, 'passphrase')
+            exchange.http.base_url = self.server.url
+            async with exchange:
+                await exchange.load()
+                # post only order, which would take liquidity
+                order = Order('BTC_USDT', OrderType.LIMIT, OrderAction.BUY,
+                              Decimal('0.01'), Decimal('20000'))
+                return await exchange.place_limit_order(order)
+
+        loop = asyncio.new_event_loop()
+        try:
+            error = loop.run_until_complete(run())
+        finally:
+            loop.close()
+        self.assertIsInstance(error, AsyncAPIError)
+        self.assertEqual(self.market.open_orders, set())
@@ -0,0 +1,123 @@
+import init_django  # noqa
+import unittest
+from decimal import Decimal
+from internals.order import Order
+from internals.enums import OrderType, OrderAction
+from exchange.simulated import SimulatedMarket, SimulatedExchange, \
+    SimulatedAPIException
+from exchange.binance_limits import REQUEST_WEIGHT_LIMITER
+from rebalancer.market_order_rebalancer import market_order_rebalance
+from rebalancer.utils import get_weights_from_resources, \
+    get_price_estimates_from_orderbooks
+
+
+class SimulatedExchangeTester(unittest.TestCase):
+    def setUp(self):
+        self.market = SimulatedMarket(
+            {'BTC': Decimal('10000'), 'ETH': Decimal('100'),
+             'BNB': Decimal('10')}, depth=3, level_notional=Decimal('1000'),
+            limit_fill_probability=1)
+        self.exchange = SimulatedExchange(self.market,
+                                          {'USDT': Decimal('10000')})
+
+    def test_market(self):
+        self.assertSetEqual(set(self.market.filters), {
+            'BTCUSDT', 'ETHUSDT', 'ETHBTC', 'BNBUSDT', 'BNBBTC', 'BNBETH'})
+        self.assertEqual(self.exchange.filters['BTCUSDT']['order_step'],
+                         Decimal('1e-6'))
+        [orderbook] = self.exchange.get_orderbooks(['BTC_USDT'])
+        self.assertEqual(orderbook.get_wall_bid(), Decimal('9995'))
+        self.assertEqual(orderbook.get_wall_ask(), Decimal('10005'))
+
+    def test_market_order(self):
+        price_estimates = {'BTC': Decimal('10000'), 'USDT': Decimal('1')}
+        asks = [list(level) for level in
+                self.market.books['BTCUSDT']['asks']]
+        # more, than first level of orderbook
+        quantity = asks[0][1] + Decimal('0.01')
+        order = Order('BTC_USDT', OrderType.MARKET, OrderAction.BUY,
+                      quantity)
+        response = self.exchange.place_market_order(order, price_estimates)
+        self.assertEqual(response['executed_quantity'], quantity)
+        self.assertEqual(response['mean_price'], (
+            asks[0][0] * asks[0][1] + asks[1][0] * Decimal('0.01')) /
+            quantity)
+        self.assertEqual(response['commission_BTC'],
+                         quantity * Decimal('0.001'))
+        resources = self.exchange.get_resources()
+        self.assertEqual(resources['BTC'], quantity * Decimal('0.999'))
+        self.assertEqual(resources['USDT'], Decimal('10000') -
+                         response['mean_price'] * quantity)
+        self.assertListEqual(self.market.books['BTCUSDT']['asks'][0],
+                             [asks[1][0], asks[1][1] - Decimal('0.01')])
+
+        # more, than whole orderbook is partially filled
+        self.exchange.client.free['BTC'] = Decimal('10')
+        response = self.exchange.client.order_market(
+            side='SELL', symbol='BTCUSDT', quantity=Decimal('5'))
+        self.assertEqual(response['status'], 'EXPIRED')
+        self.assertLess(Decimal(response['executedQty']), Decimal('5'))
+        self.assertEqual(self.market.books['BTCUSDT']['bids'], [])
+
+        with self.assertRaises(SimulatedAPIException):
+            self.exchange.client.order_market(
+                side='SELL', symbol='BTCUSDT', quantity=Decimal('100'))
+
+    def test_limit_order(self):
+        # crossing orderbook
+        order = Order('BTC_USDT', OrderType.LIMIT, OrderAction.BUY,
+                      Decimal('0.1'), Decimal('10010'))
+        response = self.exchange.place_limit_order(order)
+        self.assertIsInstance(response, SimulatedAPIException)
+
+        order = Order('BTC_USDT', OrderType.LIMIT, OrderAction.BUY,
+                      Decimal('0.1'), Decimal('10000'))
+        response = self.exchange.place_limit_order(order)
+        # every call fills half of remaining quantity
+        self.assertEqual(self.exchange.get_resources()['USDT'],
+                         Decimal('9000'))
+        [order] = self.exchange.get_open_orders([response])
+        self.assertEqual(Decimal(order['executed_quantity']),
+                         Decimal('0.075'))
+        # cancel response has final quantities
+        order = self.exchange.cancel_limit_order(response)
+        self.assertEqual(order['status'], 'CANCELED')
+        self.assertEqual(Decimal(order['executed_quantity']),
+                         Decimal('0.0875'))
+        self.assertEqual(self.exchange.get_open_orders([response]), [None])
+        resources = self.exchange.get_resources()
+        self.assertEqual(resources['USDT'], Decimal('9125'))
+        self.assertEqual(resources['BTC'],
+                         Decimal('0.0875') * Decimal('0.999'))
+        # canceled order is unknown for binance
+        self.assertEqual(self.exchange.cancel_limit_order(response), {})
+
+        # open orders of two symbols are queried symbol by symbol
+        responses = [self.exchange.place_limit_order(Order(
+            product, OrderType.LIMIT, OrderAction.BUY, quantity, price))
+            for product, quantity, price in [
+                ('BTC_USDT', Decimal('0.01'), Decimal('10000')),
+                ('ETH_USDT', Decimal('1'), Decimal('99'))]]
+        queries = []
+        get_open_orders = self.exchange.client.get_open_orders
+        self.exchange.client.get_open_orders = lambda **params: (
+            queries.append(params) or get_open_orders(**params))
+        self.assertEqual(len(self.exchange.get_open_orders(responses)), 2)
+        self.assertListEqual(queries, [{'symbol': 'BTCUSDT'},
+                                       {'symbol': 'ETHUSDT'}])
+        self.assertAlmostEqual(self.exchange.get_poll_interval(
+            responses, 0.5), 2 / (REQUEST_WEIGHT_LIMITER.rate * 0.5))
+
+    def test_market_order_rebalance(self):
+        market = SimulatedMarket.random_market(10, seed=1)
+        exchange = SimulatedExchange(market, {'USDT': Decimal('100000')})
+        weights = {currency: Decimal(1) / len(market.prices)
+                   for currency in market.prices}
+        market_order_rebalance(exchange, weights, lambda x: None)
+        price_estimates = get_price_estimates_from_orderbooks(
+            exchange.get_orderbooks(), 'USDT')
+        reached_weights = get_weights_from_resources(
+            exchange.get_resources(), price_estimates)
+        for currency, weight in weights.items():
+            self.assertAlmostEqual(reached_weights[currency], weight,
+                                   places=2)
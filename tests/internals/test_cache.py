@@ -0,0 +1,87 @@
+import time
+import unittest
+from decimal import Decimal
+from internals.cache import TTLCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.storage = {}
+
+    def get(self, key):
+        return self.storage.get(key)
+
+    def setex(self, key, ttl, value):
+        self.storage[key] = value
+
+    def delete(self, key):
+        self.storage.pop(key, None)
+
+
+class TTLCacheTester(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        return {'BTCUSDT': {'order_step': '1e-8', 'calls': self.calls}}
+
+    def create_cache(self, redis=None, **kwargs):
+        cache = TTLCache('test', **kwargs)
+        cache._redis = redis if redis is not None else FakeRedis()
+        return cache
+
+    def test_memory(self):
+        cache = self.create_cache(ttl=100)
+        self.assertEqual(cache.get(self.fetch)['BTCUSDT']['calls'], 1)
+        self.assertEqual(cache.get(self.fetch)['BTCUSDT']['calls'], 1)
+        self.assertEqual(self.calls, 1)
+
+        cache.invalidate()
+        self.assertEqual(cache.get(self.fetch)['BTCUSDT']['calls'], 2)
+        self.assertEqual(self.calls, 2)
+
+    def test_expired(self):
+        cache = self.create_cache(ttl=100)
+        cache.redis_url, cache._redis = None, None
+        cache.get(self.fetch)
+        cache._timestamp -= 101
+        self.assertEqual(cache.get(self.fetch)['BTCUSDT']['calls'], 2)
+
+    def test_peek(self):
+        redis = FakeRedis()
+        cache1 = self.create_cache(redis)
+        cache2 = self.create_cache(redis)
+        self.assertIsNone(cache1.peek())
+        cache1.get(self.fetch)
+        self.assertEqual(cache2.peek()['BTCUSDT']['calls'], 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_shared_between_processes(self):
+        redis = FakeRedis()
+        parse = (lambda value: {k: Decimal(v['order_step'])
+                                for k, v in value.items()})
+        cache1 = self.create_cache(redis, parse=parse)
+        cache2 = self.create_cache(redis, parse=parse)
+        self.assertEqual(cache1.get(self.fetch),
+                         {'BTCUSDT': Decimal('1e-8')})
+        self.assertEqual(cache2.get(self.fetch),
+                         {'BTCUSDT': Decimal('1e-8')})
+        self.assertEqual(self.calls, 1)
+
+        cache1.invalidate()
+        cache3 = self.create_cache(redis, parse=parse)
+        cache3.get(self.fetch)
+        self.assertEqual(self.calls, 2)
+
+    def test_background_refresh(self):
+        cache = self.create_cache(ttl=100, refresh_after=10)
+        cache.get(self.fetch)
+        cache._timestamp -= 11
+        # stale value is returned, while fresh value is fetched
+        self.assertEqual(cache.get(self.fetch)['BTCUSDT']['calls'], 1)
+        for _ in range(100):
+            if not cache._refreshing:
+                break
+            time.sleep(0.01)
+        self.assertEqual(cache.get(self.fetch)['BTCUSDT']['calls'], 2)
@@ -0,0 +1,45 @@
+import random
+import unittest
+import numpy as np
+from decimal import Decimal
+
+from internals.utils import Quantizer
+from internals.fixed_point import get_scale, to_units, from_units, \
+    to_units_array, add_fixed_filters
+
+
+class FixedPointTester(unittest.TestCase):
+    def test_scale(self):
+        self.assertEqual(get_scale(Decimal('0.00100000')), 3)
+        self.assertEqual(get_scale(Decimal('0.005')), 3)
+        self.assertEqual(get_scale(Decimal('1.00000000')), 0)
+        self.assertEqual(get_scale(Decimal('1E+1')), -1)
+
+    def test_same_as_quantizer(self):
+        generator = random.Random(0)
+        steps = ['1e-8', '0.00100000', '0.01', '1', '1E+1', '0.05']
+        for _ in range(2000):
+            x = Decimal(generator.uniform(0, 1000)) / Decimal(
+                generator.uniform(0.001, 100))
+            step = Decimal(generator.choice(steps))
+            scale = get_scale(step)
+            for down in [True, False]:
+                quantized = from_units(to_units(x, scale, down), scale)
+                expected = Quantizer(step)(x, down)
+                self.assertEqual(str(quantized), str(expected))
+
+    def test_filters(self):
+        filt = add_fixed_filters({'order_step': Decimal('0.001'),
+                                  'min_order_size': Decimal('0.0105')})
+        self.assertEqual(filt['order_scale'], 3)
+        for quantity in ['0.010', '0.011', '0.0105']:
+            self.assertEqual(
+                to_units(Decimal(quantity), 3) < filt['min_order_units'],
+                Quantizer(Decimal('0.001'))(Decimal(quantity)) <
+                filt['min_order_size'])
+        self.assertIs(add_fixed_filters(filt), filt)
+
+    def test_units_array(self):
+        np.testing.assert_array_equal(
+            to_units_array([0.123456789, -0.5, 2], 8),
+            [12345678, -50000000, 200000000])
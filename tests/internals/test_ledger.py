@@ -0,0 +1,99 @@
+import json
+import unittest
+from decimal import Decimal
+from internals.ledger import BalanceLedger
+
+
+class BalanceLedgerTester(unittest.TestCase):
+    def setUp(self):
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return {'BTC': Decimal('1'), 'USDT': Decimal('10000')}
+
+    def test_apply_fill(self):
+        ledger = BalanceLedger(self.fetch)
+        self.assertEqual(self.fetches, 1)
+
+        ledger.apply_fill('BTC_USDT', 'SELL', Decimal('0.5'),
+                          Decimal('10000'), {'USDT': Decimal('5')})
+        self.assertDictEqual(ledger.get_resources(), {
+            'BTC': Decimal('0.5'), 'USDT': Decimal('14995')})
+
+        ledger.apply_fill('ETH_BTC', 'buy', Decimal('2'), Decimal('0.1'),
+                          {'BNB': Decimal('0')})
+        self.assertDictEqual(ledger.get_resources(), {
+            'BTC': Decimal('0.3'), 'USDT': Decimal('14995'),
+            'ETH': Decimal('2')})
+        self.assertEqual(self.fetches, 1)
+
+    def test_cumulative_fills(self):
+        ledger = BalanceLedger(self.fetch, {'BTC': Decimal('1'),
+                                            'USDT': Decimal('0')})
+        self.assertEqual(self.fetches, 0)
+        for executed in ['0', '0.25', '0.25', '1']:
+            ledger.apply_fill('BTC_USDT', 'SELL', Decimal(executed),
+                              Decimal('100'),
+                              {'USDT': Decimal(executed) / 10},
+                              order_id=1)
+        self.assertDictEqual(ledger.get_resources(),
+                             {'USDT': Decimal('99.9')})
+
+    def test_reconcile(self):
+        ledger = BalanceLedger(self.fetch, reconcile_every=2)
+        ledger.apply_fill('BTC_USDT', 'SELL', Decimal('0.1'),
+                          Decimal('10000'))
+        ledger.get_resources()
+        self.assertEqual(self.fetches, 1)
+        ledger.apply_fill('BTC_USDT', 'SELL', Decimal('0.1'),
+                          Decimal('10000'))
+        self.assertDictEqual(ledger.get_resources(), self.fetch())
+        self.assertEqual(self.fetches, 3)
+
+        # drift below zero
+        ledger.apply_fill('BTC_USDT', 'SELL', Decimal('2'), Decimal('1'))
+        self.assertDictEqual(ledger.get_resources(), self.fetch())
+
+    def test_reservation(self):
+        # exchange: 0.5 BTC is locked by sell order, 0.2 BTC of it is filled
+        free = {'BTC': Decimal('0.5'), 'USDT': Decimal('10000')}
+        ledger = BalanceLedger(lambda: dict(free), {
+            'BTC': Decimal('1'), 'USDT': Decimal('10000')})
+        ledger.reserve('BTC_USDT', 'SELL', Decimal('0.5'), Decimal('100'), 1)
+        ledger.reserve('BTC_USDT', 'BUY', Decimal('1'), Decimal('90'), 2)
+        self.assertDictEqual(ledger.get_resources(), {
+            'BTC': Decimal('0.5'), 'USDT': Decimal('9910')})
+
+        ledger.apply_fill('BTC_USDT', 'SELL', Decimal('0.2'),
+                          Decimal('100'), {'USDT': Decimal('0.02')},
+                          order_id=1)
+        self.assertDictEqual(ledger.get_resources(), {
+            'BTC': Decimal('0.5'), 'USDT': Decimal('9929.98')})
+
+        # reconciled ledger keeps reservations
+        free.update({'USDT': Decimal('9929.98')})
+        ledger.reconcile()
+        ledger.apply_fill('BTC_USDT', 'SELL', Decimal('0.5'),
+                          Decimal('100'), {'USDT': Decimal('0.05')},
+                          order_id=1)
+        ledger.release(1)
+        ledger.release(2)
+        ledger.release(3)
+        self.assertDictEqual(ledger.get_resources(), {
+            'BTC': Decimal('0.5'), 'USDT': Decimal('10049.95')})
+
+    def test_to_dict(self):
+        ledger = BalanceLedger(self.fetch, {'BTC': Decimal('1')})
+        ledger.reserve('BTC_USDT', 'SELL', Decimal('1'), Decimal('100'), 1)
+        ledger.apply_fill('BTC_USDT', 'SELL', Decimal('0.5'), Decimal('100'),
+                          {'USDT': Decimal('0.05')}, order_id=1)
+        ledger = BalanceLedger.from_dict(
+            self.fetch, json.loads(json.dumps(ledger.to_dict())))
+        self.assertEqual(self.fetches, 0)
+        # the same fill isn't applied again
+        ledger.apply_fill('BTC_USDT', 'SELL', Decimal('0.5'), Decimal('100'),
+                          {'USDT': Decimal('0.05')}, order_id=1)
+        ledger.release(1)
+        self.assertDictEqual(ledger.get_resources(), {
+            'BTC': Decimal('0.5'), 'USDT': Decimal('49.95')})
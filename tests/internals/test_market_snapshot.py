@@ -0,0 +1,87 @@
+import unittest
+import numpy as np
+from decimal import Decimal
+
+from internals.orderbook import OrderBook
+from internals.market_snapshot import MarketSnapshot
+from rebalancer.utils import get_mid_prices_from_orderbooks, bfs
+
+
+class MarketSnapshotTester(unittest.TestCase):
+    def setUp(self):
+        self.orderbooks = [
+            OrderBook('BTC_USDT', {'bid': Decimal('9990'),
+                                   'ask': Decimal('10010')}),
+            OrderBook('ETH_USDT', {'bid': Decimal('99'),
+                                   'ask': Decimal('101')}),
+            OrderBook('ETH_BTC', {'bid': Decimal('0.0099'),
+                                  'ask': Decimal('0.0101')}),
+            OrderBook('XRP_BTC', {'bid': Decimal('0.00003'),
+                                  'ask': Decimal('0.00003')}),
+        ]
+        self.snapshot = MarketSnapshot(self.orderbooks)
+
+    def test_interning(self):
+        snapshot = self.snapshot
+        self.assertListEqual(snapshot.currencies,
+                             ['BTC', 'USDT', 'ETH', 'XRP'])
+        self.assertEqual(snapshot.get_product('USDT', 'ETH'),
+                         ('ETH_USDT', False))
+        self.assertEqual(snapshot.get_product('XRP', 'BTC'),
+                         ('XRP_BTC', True))
+        self.assertIsNone(snapshot.get_product('XRP', 'USDT'))
+        self.assertIsNone(snapshot.get_product('XRP', 'EUR'))
+        self.assertIn('ETH_BTC', snapshot)
+        self.assertNotIn('BTC_ETH', snapshot)
+        np.testing.assert_array_equal(snapshot.product_ids,
+                                      snapshot.product_ids.T)
+        np.testing.assert_allclose(snapshot.mid_prices,
+                                   [10000, 100, 0.01, 0.00003])
+        self.assertEqual(snapshot.spread_fees[3], 0)
+
+    def test_price_estimates_as_bfs(self):
+        graph = {}
+        for product, price in get_mid_prices_from_orderbooks(
+                self.orderbooks).items():
+            currency_from, currency_to = product.split('_')
+            graph.setdefault(currency_from, {})[currency_to] = -price.log10()
+        for base in ['USDT', 'BTC', 'XRP']:
+            expected = {currency: Decimal(10) ** dist
+                        for currency, dist in bfs(graph, base).items()}
+            estimates = self.snapshot.get_price_estimates(base)
+            self.assertListEqual(list(estimates), list(expected))
+            for currency, price in expected.items():
+                self.assertAlmostEqual(estimates[currency], price)
+
+    def test_edge_costs(self):
+        factors = np.full(len(self.snapshot), 0.999)
+        edge_costs = self.snapshot.get_edge_costs(factors)
+        self.assertEqual(edge_costs[('ETH', 'BTC')],
+                         -int(float(Decimal('0.999').log10()) * 1e8))
+        self.assertEqual(len(edge_costs), 4)
+
+    def test_log_prices(self):
+        log_values, _ = self.snapshot.get_log_values()
+        for base in ['USDT', 'BTC', 'XRP']:
+            estimates = self.snapshot.get_price_estimates(base)
+            prices = self.snapshot.get_prices(base)
+            self.assertSetEqual(set(prices), set(estimates))
+            for currency, price in prices.items():
+                self.assertAlmostEqual(price / float(estimates[currency]), 1)
+        # solved once for all bases
+        self.assertIs(self.snapshot.get_log_values()[0], log_values)
+
+        snapshot = MarketSnapshot(self.orderbooks + [
+            OrderBook('EUR_GBP', {'bid': Decimal('0.9'),
+                                  'ask': Decimal('0.9')})])
+        self.assertTrue(np.isnan(snapshot.get_log_prices('USDT')[
+            snapshot.index['EUR']]))
+        self.assertAlmostEqual(snapshot.get_prices('GBP')['EUR'], 0.9)
+        self.assertNotIn('EUR', snapshot.get_prices('USDT'))
+
+    def test_value_portfolios(self):
+        portfolios = [{'BTC': Decimal('1'), 'USDT': Decimal('500')},
+                      {'XRP': Decimal('1e3'), 'EUR': Decimal('3')}, {}]
+        np.testing.assert_allclose(
+            self.snapshot.value_portfolios(portfolios, 'USDT'),
+            [10500, 300, 0])
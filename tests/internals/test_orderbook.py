@@ -1,5 +1,6 @@
 import unittest
-from internals.orderbook import OrderBook
+from decimal import Decimal
+from internals.orderbook import OrderBook, DepthOrderBook
 
 
 class OrderBookTester(unittest.TestCase):
@@ -27,3 +28,24 @@ class OrderBookTester(unittest.TestCase):
         self.assertEqual(orderbook.get_wall_ask(), 10)
         self.assertEqual(orderbook.get_wall_bid(), 10)
         self.assertEqual(orderbook.get_mid_market_price(), 10)
+
+    def test_depth_order_book(self):
+        bids = [['99', '1'], ['98', '2'], ['97', '3', 'order_id']]
+        asks = [['101', '1'], ['102', '2'], ['104', '3']]
+        orderbook = DepthOrderBook('BTC_USDT', bids, asks)
+
+        self.assertEqual(orderbook.get_wall_bid(), Decimal('99'))
+        self.assertEqual(orderbook.get_wall_ask(), Decimal('101'))
+        self.assertEqual(orderbook.get_mid_market_price(), Decimal('100'))
+        self.assertEqual(orderbook.get_depth(), 3)
+        self.assertEqual(orderbook.get_liquidity('BUY'), 6)
+
+        self.assertAlmostEqual(orderbook.get_cost_to_fill(0.5, 'BUY'), 50.5)
+        self.assertAlmostEqual(orderbook.get_cost_to_fill(1, 'BUY'), 101)
+        self.assertAlmostEqual(orderbook.get_cost_to_fill(2, 'BUY'), 203)
+        self.assertAlmostEqual(orderbook.get_cost_to_fill(6, 'BUY'), 617)
+        self.assertIsNone(orderbook.get_cost_to_fill(6.5, 'BUY'))
+
+        self.assertAlmostEqual(orderbook.get_cost_to_fill(
+            Decimal('4'), 'SELL'), 99 + 196 + 97)
+        self.assertAlmostEqual(orderbook.get_average_price(2, 'SELL'), 98.5)
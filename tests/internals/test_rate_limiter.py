@@ -0,0 +1,62 @@
+import time
+import unittest
+import threading
+from internals.rate_limiter import TokenBucket, RedisTokenBucket
+
+
+class TokenBucketTester(unittest.TestCase):
+    def test_burst(self):
+        bucket = TokenBucket(rate=1000, capacity=5)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.05)
+        self.assertGreater(bucket._try_acquire(1), 0)
+
+    def test_rate(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+        counter = []
+
+        def worker():
+            for _ in range(5):
+                with bucket:
+                    counter.append(1)
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(counter), 20)
+        # first token is in bucket, next 19 come at 100 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+
+class FakeScript:
+    def __init__(self, wait):
+        self.calls = []
+        self.wait = wait
+
+    def __call__(self, keys, args):
+        self.calls.append((keys, args))
+        return str(self.wait.pop(0))
+
+
+class RedisTokenBucketTester(unittest.TestCase):
+    def test_shared(self):
+        bucket = RedisTokenBucket('test', rate=1000, capacity=10)
+        bucket._script = FakeScript([0.01, 0])
+        start = time.monotonic()
+        bucket.acquire(2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.01)
+        self.assertListEqual(bucket._script.calls,
+                             [(['test'], [1000, 10, 2])] * 2)
+
+    def test_fallback(self):
+        bucket = RedisTokenBucket('test', rate=1000, capacity=2,
+                                  redis_url='redis://localhost:1')
+        bucket.acquire()
+        bucket.acquire()
+        self.assertGreater(bucket._unavailable_until, time.monotonic())
+        self.assertGreater(bucket._try_acquire(1), 0)
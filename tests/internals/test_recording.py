@@ -0,0 +1,76 @@
+import os
+import json
+import gzip
+import tempfile
+import unittest
+from unittest import mock
+from decimal import Decimal
+
+from internals import recording
+from exchange.binance import Binance
+from exchange.simulated import SimulatedMarket
+from exchange.standin.rest_server import RestStandinServer
+from rebalancer.market_order_rebalancer import market_order_rebalance
+
+
+class RecordingTester(unittest.TestCase):
+    def setUp(self):
+        Binance.invalidate_filters()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'traffic.jsonl.gz')
+        market = SimulatedMarket({'BTC': Decimal('10000'),
+                                  'ETH': Decimal('100')}, depth=5, seed=1)
+        self.server = RestStandinServer(
+            market, {'USDT': Decimal('10000')}).start()
+        self.weights = {'BTC': Decimal('0.5'), 'ETH': Decimal('0.3'),
+                        'USDT': Decimal('0.2')}
+
+    def tearDown(self):
+        self.server.stop()
+        self.directory.cleanup()
+        Binance.invalidate_filters()
+
+    def rebalance(self):
+        exchange = Binance('key', 'secret', api_url=self.server.url)
+        return market_order_rebalance(exchange, self.weights, lambda x: None)
+
+    def test_record_and_replay(self):
+        with mock.patch.dict(os.environ, {'EXCHANGE_RECORD_PATH': self.path}):
+            recorded = self.rebalance()
+        self.assertGreater(len(recorded), 0)
+
+        with gzip.open(self.path, 'rt') as rfile:
+            records = [json.loads(line) for line in rfile]
+        self.assertEqual(len(records), sum(self.server.stats.values()))
+        for record in records:
+            self.assertNotIn('signature', record['u'] + record['b'])
+            self.assertNotIn('timestamp', record['u'] + record['b'])
+            self.assertNotIn('key', json.dumps(record['h']).lower())
+
+        # server is not needed for replay
+        self.server.stop()
+        Binance.invalidate_filters()
+        with mock.patch.dict(os.environ, {'EXCHANGE_REPLAY_PATH': self.path}):
+            replayed = self.rebalance()
+            replayer = recording.get_transport_adapter().replayer
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(replayer.remaining(), 0)
+
+    def test_replay_miss(self):
+        with open(os.path.join(self.directory.name, 'empty.jsonl'), 'w'):
+            pass
+        replayer = recording.Replayer(
+            os.path.join(self.directory.name, 'empty.jsonl'))
+        with self.assertRaises(recording.ReplayError):
+            replayer.find('GET', 'http://localhost/api/v3/account', None)
+
+    def test_volatile_params_are_ignored(self):
+        self.assertEqual(
+            recording.normalize_url('http://h/api/v3/order?symbol=ETHBTC&'
+                                    'timestamp=1&signature=abc'),
+            'http://h/api/v3/order?symbol=ETHBTC')
+        self.assertEqual(
+            recording.normalize_body(b'quantity=1&timestamp=2&signature=x'),
+            'quantity=1')
+        self.assertEqual(recording.normalize_body('{"size": "1"}'),
+                         '{"size": "1"}')
@@ -1,5 +1,6 @@
 import unittest
 from internals.utils import binance_product_to_currencies, quantize
+from internals.utils import Quantizer, get_quantizer
 from decimal import Decimal
 
 
@@ -33,3 +34,14 @@ class UtilsTester(unittest.TestCase):
         precision = Decimal('0.01000000')
         self.assertEqual(quantize(x, precision, down=True), Decimal('100'))
         self.assertEqual(quantize(x, precision, down=False), Decimal('100.01'))
+
+    def test_quantizer(self):
+        x = Decimal('100.0001')
+        for precision in ['0.01', '0.01000000']:
+            quantizer = Quantizer(Decimal(precision))
+            self.assertEqual(quantizer(x, down=True), Decimal('100'))
+            self.assertEqual(quantizer(x, down=False), Decimal('100.01'))
+            self.assertEqual(quantizer(x), quantize(x, Decimal(precision)))
+
+        self.assertIs(get_quantizer(Decimal('1e-8')),
+                      get_quantizer(Decimal('1e-8')))
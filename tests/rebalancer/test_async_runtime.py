@@ -0,0 +1,115 @@
+import os
+import asyncio
+import unittest
+from unittest import mock
+from decimal import Decimal
+
+from exchange.async_binance import AsyncBinance
+from exchange.binance import Binance
+from exchange.simulated import SimulatedMarket
+from exchange.standin.rest_server import RestStandinServer
+from rebalancer.async_runtime import RebalanceRuntime
+from rebalancer.limit_order_rebalancer import AsyncLimitOrderRebalance
+
+
+class RebalanceRuntimeTester(unittest.TestCase):
+    def setUp(self):
+        Binance.invalidate_filters()
+        self.market = SimulatedMarket({'BTC': Decimal('10000'),
+                                       'ETH': Decimal('300')},
+                                      depth=5, limit_fill_probability=0)
+        self.server = RestStandinServer(
+            self.market, {'USDT': Decimal('10000')}, retry_after=0).start()
+        self.api_url = os.environ.get('BINANCE_API_URL')
+        os.environ['BINANCE_API_URL'] = self.server.url
+        self.weights = {'BTC': Decimal('0.4'), 'ETH': Decimal('0.4'),
+                        'USDT': Decimal('0.2')}
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        if self.api_url is None:
+            del os.environ['BINANCE_API_URL']
+        else:
+            os.environ['BINANCE_API_URL'] = self.api_url
+        self.server.stop()
+        Binance.invalidate_filters()
+
+    def get_resources(self, api_key):
+        account = self.server.get_account(api_key).get_account()
+        return {balance['asset']: Decimal(balance['free'])
+                for balance in account['balances']}
+
+    def test_market(self):
+        async def run():
+            async with RebalanceRuntime(AsyncBinance) as runtime:
+                futures = [runtime.start(('key{}'.format(i), 'secret'),
+                                         self.weights)
+                           for i in range(3)]
+                # one rebalance of account at a time
+                with self.assertRaises(ValueError):
+                    runtime.start(('key0', 'secret'), self.weights)
+                self.assertTrue(runtime.is_running(('key0', 'secret')))
+                failed = runtime.start(('key3', 'secret'),
+                                       {'XRP': Decimal(1)})
+            self.assertFalse(runtime.is_running(('key0', 'secret')))
+            return ([future.result() for future in futures],
+                    failed.result())
+
+        results, failed = self.loop.run_until_complete(run())
+        self.assertListEqual(failed, ['XRP'])
+        # accounts don't share resources
+        for i, responses in enumerate(results):
+            self.assertEqual(len(responses), 2)
+            resources = self.get_resources('key{}'.format(i))
+            self.assertAlmostEqual(float(resources['BTC']) * 10000,
+                                   float(resources['ETH']) * 300,
+                                   delta=100)
+            self.assertAlmostEqual(float(resources['USDT']), 2000, delta=100)
+        self.assertDictEqual(self.get_resources('key3'),
+                             {'USDT': Decimal('10000')})
+
+    def test_cancel_limit(self):
+        async def run():
+            async with RebalanceRuntime(AsyncBinance) as runtime:
+                future = runtime.start(('key', 'secret'), self.weights,
+                                       'limit', time_delta=30)
+                while not self.market.open_orders:
+                    await asyncio.sleep(0.05)
+                start = self.loop.time()
+                self.assertTrue(runtime.cancel(('key', 'secret')))
+                responses = await future
+                elapsed = self.loop.time() - start
+                self.assertFalse(runtime.cancel(('key', 'secret')))
+            return responses, elapsed
+
+        responses, elapsed = self.loop.run_until_complete(run())
+        # resting orders are canceled without waiting for time_delta
+        self.assertLess(elapsed, 5)
+        self.assertEqual(len(responses), 2)
+        self.assertSetEqual(self.market.open_orders, set())
+        for response in responses:
+            self.assertEqual(response['executed_quantity'], '0')
+
+    def test_failed_limit(self):
+        step = AsyncLimitOrderRebalance.step
+
+        async def failing_step(rebalance, update_function):
+            if self.market.open_orders:
+                raise RuntimeError('step failed')
+            return await step(rebalance, update_function)
+
+        async def run():
+            async with RebalanceRuntime(AsyncBinance) as runtime:
+                future = runtime.start(('key', 'secret'), self.weights,
+                                       'limit', time_delta=30)
+                return await future
+
+        with mock.patch.object(AsyncLimitOrderRebalance, 'step',
+                               failing_step):
+            result = self.loop.run_until_complete(run())
+        self.assertIsInstance(result, RuntimeError)
+        # orders of failed rebalance aren't left in orderbook
+        self.assertSetEqual(self.market.open_orders, set())
@@ -0,0 +1,101 @@
+import time
+import asyncio
+import threading
+import unittest
+from decimal import Decimal
+
+from internals.order import Order
+from internals.enums import OrderType, OrderAction
+from rebalancer.executor import get_dependencies, get_dependency_levels, \
+    execute_orders, async_execute_orders
+
+
+def market_order(product, action):
+    return Order(product, OrderType.MARKET, action, Decimal(1))
+
+
+class ExecutorTester(unittest.TestCase):
+    def setUp(self):
+        # sells into USDT, then buys from USDT, one buy funds another buy
+        self.orders = [
+            market_order('ETH_USDT', OrderAction.SELL),
+            market_order('XRP_USDT', OrderAction.SELL),
+            market_order('BTC_USDT', OrderAction.BUY),
+            market_order('EOS_BTC', OrderAction.BUY),
+            market_order('ADA_USDT', OrderAction.SELL),
+            market_order('LTC_USDT', OrderAction.BUY),
+        ]
+
+    def test_levels(self):
+        # orders spending the same currency are placed one by one
+        self.assertListEqual(get_dependencies(self.orders),
+                             [[], [], [0, 1], [2], [], [0, 1, 4, 2]])
+        self.assertListEqual(get_dependency_levels(self.orders),
+                             [[0, 1, 4], [2], [3, 5]])
+        self.assertListEqual(get_dependency_levels([]), [])
+
+    def test_execute_orders(self):
+        delay = 0.05
+        times = {}
+        lock = threading.Lock()
+
+        def place_order(order):
+            start = time.time()
+            time.sleep(delay)
+            with lock:
+                times[order.product] = (start, time.time())
+            return order.product
+
+        done = []
+        start = time.time()
+        responses = execute_orders(self.orders, place_order,
+                                   lambda order, _: done.append(order),
+                                   max_workers=4)
+        elapsed = time.time() - start
+        self.assertListEqual(responses,
+                             [order.product for order in self.orders])
+        self.assertEqual(len(done), len(self.orders))
+        # dependent order starts after orders, which fund it, finish
+        self.assertGreaterEqual(times['BTC_USDT'][0],
+                                max(times['ETH_USDT'][1],
+                                    times['XRP_USDT'][1]))
+        self.assertGreaterEqual(times['EOS_BTC'][0], times['BTC_USDT'][1])
+        # three levels instead of six orders
+        self.assertLess(elapsed, 4.5 * delay)
+
+    def test_error(self):
+        def place_order(order):
+            raise ValueError(order.product)
+
+        with self.assertRaises(ValueError):
+            execute_orders(self.orders, place_order)
+
+    def test_async_execute_orders(self):
+        delay = 0.05
+        loop = asyncio.new_event_loop()
+        times = {}
+
+        async def place_order(order):
+            start = loop.time()
+            await asyncio.sleep(delay)
+            times[order.product] = (start, loop.time())
+            return order.product
+
+        async def failing_place_order(order):
+            raise ValueError(order.product)
+
+        try:
+            start = loop.time()
+            responses = loop.run_until_complete(
+                async_execute_orders(self.orders, place_order))
+            elapsed = loop.time() - start
+            with self.assertRaises(ValueError):
+                loop.run_until_complete(
+                    async_execute_orders(self.orders, failing_place_order))
+        finally:
+            loop.close()
+        self.assertListEqual(responses,
+                             [order.product for order in self.orders])
+        self.assertGreaterEqual(times['EOS_BTC'][0], times['BTC_USDT'][1])
+        self.assertGreaterEqual(times['LTC_USDT'][0], times['ADA_USDT'][1])
+        self.assertLess(elapsed, 4.5 * delay)
@@ -0,0 +1,97 @@
+import unittest
+from decimal import Decimal
+
+from internals.order import Order
+from internals.orderbook import OrderBook
+from internals.enums import OrderType, OrderAction
+from rebalancer.fill_monitor import FillMonitor
+
+
+class FakeExchange:
+    def __init__(self, fills_after, top_of_book=None):
+        self.fills_after = fills_after
+        self.top_of_book = top_of_book
+        self.calls = 0
+
+    def get_order(self, order_response):
+        self.calls += 1
+        quantity = order_response['order']._quantity
+        executed = quantity if self.calls > self.fills_after else Decimal(0)
+        return {'orig_quantity': quantity, 'executed_quantity': executed}
+
+    def get_open_orders(self, order_responses):
+        return None
+
+    def is_dust(self, product, quantity, price):
+        return quantity < Decimal('0.1')
+
+    def get_top_of_book(self, products):
+        return self.top_of_book
+
+    def get_poll_interval(self, order_responses, share):
+        # weight 1 per order of budget 10 per second
+        return len(order_responses) / (10 * share)
+
+
+class BulkFakeExchange(FakeExchange):
+    def get_open_orders(self, order_responses):
+        self.calls += 1
+        if self.calls > self.fills_after:
+            return [None] * len(order_responses)
+        return [{'orig_quantity': order_response['order']._quantity,
+                 'executed_quantity': Decimal(0)}
+                for order_response in order_responses]
+
+
+class FillMonitorTester(unittest.TestCase):
+    def setUp(self):
+        self.order_responses = [{'order': Order(
+            'BTC_USDT', OrderType.LIMIT, OrderAction.BUY, Decimal('1'),
+            Decimal('10000'))}]
+
+    def test_unfilled(self):
+        exchange = FakeExchange(fills_after=1)
+        monitor = FillMonitor(exchange)
+        [order_response] = self.order_responses
+        self.assertListEqual(monitor.get_unfilled(self.order_responses),
+                             self.order_responses)
+        self.assertIsNone(monitor.get_closed(order_response))
+        self.assertListEqual(monitor.get_unfilled(self.order_responses), [])
+        self.assertEqual(exchange.calls, 2)
+        self.assertEqual(monitor.get_closed(order_response)[
+            'executed_quantity'], Decimal('1'))
+        self.assertIsNone(monitor.get_closed({}))
+
+    def test_closed(self):
+        # open orders are queried at once, one request per poll
+        exchange = BulkFakeExchange(fills_after=1)
+        self.order_responses.append(dict(self.order_responses[0]))
+        monitor = FillMonitor(exchange)
+        self.assertEqual(len(monitor.get_unfilled(self.order_responses)), 2)
+        self.assertListEqual(monitor.get_unfilled(self.order_responses), [])
+        self.assertEqual(exchange.calls, 2)
+        for order_response in self.order_responses:
+            self.assertDictEqual(monitor.get_closed(order_response), {})
+
+    def test_dust(self):
+        self.order_responses[0]['order']._quantity = Decimal('0.05')
+        monitor = FillMonitor(FakeExchange(fills_after=10 ** 6))
+        self.assertListEqual(monitor.get_unfilled(self.order_responses), [])
+        # remaining dust may still rest in orderbook
+        self.assertIsNone(monitor.get_closed(self.order_responses[0]))
+
+    def test_market_moved(self):
+        self.assertFalse(FillMonitor(FakeExchange(0)).market_moved(
+            self.order_responses))
+        orderbook = OrderBook('BTC_USDT', {'bid': Decimal('10000'),
+                                           'ask': Decimal('10010')})
+        monitor = FillMonitor(FakeExchange(0, [orderbook]))
+        self.assertFalse(monitor.market_moved(self.order_responses))
+        orderbook.wall_bid = Decimal('10001')
+        self.assertTrue(monitor.market_moved(self.order_responses))
+
+    def test_min_interval(self):
+        monitor = FillMonitor(FakeExchange(0), weight_share=0.1)
+        self.assertEqual(monitor.get_min_interval(self.order_responses), 2)
+        self.assertEqual(monitor.get_min_interval(self.order_responses * 3),
+                         3)
@@ -1,3 +1,4 @@
+import json
 import unittest
 from unittest.mock import patch
 from collections import defaultdict
@@ -10,6 +11,9 @@ from internals.orderbook import OrderBook
 from rebalancer.limit_order_rebalancer import limit_order_rebalance
 from rebalancer.limit_order_rebalancer import limit_order_rebalance_with_orders
 from rebalancer.limit_order_rebalancer import place_limit_or_market_order
+from rebalancer.limit_order_rebalancer import plan_limit_orders
+from rebalancer.limit_order_rebalancer import LimitOrderRebalance
+from exchange.simulated import SimulatedMarket, SimulatedExchange
 
 
 class LimitOrderRebalancerTester(unittest.TestCase):
@@ -365,6 +369,109 @@ class LimitOrderRebalancerTester(unittest.TestCase):
             self.assertEqual(order._quantity, correct_order._quantity)
             self.assertEqual(order._price, correct_order._price)
 
+    def test_keep_or_reprice(self):
+        # mid market price moves within half of spread, then out of it
+        orderbooks = [
+            [OrderBook('BTC_USDT', {'bid': bid, 'ask': bid + 20})]
+            for bid in map(Decimal, ['9990', '9995', '10010'])]
+        exchange = RepriceFakeExchange(orderbooks, fills_after=3)
+        orders = [Order('BTC_USDT', OrderType.LIMIT, OrderAction.SELL,
+                        Decimal('1'), Decimal())]
+        rets = limit_order_rebalance_with_orders(
+            lambda *args: None, exchange, {'BTC': Decimal('1')},
+            ['BTC_USDT'], orders, 3, 0, 'USDT')
+        self.assertListEqual(exchange.prices,
+                             [Decimal('10000'), Decimal('10020')])
+        self.assertListEqual(exchange.canceled, [1])
+        self.assertListEqual(rets, [
+            {'orig_quantity': Decimal('1'), 'executed_quantity': Decimal(0)},
+            {'orig_quantity': Decimal('1'), 'executed_quantity': Decimal(1)}])
+
+        # replacement limit keeps stale order until retries run out
+        exchange = RepriceFakeExchange(orderbooks, fills_after=10)
+        orders = [Order('BTC_USDT', OrderType.LIMIT, OrderAction.SELL,
+                        Decimal('1'), Decimal())]
+        rets = limit_order_rebalance_with_orders(
+            lambda *args: None, exchange, {'BTC': Decimal('1')},
+            ['BTC_USDT'], orders, 2, 0, 'USDT', max_requotes=0)
+        self.assertListEqual(exchange.prices, [Decimal('10000')])
+        self.assertListEqual(exchange.canceled, [1])
+        self.assertEqual(len(rets), 1)
+
+    def test_steps(self):
+        # rebalance, which is saved and loaded between steps and tracks
+        # resources in new ledger every step like limit_rebalance_step,
+        # makes the same calls as rebalance in one thread
+        def run(steps):
+            market = SimulatedMarket.random_market(4, seed=2)
+            exchange = SimulatedExchange(market, {'USDT': Decimal('10000')})
+            weights = {currency: Decimal('0.2')
+                       for currency in sorted(market.prices)}
+            products, resources, orders = plan_limit_orders(
+                exchange, weights, 'USDT')
+            if not steps:
+                with exchange.track_resources(resources):
+                    return limit_order_rebalance_with_orders(
+                        lambda *args: None, exchange, resources, products,
+                        orders, 2, 0, 'USDT'), exchange.get_resources()
+            state = LimitOrderRebalance(exchange, resources, products,
+                                        orders, 2, 0, 'USDT').to_dict()
+            self.assertIsNone(state['ledger'])
+            delay = 0
+            while delay is not None:
+                rebalance = LimitOrderRebalance.from_dict(
+                    exchange, json.loads(json.dumps(state)))
+                with rebalance.track_resources() as ledger:
+                    delay = rebalance.step()
+                    state = rebalance.to_dict()
+                # fills are applied once, ledger doesn't overstate free
+                # resources, it may only miss fills, which aren't seen yet,
+                # balances are read without request, which simulates flow
+                free = exchange.client.free
+                for currency, quantity in ledger.resources.items():
+                    self.assertLessEqual(
+                        quantity, free.get(currency, 0) + Decimal('1e-6'))
+            self.assertDictEqual(
+                {currency: quantity
+                 for currency, quantity in ledger.resources.items()
+                 if quantity},
+                {currency: quantity
+                 for currency, quantity in exchange.client.free.items()
+                 if quantity})
+            return rebalance.rets, exchange.get_resources()
+
+        def without_time(rets):
+            return [{k: v for k, v in resp.items() if k != 'time'}
+                    for resp in rets]
+
+        rets, resources = run(steps=False)
+        self.assertGreater(len(rets), 3)
+        step_rets, step_resources = run(steps=True)
+        self.assertListEqual(without_time(step_rets), without_time(rets))
+        self.assertDictEqual(step_resources, resources)
+
+    def test_fixed_poll_interval(self):
+        market = SimulatedMarket.random_market(4, seed=2,
+                                               limit_fill_probability=0)
+        exchange = SimulatedExchange(market, {'USDT': Decimal('10000')})
+        weights = {currency: Decimal('0.2')
+                   for currency in sorted(market.prices)}
+        products, resources, orders = plan_limit_orders(
+            exchange, weights, 'USDT')
+        state = LimitOrderRebalance(exchange, resources, products, orders,
+                                    2, 30, 'USDT',
+                                    poll_interval=5).to_dict()
+        # interval doesn't grow between checks of saved rebalance
+        for _ in range(3):
+            rebalance = LimitOrderRebalance.from_dict(
+                exchange, json.loads(json.dumps(state)))
+            with rebalance.track_resources():
+                self.assertEqual(rebalance.step(), 5)
+                state = rebalance.to_dict()
+        with rebalance.track_resources():
+            rebalance.cancel()
+        self.assertSetEqual(market.open_orders, set())
+
     def test_place_limit_or_market_order(self):
         exchange = FakeExchange2()
         base = 'BTC'
@@ -444,6 +551,8 @@ class LimitOrderRebalancerTester(unittest.TestCase):
 
 
 class FakeExchange(Binance):
+    filters = {}
+
     def __init__(self, **kwargs):
         for k, v in kwargs.items():
             setattr(self, k, v)
@@ -457,10 +566,39 @@ class FakeExchange(Binance):
     def get_orderbooks(self, products):
         return self.orderbooks
 
+    def get_open_orders(self, order_responses):
+        return None
+
+    def get_poll_interval(self, order_responses, share):
+        return 0
+
     def get_maker_fee(self, product):
         return self.fees[product]
 
 
+class RepriceFakeExchange(FakeExchange):
+    def __init__(self, orderbooks, fills_after):
+        super().__init__(orderbooks=iter(orderbooks), orders={}, prices=[],
+                         canceled=[], calls=0, fills_after=fills_after)
+
+    def get_orderbooks(self, products):
+        return next(self.orderbooks)
+
+    def place_limit_order(self, order):
+        self.prices.append(order._price)
+        self.orders[len(self.orders) + 1] = order._quantity
+        return {'order_id': len(self.orders)}
+
+    def cancel_limit_order(self, order_response):
+        self.canceled.append(order_response['order_id'])
+
+    def get_order(self, order_response):
+        self.calls += 1
+        quantity = self.orders[order_response['order_id']]
+        executed = Decimal(1 if self.calls > self.fills_after else 0)
+        return {'orig_quantity': quantity, 'executed_quantity': executed}
+
+
 class FakeExchange2(object):
     def __init__(self):
         self.orders = []
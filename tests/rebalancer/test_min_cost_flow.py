@@ -0,0 +1,143 @@
+import random
+import unittest
+import numpy as np
+from decimal import Decimal
+from networkx import flow
+
+from rebalancer.min_cost_flow import min_cost_flow, shortest_paths, \
+    transportation, FlowUnfeasible, INF, _floyd_warshall, FlowSkeleton, \
+    get_flow_skeleton, star_flow
+from rebalancer.utils import create_flow_digraph
+
+QUOTES = ['USDT', 'BTC', 'ETH', 'BNB']
+
+
+def random_instance(n, seed, distinct_costs=True):
+    generator = random.Random(seed)
+    currencies = QUOTES + ['X{:03d}'.format(i) for i in range(n)]
+    edge_costs = {}
+    for k, currency in enumerate(currencies):
+        for quote in QUOTES[:min(k, len(QUOTES))]:
+            if distinct_costs:
+                edge_costs[(currency, quote)] = generator.randint(
+                    40000, 130000)
+            else:
+                edge_costs[(currency, quote)] = 86000
+    supplies = {c: generator.randint(0, 10 ** 6) for c in currencies}
+    demands = {c: generator.randint(0, 10 ** 6) for c in currencies}
+    return supplies, demands, edge_costs
+
+
+def networkx_min_cost_flow(supplies, demands, edge_costs):
+    # costs are given here instead of fees
+    graph = create_flow_digraph(supplies, demands, {}, precision=Decimal(1))
+    for (c1, c2), cost in edge_costs.items():
+        graph.add_edge(c1, c2, capacity=float('inf'), weight=cost)
+        graph.add_edge(c2, c1, capacity=float('inf'), weight=cost)
+    flows = flow.min_cost_flow(graph)
+    return {(c1, c2): quantity for c1, dct in flows.items() if c1 != 'start'
+            for c2, quantity in dct.items() if c2 != 'end' and quantity > 0}
+
+
+def total_cost(flows, edge_costs):
+    return sum(quantity * edge_costs.get(edge, edge_costs.get(edge[::-1]))
+               for edge, quantity in flows.items())
+
+
+class MinCostFlowTester(unittest.TestCase):
+    def test_shortest_paths(self):
+        generator = random.Random(0)
+        for n, density in [(30, 0.1), (30, 0.5), (60, 0.05)]:
+            costs = np.full((n, n), INF, dtype=np.int64)
+            for i in range(n):
+                for j in range(i):
+                    if generator.random() < density:
+                        costs[i, j] = costs[j, i] = generator.randint(1, 100)
+            np.testing.assert_array_equal(shortest_paths(costs),
+                                          _floyd_warshall(costs))
+
+    def test_same_plan_as_networkx(self):
+        for n, seed in [(5, 0), (30, 1), (100, 2)]:
+            supplies, demands, edge_costs = random_instance(n, seed)
+            expected = networkx_min_cost_flow(supplies, demands, edge_costs)
+            self.assertDictEqual(
+                min_cost_flow(supplies, demands, edge_costs), expected)
+
+    def test_same_cost_as_networkx_with_ties(self):
+        supplies, demands, edge_costs = random_instance(50, 3, False)
+        expected = networkx_min_cost_flow(supplies, demands, edge_costs)
+        flows = min_cost_flow(supplies, demands, edge_costs)
+        self.assertEqual(total_cost(flows, edge_costs),
+                         total_cost(expected, edge_costs))
+
+    def test_transportation(self):
+        costs = np.array([[4, 6, 9], [5, 3, 8]], dtype=np.int64)
+        flows = transportation(np.array([50, 60]), np.array([30, 40, 60]),
+                               costs)
+        # excess of demand is not shipped
+        np.testing.assert_array_equal(flows, [[30, 0, 20], [0, 40, 20]])
+
+    def test_unfeasible(self):
+        edge_costs = {('BTC', 'USDT'): 1, ('ETH', 'BNB'): 1}
+        with self.assertRaises(FlowUnfeasible):
+            min_cost_flow({'BTC': 10, 'ETH': 10}, {'USDT': 5, 'BNB': 15},
+                          edge_costs)
+        # excess supply of BTC stays
+        self.assertDictEqual(
+            min_cost_flow({'BTC': 15, 'ETH': 10}, {'USDT': 5, 'BNB': 10},
+                          edge_costs),
+            {('BTC', 'USDT'): 5, ('ETH', 'BNB'): 10})
+
+    def test_skeleton(self):
+        supplies, demands, edge_costs = random_instance(40, 4)
+        skeleton = FlowSkeleton(list(edge_costs))
+        skeleton.set_costs(edge_costs)
+        self.assertDictEqual(skeleton.solve(supplies, demands),
+                             min_cost_flow(supplies, demands, edge_costs))
+        dists = skeleton.dists
+
+        # partially filled, solved from previous basis
+        supplies = {c: (supplies[c] + demands[c]) // 2 for c in supplies}
+        skeleton.set_costs(dict(edge_costs))
+        self.assertIs(skeleton.dists, dists)
+        self.assertDictEqual(skeleton.solve(supplies, demands),
+                             min_cost_flow(supplies, demands, edge_costs))
+
+        edge_costs = {edge: cost // 2 if edge[1] == 'BTC' else cost
+                      for edge, cost in edge_costs.items()}
+        skeleton.set_costs(edge_costs)
+        self.assertIsNone(skeleton.dists)
+        self.assertDictEqual(skeleton.solve(supplies, demands),
+                             min_cost_flow(supplies, demands, edge_costs))
+
+        self.assertIs(get_flow_skeleton(list(edge_costs)),
+                      get_flow_skeleton(list(edge_costs)[::-1]))
+
+    def test_star_flow(self):
+        generator = random.Random(5)
+        currencies = ['X{:03d}'.format(i) for i in range(30)]
+        edge_costs = {(c, 'USDT'): generator.randint(40000, 130000)
+                      for c in currencies}
+        # currencies without balance may trade with others
+        edge_costs[('BTC', 'USDT')] = 86000
+        edge_costs[('X000', 'BTC')] = 130000
+        supplies = {c: generator.randint(0, 10 ** 6) for c in currencies}
+        demands = {c: generator.randint(0, 10 ** 6) for c in currencies}
+        supplies['USDT'] = 10 ** 6
+        flows = star_flow(supplies, demands, edge_costs, 'USDT')
+        self.assertTrue(all('USDT' in edge for edge in flows))
+        self.assertEqual(
+            total_cost(flows, edge_costs),
+            total_cost(min_cost_flow(supplies, demands, edge_costs),
+                       edge_costs))
+        self.assertIsNone(star_flow(supplies, demands, edge_costs, 'BTC'))
+
+        # direct trade is cheaper than two trades through hub
+        edge_costs[('X001', 'X002')] = 100000
+        self.assertIsNone(star_flow(supplies, demands, edge_costs, 'USDT'))
+        edge_costs[('X001', 'X002')] = 300000
+        self.assertIsNotNone(star_flow(supplies, demands, edge_costs, 'USDT'))
+
+        # currency without product to hub
+        supplies['BTC'] = 1
+        self.assertIsNone(star_flow(supplies, demands, {}, 'USDT'))
@@ -4,6 +4,7 @@ from django.utils.decorators import method_decorator
 from rest_framework.exceptions import PermissionDenied
 
 from exchange import get_exchange_by_name
+from exchange.registry import exchange_registry
 from webserver.models import User
 from webserver.api_exceptions import MustProvideSingleExchange
 from webserver.api_exceptions import ExchangeNotSupported
@@ -11,6 +12,34 @@ from webserver.api_exceptions import MustProvideBinanceCredentials
 from webserver.api_exceptions import BinanceException
 
 
+def get_exchange_credentials(data, kwargs):
+    """
+    :param kwargs: keyword arguments of view, force_reset of data is moved
+                   to them
+    :return: name, class, api key and secret key of single exchange of
+             request data and its info
+    """
+    if 'force_reset' in data:
+        kwargs['force_reset'] = data.pop('force_reset')
+    if len(data) != 1:
+        raise MustProvideSingleExchange
+    [(exchange_name, info)] = data.items()
+
+    if exchange_name.upper() != 'BINANCE':
+        raise ExchangeNotSupported
+
+    exchange_class = get_exchange_by_name(exchange_name)
+
+    if {'api_key', 'secret_key'} - info.keys():
+        raise MustProvideBinanceCredentials
+
+    # NOTE, that `api_key` and `api_secret` are part of the info object and
+    # if info object is logged user sensitive information will be stored
+    # in the log, so take care when logging the info object.
+    return (exchange_name, exchange_class, info['api_key'],
+            info['secret_key'], info)
+
+
 @method_decorator
 def initialize_exchange(view_func):
 
@@ -18,34 +47,40 @@ def initialize_exchange(view_func):
     def _wrapped_view(request, *args, **kwargs):
 
         data = request.data if hasattr(request, 'data') else request
-        if 'force_reset' in data:
-            kwargs['force_reset'] = data.pop('force_reset')
-        if len(data) != 1:
-            raise MustProvideSingleExchange
-        [(exchange_name, info)] = data.items()
+        exchange_name, exchange_class, api_key, api_secret, info = \
+            get_exchange_credentials(data, kwargs)
+        exchange = exchange_registry.get(exchange_class, api_key, api_secret)
 
-        if exchange_name.upper() != 'BINANCE':
-            raise ExchangeNotSupported
+        # resources and orderbooks are fetched once per request,
+        # until order is placed
+        with exchange.snapshot():
+            try:
+                exchange.get_resources()
+            except binance.exceptions.BinanceAPIException as e:
+                # TODO: move get_resources else
+                exchange_registry.evict(exchange_class, api_key, api_secret)
+                raise BinanceException(e)
+            info['name'] = exchange_name
+            return view_func(request, exchange, info, *args, **kwargs)
+    return _wrapped_view
 
-        exchange_class = get_exchange_by_name(exchange_name)
 
-        if {'api_key', 'secret_key'} - info.keys():
-            raise MustProvideBinanceCredentials
+@method_decorator
+def load_exchange(view_func):
+    """
+    initialize_exchange without check of credentials, for tasks, which
+    continue work started by checked request
+    """
 
-        api_key = info['api_key']
-        api_secret = info['secret_key']
-        exchange = exchange_class(api_key, api_secret)
-        # NOTE, that `api_key` and `api_secret` are part of the info object and
-        # if info object is logged user sensitive information will be stored
-        # in the log, so take care when logging the info object.
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
 
-        try:
-            exchange.get_resources()
-        except binance.exceptions.BinanceAPIException as e:
-            # TODO: move get_resources else
-            raise BinanceException(e)
-        info['name'] = exchange_name
-        return view_func(request, exchange, info, *args, **kwargs)
+        exchange_name, exchange_class, api_key, api_secret, info = \
+            get_exchange_credentials(request, kwargs)
+        exchange = exchange_registry.get(exchange_class, api_key, api_secret)
+        with exchange.snapshot():
+            info['name'] = exchange_name
+            return view_func(request, exchange, info, *args, **kwargs)
     return _wrapped_view
 
 
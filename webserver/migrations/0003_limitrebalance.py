@@ -0,0 +1,27 @@
+# Generated by Django 2.1.2 on 2026-10-17 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webserver', '0002_auto_20180903_0830'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LimitRebalance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_id', models.CharField(db_index=True, max_length=255)),
+                ('state', jsonfield.fields.JSONField()),
+                ('status', models.CharField(choices=[('running', 'running'), ('canceled', 'canceled'), ('finished', 'finished')], default='running', max_length=8)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='webserver.User')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.1.2 on 2026-10-17 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webserver', '0003_limitrebalance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='limitrebalance',
+            name='status',
+            field=models.CharField(choices=[('running', 'running'), ('canceled', 'canceled'), ('finished', 'finished'), ('failed', 'failed')], default='running', max_length=8),
+        ),
+    ]
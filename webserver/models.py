@@ -1,4 +1,5 @@
 from django.db import models
+from jsonfield import JSONField
 
 
 class User(models.Model):
@@ -15,3 +16,25 @@ class Statistics(models.Model):
     fee = models.FloatField()
     action = models.CharField(max_length=4, choices=[("buy", "buy"),
                                                      ("sell", "sell")])
+
+
+class LimitRebalance(models.Model):
+    """
+    saved state of limit order rebalance between its steps, task_id is id of
+    rebalance task, which is polled by client
+    """
+    RUNNING = 'running'
+    CANCELED = 'canceled'
+    FINISHED = 'finished'
+    FAILED = 'failed'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    task_id = models.CharField(max_length=255, db_index=True)
+    state = JSONField()
+    status = models.CharField(max_length=8, default=RUNNING,
+                              choices=[(RUNNING, RUNNING),
+                                       (CANCELED, CANCELED),
+                                       (FINISHED, FINISHED),
+                                       (FAILED, FAILED)])
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_updated = models.DateTimeField(auto_now=True)
@@ -2,20 +2,21 @@ import json
 import logging
 from decimal import Decimal, ROUND_DOWN
 
-from rebalancer.utils import get_price_estimates_from_orderbooks, \
-    get_weights_from_resources, get_portfolio_value_from_resources
+from internals.market_snapshot import MarketSnapshot
+from rebalancer.utils import get_weights_from_resources
 
 
 def get_portfolio(exchange):
     resources = exchange.get_resources()
     resources = {k: v for k, v in resources.items() if v > Decimal(1e-8)}
-    orderbooks = exchange.get_orderbooks()
+    snapshot = MarketSnapshot(exchange.get_orderbooks())
 
-    price_estimates = get_price_estimates_from_orderbooks(orderbooks, 'BTC')
+    price_estimates = {currency: Decimal(price) for currency, price
+                       in snapshot.get_prices('BTC').items()}
 
     weights = get_weights_from_resources(resources, price_estimates)
-    portfolio_value = get_portfolio_value_from_resources(
-        resources, price_estimates).quantize(Decimal('1e-8'))
+    portfolio_value = Decimal(snapshot.value_portfolios(
+        [resources], 'BTC')[0]).quantize(Decimal('1e-8'))
 
     allocations = []
     for currency, quantity in resources.items():
@@ -43,12 +44,14 @@ def dict_replace(string, dictionary):
     return string
 
 
-def user_has_unfinished_tasks(tasks, api_key):
+def user_has_unfinished_tasks(tasks, api_key, task_name=None):
     """
     checks if task with api_key exists in tasks
     :param tasks: Dict[worker, List[job]],
                   for example celery.Celery().control.inspect().active()
     :param api_key: string, api key of user
+    :param task_name: only jobs of task with this name are checked,
+                      None for all jobs
     :return: None if such job doesn't exist,
              and Tuple(job, task arguments) otherwise
     """
@@ -56,6 +59,8 @@ def user_has_unfinished_tasks(tasks, api_key):
         return
     for worker, jobs in tasks.items():
         for job in jobs:
+            if task_name is not None and job.get('name') != task_name:
+                continue
             args = json.loads(dict_replace(
                 job['args'], {'(': '[', ')': ']', '...': '', "'": '"'}))
             # the arguments, which were sent to task
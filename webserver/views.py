@@ -4,6 +4,7 @@ import numpy as np
 from decimal import Decimal
 from celery.task.control import revoke
 from celery.result import AsyncResult
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
@@ -12,7 +13,7 @@ from webserver.api_exceptions import WeightsSumGreaterThanOne,\
     RebalanceInProgress
 from webserver.decorators import with_valid_api_key, \
     initialize_exchange
-from webserver.models import Statistics
+from webserver.models import Statistics, LimitRebalance
 from webserver.utils import get_portfolio, user_has_unfinished_tasks
 
 
@@ -36,8 +37,11 @@ class PortfolioView(APIView):
     def put(self, request, exchange, params, force_reset=False):
         i = tasks.app.control.inspect()
         api_key = request.user.api_key
-        job_args = (user_has_unfinished_tasks(i.active(), api_key) or
-                    user_has_unfinished_tasks(i.reserved(), api_key))
+        # steps of limit rebalance aren't revoked, they are stopped by
+        # status of limit rebalance below, so they cancel its orders
+        name = tasks.rebalance_task.name
+        job_args = (user_has_unfinished_tasks(i.active(), api_key, name) or
+                    user_has_unfinished_tasks(i.reserved(), api_key, name))
         if job_args is not None:
             job, args = job_args
             result = AsyncResult(job['id'], app=tasks.app)
@@ -47,6 +51,16 @@ class PortfolioView(APIView):
                 raise RebalanceInProgress
             else:
                 revoke(job['id'], terminate=True)
+        # limit rebalance waits for its next step without any active task
+        limit_rebalance = LimitRebalance.objects.filter(
+            user=request.user, status=LimitRebalance.RUNNING).first()
+        if limit_rebalance is not None:
+            age = timezone.now() - limit_rebalance.date_created
+            if not force_reset or age.total_seconds() < 60:
+                raise RebalanceInProgress
+            # the next step cancels orders of rebalance
+            limit_rebalance.status = LimitRebalance.CANCELED
+            limit_rebalance.save(update_fields=['status'])
         allocations = params['allocations']
         total_weight = sum(Decimal(allocation['portion'])
                            for allocation in allocations)